@@ -1,10 +1,21 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from routers import predict
 
 
-app = FastAPI(title="Food Health Classifier API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	# Modelul se încarcă în background: portul e deschis imediat,
+	# iar /readyz devine 200 abia după load + warm-up
+	app.state.model_loading = predict.start_loading()
+	yield
+	await predict.shutdown()
+
+
+app = FastAPI(title="Food Health Classifier API", lifespan=lifespan)
 
 # Allow local frontend during development. Adjust origins for production.
 app.add_middleware(
@@ -0,0 +1,424 @@
+"""
+Benchmark pentru serverul de inferență: latență, throughput, memorie și CPU
+
+Aplicația FastAPI este rulată în două moduri:
+    --target inprocess   în proces, prin TestClient (fără rețea, fără uvicorn)
+    --target http        un uvicorn local pornit de script (sau unul existent, --url)
+
+Pentru fiecare configurație (--config backend=onnx,batch=16 ...) și fiecare nivel
+de concurență (--concurrency 1,4,16) se măsoară p50/p95/p99, imagini/s, RSS maxim
+și utilizarea CPU. Fiecare configurație rulează într-un proces separat, pentru că
+setările FHC_* se citesc la import și RSS-ul maxim este per proces.
+
+Rezultatele se scriu în JSON; cu --baseline se compară cu o rulare anterioară și
+scriptul iese cu codul 1 dacă p95 sau throughput-ul s-au degradat peste --tolerance.
+
+Exemplu:
+    python benchmark_inference.py --images data/food101_split/test \\
+        --config backend=hf,batch=1 --config backend=onnx,batch=16 --concurrency 1,8,32
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+# Nume scurte pentru cheile din --config; restul devin FHC_<CHEIE>
+CONFIG_ALIASES = {
+    "backend": "FHC_BACKEND",
+    "batch": "FHC_MAX_BATCH_SIZE",
+    "wait_ms": "FHC_MAX_BATCH_WAIT_MS",
+    "workers": "FHC_WORKER_THREADS",
+    "threads": "FHC_TORCH_THREADS",
+    "onnx": "FHC_ONNX_PATH",
+}
+
+
+def parse_config(text):
+    """'backend=onnx,batch=16' -> {'FHC_BACKEND': 'onnx', 'FHC_MAX_BATCH_SIZE': '16'}"""
+    env = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        key, sep, value = part.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid --config entry {part!r} (expected key=value)")
+        key = key.strip().lower()
+        env[CONFIG_ALIASES.get(key, "FHC_" + key.upper())] = value.strip()
+    return env
+
+
+# ------------------------------------------------------------------ images
+def synthetic_images(count, size, seed):
+    """JPEG-uri sintetice: zgomot la rezoluție mică, mărit (se comprimă ca o poză reală)."""
+    import numpy as np
+    from PIL import Image
+
+    width, height = size
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        small = rng.integers(0, 256, (max(1, height // 32), max(1, width // 32), 3), dtype=np.uint8)
+        img = Image.fromarray(small).resize((width, height), Image.Resampling.BICUBIC)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=90)
+        images.append((f"synthetic_{i}.jpg", buf.getvalue()))
+    return images
+
+
+def real_images(image_dir, count, seed):
+    """Imagini din data/food101_split/test (sau alt director), alese cu seed fix."""
+    paths = sorted(Path(image_dir).rglob("*.jpg"))
+    if not paths:
+        raise FileNotFoundError(f"No images found in {Path(image_dir).absolute()}")
+    chosen = random.Random(seed).sample(paths, min(count, len(paths)))
+    return [(p.name, p.read_bytes()) for p in chosen]
+
+
+def load_images(args):
+    if args.images == "synthetic":
+        width, _, height = args.synthetic_size.partition("x")
+        return synthetic_images(args.num_images, (int(width), int(height or width)), args.seed)
+    return real_images(args.images, args.num_images, args.seed)
+
+
+# ------------------------------------------------------ process counters
+def process_cpu_seconds(pid):
+    """CPU time (user + system) consumat de proces, din /proc (Linux)."""
+    if pid == os.getpid():
+        t = os.times()
+        return t.user + t.system
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except OSError:
+        return None
+
+
+def peak_rss_mb(pid):
+    """RSS maxim al procesului (VmHWM); pentru procesul curent, fallback pe getrusage."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid == os.getpid():
+        import resource
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return None
+
+
+# -------------------------------------------------------------- load run
+def percentile(sorted_values, q):
+    """Percentila q (0-100) cu interpolare liniară, pe o listă deja sortată."""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def make_files(images, i, per_request):
+    field = "file" if per_request == 1 else "files"
+    chosen = [images[(i * per_request + j) % len(images)] for j in range(per_request)]
+    return [(field, (name, data, "image/jpeg")) for name, data in chosen]
+
+
+def run_level(client, path, images, concurrency, total, per_request, pid, warmup):
+    """Trimite `total` cereri cu `concurrency` cereri în zbor; întoarce metricile nivelului."""
+    for i in range(warmup):
+        client.post(path, files=make_files(images, i, per_request))
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            status = client.post(path, files=make_files(images, i, per_request)).status_code
+        except Exception:
+            status = 0  # eroare de conexiune / timeout
+        return time.perf_counter() - start, status
+
+    batching_before = client.get("/batching-stats").json()
+    cpu_before = process_cpu_seconds(pid)
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - wall_start
+    cpu_after = process_cpu_seconds(pid)
+    batching_after = client.get("/batching-stats").json()
+
+    statuses = Counter(status for _, status in results)
+    latencies = sorted(latency * 1000 for latency, status in results if status == 200)
+    ok = statuses.get(200, 0)
+    batches = batching_after["batches_total"] - batching_before["batches_total"]
+    items = batching_after["items_total"] - batching_before["items_total"]
+
+    level = {
+        "concurrency": concurrency,
+        "requests": total,
+        "images_per_request": per_request,
+        "ok": ok,
+        "rejected_503": statuses.get(503, 0),
+        "errors": total - ok - statuses.get(503, 0),
+        "wall_s": round(wall, 3),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            **{f"p{q}": round(percentile(latencies, q), 2) if latencies else None
+               for q in (50, 95, 99)},
+            "max": round(latencies[-1], 2) if latencies else None,
+        },
+        "requests_per_sec": round(ok / wall, 2),
+        "images_per_sec": round(ok * per_request / wall, 2),
+        "mean_batch_size": round(items / batches, 2) if batches else None,
+        "peak_rss_mb": peak_rss_mb(pid),
+        "cpu_cores_used": None,
+        "cpu_utilization_pct": None,
+    }
+    if cpu_before is not None and cpu_after is not None:
+        cores = (cpu_after - cpu_before) / wall
+        level["cpu_cores_used"] = round(cores, 2)
+        level["cpu_utilization_pct"] = round(100 * cores / (os.cpu_count() or 1), 1)
+    return level
+
+
+def run_levels(client, args, images, pid):
+    path = "/predict-image" if args.images_per_request == 1 else "/predict-images"
+    model = client.get("/model-status").json()
+    levels = []
+    for concurrency in args.concurrency:
+        level = run_level(client, path, images, concurrency, args.requests,
+                          args.images_per_request, pid, args.warmup)
+        levels.append(level)
+        lat = level["latency_ms"]
+        print(f"   ├─ c={concurrency:<4} p50 {lat['p50']} ms | p95 {lat['p95']} ms | "
+              f"p99 {lat['p99']} ms | {level['images_per_sec']} img/s | "
+              f"CPU {level['cpu_utilization_pct']}% | RSS {level['peak_rss_mb']} MB"
+              + (f" | {level['rejected_503']}x 503" if level["rejected_503"] else ""))
+    return {"model": model, "levels": levels}
+
+
+def wait_ready(get, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if get("/readyz").status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server not ready after {timeout}s")
+
+
+# ---------------------------------------------------------------- targets
+def child_inprocess(args):
+    """Rulează în procesul-copil: importă aplicația cu FHC_* deja setate."""
+    from fastapi.testclient import TestClient
+
+    from app import app
+
+    images = load_images(args)
+    with TestClient(app) as client:
+        wait_ready(client.get, args.ready_timeout)
+        result = run_levels(client, args, images, os.getpid())
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+def bench_inprocess(args, label, env):
+    # Copilul rulează cu cwd=ROOT: căile (deja absolute) suprascriu valorile relative din argv
+    cmd = [sys.executable, str(Path(__file__).resolve()), *sys.argv[1:],
+           "--images", args.images, "--output", str(args.output), "--child-config", label]
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+        if line.startswith("   ├─ c="):
+            print(line)
+    raise RuntimeError(f"Benchmark child failed (exit {proc.returncode}):\n{proc.stdout[-2000:]}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_http(args, env, images):
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 1)
+    if args.url:
+        # Server pornit separat: configurația lui nu e controlată de script,
+        # iar RSS/CPU se măsoară doar dacă îi dăm PID-ul
+        with httpx.Client(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+            wait_ready(client.get, args.ready_timeout)
+            return run_levels(client, args, images, args.server_pid)
+
+    port = free_port()
+    # Log-ul serverului lângă rezultate, util când /readyz nu mai vine
+    log = open(args.output.parent / "uvicorn.log", "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout,
+                          limits=limits) as client:
+            wait_ready(client.get, args.ready_timeout)
+            return run_levels(client, args, images, server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        log.close()
+
+
+# ------------------------------------------------------------- reporting
+def compare(baseline_path, runs, tolerance):
+    """Regresii față de o rulare anterioară: p95 mai mare sau img/s mai mic peste toleranță."""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    previous = {(run["label"], run["target"], level["images_per_request"], level["concurrency"]): level
+                for run in baseline["runs"] for level in run["levels"]}
+
+    regressions = []
+    print(f"\n📈 Comparison with {baseline_path} (tolerance {tolerance:.0%})")
+    for run in runs:
+        for level in run["levels"]:
+            old = previous.get((run["label"], run["target"], level["images_per_request"],
+                                level["concurrency"]))
+            if old is None or not old["images_per_sec"] or old["latency_ms"]["p95"] is None:
+                continue
+            p95_ratio = (level["latency_ms"]["p95"] or float("inf")) / old["latency_ms"]["p95"]
+            ips_ratio = level["images_per_sec"] / old["images_per_sec"]
+            bad = p95_ratio > 1 + tolerance or ips_ratio < 1 - tolerance
+            print(f"   {'❌' if bad else '✅'} {run['label'] or 'default'} [{run['target']}] "
+                  f"c={level['concurrency']}: p95 x{p95_ratio:.2f}, img/s x{ips_ratio:.2f}")
+            if bad:
+                regressions.append((run["label"], run["target"], level["concurrency"]))
+    return regressions
+
+
+def machine_info():
+    info = {"hostname": socket.gethostname(), "platform": platform.platform(),
+            "python": platform.python_version(), "cpu_count": os.cpu_count()}
+    try:
+        import torch
+        info["torch"] = torch.__version__
+    except ImportError:
+        pass
+    try:
+        info["git_commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                            capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        info["git_commit"] = None
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmark for the inference server")
+    parser.add_argument("--target", choices=["inprocess", "http", "both"], default="inprocess")
+    parser.add_argument("--url", default=None, help="already running server (--target http)")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID of --url, for RSS/CPU")
+    parser.add_argument("--config", action="append", default=None,
+                        help="key=value,... e.g. backend=onnx,batch=16 (repeatable)")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests before each level")
+    parser.add_argument("--images", default="synthetic", help="'synthetic' or an image directory")
+    parser.add_argument("--num-images", type=int, default=64)
+    parser.add_argument("--synthetic-size", default="1024x768", help="WxH of synthetic JPEGs")
+    parser.add_argument("--images-per-request", type=int, default=1,
+                        help=">1 benchmarks /predict-images")
+    parser.add_argument("--keep-cache", action="store_true",
+                        help="leave the prediction cache on (off by default: repeats would be hits)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--ready-timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="default: benchmark_results/benchmark_<time>.json")
+    parser.add_argument("--baseline", default=None, help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--child-config", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    args.output = Path(args.output).resolve() if args.output else \
+        ROOT / "benchmark_results" / f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    if args.images != "synthetic":
+        args.images = str(Path(args.images).resolve())
+
+    if args.child_config is not None:
+        child_inprocess(args)
+        return
+
+    configs = args.config or [""]
+    targets = ["inprocess", "http"] if args.target == "both" else [args.target]
+    if args.url and args.target != "http":
+        parser.error("--url requires --target http")
+    if args.url and args.config:
+        print("⚠️  --config is ignored with --url (the running server keeps its own settings)")
+        configs = [""]
+
+    print("=" * 70)
+    print("⏱️  INFERENCE BENCHMARK")
+    print("=" * 70)
+    images = load_images(args)
+    print(f"Images: {len(images)} from {args.images} "
+          f"(avg {sum(len(d) for _, d in images) / len(images) / 1024:.0f} KB)")
+    print(f"Concurrency levels: {args.concurrency} | {args.requests} requests per level")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    runs = []
+    for label in configs:
+        env = {**os.environ, **parse_config(label)}
+        if not args.keep_cache:
+            env.update({"FHC_CACHE_MAX_ENTRIES": "0", "FHC_CACHE_DIR": ""})
+        for target in targets:
+            print(f"\n🔧 {label or 'default settings'} [{target}]")
+            if target == "inprocess":
+                result = bench_inprocess(args, label, env)
+            else:
+                result = bench_http(args, env, images)
+            runs.append({"label": label, "target": target, "env": parse_config(label), **result})
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": machine_info(),
+        "images": {"source": args.images, "count": len(images),
+                   "synthetic_size": args.synthetic_size if args.images == "synthetic" else None,
+                   "images_per_request": args.images_per_request},
+        "requests_per_level": args.requests,
+        "cache": args.keep_cache,
+        "runs": runs,
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "=" * 70)
+    print("✅ BENCHMARK COMPLETE")
+    print("=" * 70)
+    print(f"Results saved at: {args.output.absolute()}")
+
+    if args.baseline:
+        regressions = compare(args.baseline, runs, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Benchmark interrupted by user")
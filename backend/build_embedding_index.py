@@ -0,0 +1,160 @@
+"""
+Calculează embedding-urile imaginilor de referință (implicit train-ul Food-101)
+cu modelul servit și construiește indexul pentru /similar (vezi utils/embedding_index.py)
+
+Fiecare imagine trece prin același decode + preprocesare ca la /predict-image;
+vectorul păstrat e ieșirea stratului penultim (intrarea clasificatorului),
+normalizată L2. Matricea se salvează float16 sau int8, grupată pe listele unui
+index IVF (k-means local, fără dependențe în plus). Modelul e cel din
+variabilele FHC_* (FHC_BACKEND, FHC_MODEL_NAME, ...), ca la server.
+
+Exemplu:
+    python build_embedding_index.py
+    python build_embedding_index.py --dtype int8 --nlist 256 --output data/embedding_index
+    FHC_BACKEND=timm python build_embedding_index.py --max-per-class 100
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+from utils import settings
+from utils.backends import backend_id, create_backend
+from utils.decode import decode_image
+from utils.embedding_index import DTYPES, write_index
+from utils.model_manager import ModelManager
+
+
+def list_images(root: Path, max_per_class: int = 0):
+    """[(cale, label)] în ordinea ImageFolder + numele claselor."""
+    classes = sorted(p.name for p in root.iterdir() if p.is_dir())
+    samples = []
+    for label, name in enumerate(classes):
+        files = sorted(p for p in (root / name).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+        if max_per_class:
+            files = files[:max_per_class]
+        samples.extend((path, label) for path in files)
+    return samples, classes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed reference images and build the /similar index")
+    parser.add_argument("--source", default="data/food101_split/train",
+                        help="ImageFolder-style directory with the reference images")
+    parser.add_argument("--output", default="data/embedding_index")
+    parser.add_argument("--dtype", choices=DTYPES, default="float16",
+                        help="stored embedding precision (int8 is half the size, ~1e-3 cosine error)")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = about sqrt(N))")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parallel decoders")
+    parser.add_argument("--max-per-class", type=int, default=0, help="limit images per class (0 = all)")
+    args = parser.parse_args()
+
+    source, output = Path(args.source), Path(args.output)
+
+    print("="*70)
+    print("🧭 BUILDING EMBEDDING INDEX")
+    print("="*70)
+
+    if not source.exists():
+        print(f"❌ Error: Images not found at {source.absolute()}")
+        print("   Please run 'python prepare_dataset.py' first!")
+        return
+
+    print(f"🧠 Loading model ({backend_id(settings)})...")
+    backend = create_backend(settings)
+    if not backend.supports_embeddings:
+        print(f"❌ Error: The {backend.name} backend does not expose embeddings (use FHC_BACKEND=hf or timm)")
+        return
+
+    samples, classes = list_images(source, args.max_per_class)
+    print(f"Source: {source.absolute()} | Images: {len(samples)} | Classes: {len(classes)}")
+    print(f"Storage: {args.dtype} | IVF lists: {args.nlist or 'auto'}")
+
+    def load(sample):
+        try:
+            with open(sample[0], "rb") as f:
+                img = decode_image(f.read(), min_size=backend.decode_size,
+                                   max_pixels=settings.MAX_IMAGE_PIXELS)
+            return backend.preprocess(img)
+        except Exception as e:
+            return e
+
+    start = time.perf_counter()
+    features, labels, paths, failed = [], [], [], []
+    batch, batch_samples = [], []
+
+    def flush():
+        _, embeddings = backend.predict_embeddings(backend.collate(batch))
+        features.append(embeddings.float().cpu().numpy())
+        labels.extend(label for _, label in batch_samples)
+        paths.extend(path.relative_to(source).as_posix() for path, _ in batch_samples)
+        batch.clear()
+        batch_samples.clear()
+
+    def decoded(pool):
+        # Fereastră de ~2 batch-uri în lucru: decode-ul e mai rapid decât forward pass-ul,
+        # iar pool.map ar ține toate imaginile decodate în memorie
+        window = deque()
+        for sample in samples:
+            window.append((sample, pool.submit(load, sample)))
+            if len(window) >= 2 * args.batch_size:
+                sample, future = window.popleft()
+                yield sample, future.result()
+        for sample, future in window:
+            yield sample, future.result()
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        # Decode-ul rulează în paralel; forward pass-ul pe batch-uri, în firul principal
+        for sample, pixels in tqdm(decoded(pool), total=len(samples), desc="Embedding", ncols=100):
+            if isinstance(pixels, Exception):
+                failed.append(f"{sample[0]}: {pixels}")
+                continue
+            batch.append(pixels)
+            batch_samples.append(sample)
+            if len(batch) == args.batch_size:
+                flush()
+        if batch:
+            flush()
+    embed_time = time.perf_counter() - start
+
+    for line in failed[:10]:
+        print(f"⚠️  Warning: Skipped {line}")
+    if len(failed) > 10:
+        print(f"⚠️  ... and {len(failed) - 10} more unreadable images")
+    if not features:
+        print("❌ Error: No images could be embedded")
+        return
+
+    print("\n🗂️  Clustering and writing the index...")
+    index_start = time.perf_counter()
+    model_id = ModelManager(backend_id(settings), None, version=settings.MODEL_VERSION).version
+    index = write_index(output, np.concatenate(features), labels, paths, {
+        "model_id": model_id,
+        "source": str(source.absolute()),
+        "classes": classes,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }, nlist=args.nlist or None, dtype=args.dtype)
+    size = sum(f.stat().st_size for f in output.iterdir())
+
+    print("\n" + "="*70)
+    print("✅ EMBEDDING INDEX READY!")
+    print("="*70)
+    print(f"Location: {output.absolute()}")
+    print(f"   ├─ Images: {len(index)} x {index.dim} dims ({args.dtype}), {index.nlist} IVF lists")
+    print(f"   ├─ Size on disk: {size / 1e6:.1f} MB")
+    print(f"   ├─ Embedding: {embed_time:.1f}s ({len(index) / embed_time:.1f} img/s)")
+    print(f"   └─ Index build: {time.perf_counter() - index_start:.1f}s")
+    print(f"\n🎯 Next step: start the server (FHC_EMBEDDING_INDEX={output}) and POST images to /similar")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Indexing interrupted by user (the previous index, if any, is unchanged)")
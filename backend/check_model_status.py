@@ -1,7 +1,12 @@
 from fastapi.testclient import TestClient
 from app import app
 import json
+import time
 
-c = TestClient(app)
-res = c.get('/model-status')
-print(json.dumps(res.json(), indent=2))
+# `with` rulează lifespan-ul, deci pornește încărcarea modelului în background
+with TestClient(app) as c:
+    res = c.get('/model-status')
+    while res.json()["loading"] or not (res.json()["ready"] or res.json()["error"]):
+        time.sleep(0.5)
+        res = c.get('/model-status')
+    print(json.dumps(res.json(), indent=2))
@@ -0,0 +1,175 @@
+"""
+Exportă modelul în format ONNX pentru serving cu ONNX Runtime (FHC_BACKEND=onnx)
+
+Surse suportate:
+    --source hf     modelul HuggingFace (implicit nateraw/food)
+    --source timm   modelul nostru EfficientNet-B0 (model/best_model.pth)
+
+Rezultat: model/food101.onnx + model/food101.onnx.json (labels, preprocesare)
+După export se rulează un parity check: top-5 ONNX Runtime vs. PyTorch.
+
+Exemplu:
+    python export_onnx.py --source timm --parity-dir data/food101_split/test
+"""
+import argparse
+import inspect
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from utils.backends import MODEL_DIR, HFTorchBackend, OnnxBackend, TimmTorchBackend
+
+
+class LogitsOnly(nn.Module):
+    """Modelele HF întorc un obiect; pentru ONNX avem nevoie doar de logits."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
+
+
+def load_reference(args):
+    """Backend-ul PyTorch de referință + modulul exportabil + metadata pentru sidecar."""
+    if args.source == "hf":
+        backend = HFTorchBackend(args.model_name)
+        module = LogitsOnly(backend.model)
+        meta = {"source": "hf", "model_name": args.model_name}
+    else:
+        backend = TimmTorchBackend(args.model_dir, checkpoint=args.checkpoint)
+        module = backend.model
+        meta = {"source": "timm", "checkpoint": str(backend.checkpoint)}
+    # Serving-ul ONNX refolosește exact aceeași preprocesare (utils/preprocess.py)
+    meta["preprocess"] = backend.preprocessor.to_dict()
+    meta["id2label"] = {str(k): v for k, v in backend.id2label.items()}
+    meta["parameter_count"] = backend.parameter_count
+    return backend, module.eval(), meta
+
+
+def export(module, output: Path, image_size: int, opset: int):
+    dummy = torch.zeros(1, 3, image_size, image_size)
+    # Exporterul clasic (TorchScript): weights în același fișier și shape-uri
+    # pe care le acceptă și tool-urile de cuantizare din ONNX Runtime
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        module,
+        dummy,
+        str(output),
+        input_names=["pixel_values"],
+        output_names=["logits"],
+        # Batch dinamic, ca micro-batching-ul din server să funcționeze
+        dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset,
+        do_constant_folding=True,
+        **kwargs,
+    )
+
+
+def sample_images(parity_dir, count, seed=0):
+    """Imagini reale din parity_dir sau, dacă lipsește, imagini random."""
+    rng = random.Random(seed)
+    if parity_dir and Path(parity_dir).exists():
+        paths = sorted(Path(parity_dir).rglob("*.jpg"))
+        for path in rng.sample(paths, min(count, len(paths))):
+            yield Image.open(path).convert("RGB")
+        return
+    print("⚠️  No --parity-dir given, using random noise images (top-5 order is less stable)")
+    np_rng = np.random.default_rng(seed)
+    for _ in range(count):
+        yield Image.fromarray(np_rng.integers(0, 256, (256, 256, 3), dtype=np.uint8))
+
+
+def parity_check(reference, candidate, images, batch_size=16, k=5):
+    """Compară top-k între două backend-uri pe aceleași imagini.
+
+    Returnează acordul top-1, suprapunerea medie top-k și diferența maximă
+    de probabilitate, plus latența medie per batch pentru fiecare backend.
+    """
+    top1_agree, overlap, max_diff, n = 0, 0.0, 0.0, 0
+    times = {"reference_s": 0.0, "candidate_s": 0.0}
+    images = list(images)
+
+    for i in range(0, len(images), batch_size):
+        chunk = images[i:i + batch_size]
+        batch = reference.collate([reference.preprocess(img) for img in chunk])
+
+        start = time.perf_counter()
+        ref_probs = torch.softmax(reference.predict_logits(batch), dim=1)
+        times["reference_s"] += time.perf_counter() - start
+
+        cand_batch = candidate.collate([candidate.preprocess(img) for img in chunk])
+        start = time.perf_counter()
+        cand_probs = torch.softmax(candidate.predict_logits(cand_batch), dim=1)
+        times["candidate_s"] += time.perf_counter() - start
+
+        ref_top = torch.topk(ref_probs, k=k).indices.tolist()
+        cand_top = torch.topk(cand_probs, k=k).indices.tolist()
+        for r, c in zip(ref_top, cand_top):
+            top1_agree += int(r[0] == c[0])
+            overlap += len(set(r) & set(c)) / k
+        max_diff = max(max_diff, (ref_probs - cand_probs).abs().max().item())
+        n += len(chunk)
+
+    return {
+        "samples": n,
+        "top1_agreement": round(top1_agree / n, 4),
+        "top5_overlap": round(overlap / n, 4),
+        "max_abs_prob_diff": float(f"{max_diff:.6g}"),
+        "reference_time_s": round(times["reference_s"], 3),
+        "candidate_time_s": round(times["candidate_s"], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the classifier to ONNX")
+    parser.add_argument("--source", choices=["hf", "timm"], default="hf")
+    parser.add_argument("--model-name", default="nateraw/food", help="HF model (--source hf)")
+    parser.add_argument("--model-dir", default=str(MODEL_DIR), help="config.json + labels (--source timm)")
+    parser.add_argument("--checkpoint", default="best_model.pth", help="state dict in --model-dir")
+    parser.add_argument("--output", default=str(MODEL_DIR / "food101.onnx"))
+    parser.add_argument("--image-size", type=int, default=224)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--parity-dir", default=None, help="e.g. data/food101_split/test")
+    parser.add_argument("--parity-samples", type=int, default=64)
+    parser.add_argument("--min-top1-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    print("=" * 70)
+    print(f"📦 EXPORTING {args.source.upper()} MODEL TO ONNX")
+    print("=" * 70)
+
+    reference, module, meta = load_reference(args)
+    export(module, output, args.image_size, args.opset)
+    meta.update({"opset": args.opset, "image_size": args.image_size, "exported_at": time.time()})
+    with open(output.with_suffix(".onnx.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    print(f"✅ Exported: {output.absolute()} ({output.stat().st_size / 1e6:.1f} MB)")
+
+    print("\n🔍 Parity check (PyTorch vs ONNX Runtime)...")
+    candidate = OnnxBackend(output, opt_level="all", intra_op_threads=torch.get_num_threads())
+    report = parity_check(reference, candidate,
+                          sample_images(args.parity_dir, args.parity_samples))
+    for key, value in report.items():
+        print(f"   ├─ {key}: {value}")
+
+    if report["top1_agreement"] < args.min_top1_agreement:
+        print(f"❌ Top-1 agreement below {args.min_top1_agreement}")
+        sys.exit(1)
+    print("✅ Parity check passed")
+    print(f"\n🎯 Serve it with: FHC_BACKEND=onnx FHC_ONNX_PATH={output}")
+
+
+if __name__ == "__main__":
+    main()
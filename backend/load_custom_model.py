@@ -7,7 +7,8 @@ import timm
 import json
 from pathlib import Path
 from PIL import Image
-import torchvision.transforms as transforms
+
+from utils.preprocess import Preprocessor
 
 # ========== ÎNCARCĂ MODELUL CUSTOM ==========
 def load_custom_model():
@@ -43,13 +44,12 @@ def load_custom_model():
 
 # ========== PREPROCESSING ==========
 def get_transform():
-    """Transform pentru preprocessing imagini (identic cu cel din training)"""
-    return transforms.Compose([
-        transforms.Resize((256, 256)),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
+    """Transform pentru preprocessing imagini (identic cu cel din training)
+
+    Resize((256, 256)) -> CenterCrop(224) -> normalizare ImageNet, din
+    utils/preprocess.py (aceeași preprocesare ca în train_model.py și în server)
+    """
+    return Preprocessor().transform
 
 # ========== PREDICȚIE ==========
 def predict_with_custom_model(image_path_or_pil, model, id2label, transform):
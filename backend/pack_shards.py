@@ -0,0 +1,154 @@
+"""
+Împachetează data/food101_split/{train,test} în câteva fișiere shard mari
+(vezi utils/shards.py), pentru train_model.py --shards
+
+Fiecare imagine e redimensionată o singură dată la 256x256 (Resize-ul din
+training) și re-encodată JPEG, apoi scrisă secvențial în shard-uri de
+~--shard-mb MB. Train-ul e amestecat (seed fix) înainte de scriere, ca fiecare
+shard să conțină toate clasele. Un index (shard, offset, lungime, label) per split permite
+citirea prin mmap fără niciun apel de filesystem per imagine.
+
+Exemplu:
+    python pack_shards.py --output data/food101_shards --shard-mb 64
+    python train_model.py --shards data/food101_shards
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from tqdm import tqdm
+
+from utils.preprocess import Preprocessor
+from utils.shards import FORMAT_VERSION, ShardWriter, encode_image, write_meta
+
+SPLITS = ("train", "test")
+
+
+def list_split(source: Path, split: str, classes):
+    """[(cale, label)] în ordinea ImageFolder; folosește manifest.json dacă există."""
+    label_of = {name: i for i, name in enumerate(classes)}
+    manifest_file = source / "manifest.json"
+    if manifest_file.exists():
+        with open(manifest_file, "r") as f:
+            files = json.load(f)["splits"][split]["files"]
+        samples = [(source / e["path"], label_of[e["class"]]) for e in files]
+        return sorted(samples, key=lambda s: (s[1], s[0].name))
+
+    samples = []
+    for name in classes:
+        for path in sorted((source / split / name).iterdir()):
+            if path.suffix.lower() in (".jpg", ".jpeg", ".png"):
+                samples.append((path, label_of[name]))
+    return samples
+
+
+def pack_split(source: Path, output: Path, split: str, classes, args):
+    samples = list_split(source, split, classes)
+    # În ordinea claselor un shard ar avea 2-3 clase, iar shuffle buffer-ul din
+    # ShardIterableDataset nu le poate amesteca; test-ul rămâne în ordinea claselor
+    shuffle = split == "train"
+    if shuffle:
+        random.Random(args.seed).shuffle(samples)
+    writer = ShardWriter(output, split, args.shard_mb * 1024 * 1024)
+    failed = []
+
+    def encode(sample):
+        try:
+            return encode_image(sample[0], args.size, args.quality)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        # map păstrează ordinea; scrierea rămâne secvențială în firul principal
+        for (path, label), data in tqdm(zip(samples, pool.map(encode, samples)),
+                                        total=len(samples), desc=f"{split.capitalize()} shards", ncols=100):
+            if isinstance(data, Exception):
+                failed.append(f"{path}: {data}")
+                continue
+            writer.write(data, label)
+
+    entry = writer.close()
+    for line in failed[:10]:
+        print(f"⚠️  Warning: Skipped {line}")
+    if len(failed) > 10:
+        print(f"⚠️  ... and {len(failed) - 10} more unreadable images")
+    entry["skipped"] = len(failed)
+    entry["order"] = "shuffled" if shuffle else "class-sorted"
+    if shuffle:
+        entry["seed"] = args.seed
+    return entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack the Food-101 split into memory-mappable shard files")
+    parser.add_argument("--source", default="data/food101_split")
+    parser.add_argument("--output", default="data/food101_shards")
+    parser.add_argument("--size", type=int, default=max(Preprocessor().resize),
+                        help="images are stored resized to SIZE x SIZE (the training Resize)")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG quality of the stored images")
+    parser.add_argument("--shard-mb", type=int, default=64,
+                        help="target shard size; keep shards >= DataLoader workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parallel encoders")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the train sample order")
+    args = parser.parse_args()
+
+    source, output = Path(args.source), Path(args.output)
+
+    print("="*70)
+    print("📦 PACKING DATASET SHARDS")
+    print("="*70)
+
+    if not (source / "train").exists():
+        print(f"❌ Error: Dataset not found at {source.absolute()}")
+        print("   Please run 'python prepare_dataset.py' first!")
+        return
+
+    # Un pachet vechi e înlocuit complet (index-urile nu ar mai corespunde)
+    if output.exists():
+        print("🧹 Removing previous shards...")
+        shutil.rmtree(output)
+    output.mkdir(parents=True)
+
+    classes = sorted(p.name for p in (source / "train").iterdir() if p.is_dir())
+    print(f"Source: {source.absolute()} | Classes: {len(classes)}")
+    print(f"Image size: {args.size}x{args.size} | Quality: {args.quality} | Shard size: {args.shard_mb} MB")
+    print(f"Train order: shuffled (seed {args.seed})")
+
+    start = time.perf_counter()
+    splits = {}
+    for split in SPLITS:
+        if (source / split).exists():
+            print(f"\n📂 Packing {split.upper()} images...")
+            splits[split] = pack_split(source, output, split, classes, args)
+
+    write_meta(output, {
+        "format_version": FORMAT_VERSION,
+        "source": str(source.absolute()),
+        "classes": classes,
+        "image_size": args.size,
+        "quality": args.quality,
+        "splits": splits,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+
+    print("\n" + "="*70)
+    print("✅ SHARDS READY!")
+    print("="*70)
+    print(f"Location: {output.absolute()}")
+    for split, entry in splits.items():
+        print(f"   ├─ {split}: {entry['count']} images in {len(entry['shards'])} shards "
+              f"({entry['bytes'] / 1e6:.0f} MB)")
+    print(f"   └─ Time: {time.perf_counter() - start:.1f}s")
+    print(f"\n🎯 Next step: python train_model.py --shards {output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Packing interrupted by user (shards.json not written, re-run to pack again)")
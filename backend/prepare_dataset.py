@@ -6,140 +6,231 @@ Structura finală:
     │   ├── apple_pie/
     │   ├── baby_back_ribs/
     │   └── ...
-    └── test/
-        ├── apple_pie/
-        ├── baby_back_ribs/
-        └── ...
+    ├── test/
+    │   ├── apple_pie/
+    │   ├── baby_back_ribs/
+    │   └── ...
+    ├── classes.json, class_mapping.json
+    └── manifest.json   (fiecare fișier produs: cale, clasă, dimensiune)
+
+Fișierele se plasează în paralel (thread pool, I/O bound), ca copie, hardlink
+sau symlink. Rularea e neinteractivă și reluabilă: fișierele deja prezente cu
+aceeași dimensiune sunt sărite, iar fiecare fișier e scris printr-un .part +
+os.replace, deci o întrerupere nu lasă imagini trunchiate.
+
+Exemplu:
+    python prepare_dataset.py --mode hardlink --workers 32
 """
+import argparse
+import json
+import os
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import json
+
 from tqdm import tqdm
 
 FOOD101_ROOT = Path("data/food-101")
 OUTPUT_ROOT = Path("data/food101_split")
+MODES = ("copy", "hardlink", "symlink")
+
+
+def load_split(meta_dir: Path, split: str):
+    """{clasă: [fișiere fără extensie]} din meta/train.json sau meta/test.json"""
+    with open(meta_dir / f"{split}.json", "r") as f:
+        return json.load(f)
+
+
+def plan_split(images_dir: Path, split_dir: Path, files_by_class):
+    """Perechile (src, dst) pentru un split; creează folderele claselor."""
+    tasks = []
+    for class_name, files in files_by_class.items():
+        class_dir = split_dir / class_name
+        class_dir.mkdir(parents=True, exist_ok=True)
+        for file_path in files:
+            tasks.append((images_dir / f"{file_path}.jpg",
+                          class_dir / f"{Path(file_path).name}.jpg"))
+    return tasks
+
+
+def is_up_to_date(src: Path, dst: Path, src_size: int, mode: str) -> bool:
+    if mode == "symlink":
+        return dst.is_symlink() and Path(os.readlink(dst)) == src.resolve()
+    try:
+        # Un symlink rămas dintr-o rulare --mode symlink trebuie înlocuit
+        return not dst.is_symlink() and dst.stat().st_size == src_size
+    except FileNotFoundError:
+        return False
+
+
+def place_file(src: Path, dst: Path, mode: str):
+    """Copiază/leagă un fișier. Returnează (status, dimensiune)."""
+    try:
+        src_size = src.stat().st_size
+    except FileNotFoundError:
+        return "missing", 0
+
+    if is_up_to_date(src, dst, src_size, mode):
+        return "skipped", src_size
+
+    # Scriere atomică: dst apare doar complet
+    tmp = dst.with_name(dst.name + ".part")
+    if tmp.is_symlink() or tmp.exists():
+        tmp.unlink()
+    status = "copied"
+    if mode == "symlink":
+        os.symlink(src.resolve(), tmp)
+        status = "linked"
+    elif mode == "hardlink":
+        try:
+            os.link(src, tmp)
+            status = "linked"
+        except OSError:
+            # Alt filesystem / fără suport pentru hardlinks -> copie
+            shutil.copy2(src, tmp)
+    else:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+    return status, src_size
+
 
-def prepare_splits():
+def run_split(name, tasks, mode, workers, output_root: Path):
+    """Plasează fișierele în paralel; întoarce intrările pentru manifest + statistici."""
+    counts = {"copied": 0, "linked": 0, "skipped": 0, "missing": 0}
+    entries, missing = [], []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            tqdm(total=len(tasks), desc=f"{name.capitalize()} images", ncols=100) as pbar:
+        # map păstrează ordinea, deci manifestul e determinist
+        for (src, dst), (status, size) in zip(tasks, pool.map(lambda t: place_file(*t, mode), tasks)):
+            counts[status] += 1
+            pbar.update(1)
+            if status == "missing":
+                missing.append(str(src))
+                continue
+            entries.append({"path": dst.relative_to(output_root).as_posix(),
+                            "class": dst.parent.name, "size": size})
+    for path in missing[:10]:
+        print(f"⚠️  Warning: Missing file {path}")
+    if len(missing) > 10:
+        print(f"⚠️  ... and {len(missing) - 10} more missing files")
+    return entries, counts, missing
+
+
+def prepare_splits(args):
     """Organizează imaginile în train/test splits"""
+    source, output = Path(args.source), Path(args.output)
+
     print("="*70)
     print("📁 PREPARING TRAIN/TEST SPLITS")
     print("="*70)
-    
+    print(f"Mode: {args.mode} | Workers: {args.workers}")
+
     # Verifică dacă dataset-ul există
-    if not FOOD101_ROOT.exists():
-        print(f"❌ Error: Food-101 dataset not found at {FOOD101_ROOT.absolute()}")
+    if not source.exists():
+        print(f"❌ Error: Food-101 dataset not found at {source.absolute()}")
         print("   Please run 'python download_dataset.py' first!")
         return
-    
-    # Verifică dacă split-ul există deja
-    if OUTPUT_ROOT.exists():
-        print(f"⚠️  Output directory already exists: {OUTPUT_ROOT.absolute()}")
-        response = input("Do you want to recreate it? (y/n): ")
-        if response.lower() != 'y':
-            print("Skipping dataset preparation.")
-            return
-        print("🧹 Cleaning existing directory...")
-        shutil.rmtree(OUTPUT_ROOT)
-    
+
+    if output.exists():
+        if args.clean:
+            print("🧹 Cleaning existing directory...")
+            shutil.rmtree(output)
+        else:
+            print(f"♻️  Output directory exists, resuming: {output.absolute()}")
+
     # Citește split-urile oficiale
-    meta_path = FOOD101_ROOT / "meta"
+    meta_path = source / "meta"
     print(f"\n📋 Reading splits from {meta_path}...")
-    
+
     try:
-        with open(meta_path / "train.json", "r") as f:
-            train_files = json.load(f)
-        with open(meta_path / "test.json", "r") as f:
-            test_files = json.load(f)
+        splits = {split: load_split(meta_path, split) for split in ("train", "test")}
     except FileNotFoundError as e:
         print(f"❌ Error: Could not find meta files: {e}")
         return
-    
-    # Creează structura de foldere
-    train_dir = OUTPUT_ROOT / "train"
-    test_dir = OUTPUT_ROOT / "test"
-    train_dir.mkdir(parents=True, exist_ok=True)
-    test_dir.mkdir(parents=True, exist_ok=True)
-    
-    images_dir = FOOD101_ROOT / "images"
-    
-    # Copiază imaginile de training
-    print("\n📂 Organizing TRAINING images...")
-    total_train = sum(len(files) for files in train_files.values())
-    
-    with tqdm(total=total_train, desc="Train images", ncols=100) as pbar:
-        for class_name, files in train_files.items():
-            class_dir = train_dir / class_name
-            class_dir.mkdir(exist_ok=True)
-            
-            for file_path in files:
-                src = images_dir / f"{file_path}.jpg"
-                dst = class_dir / f"{Path(file_path).name}.jpg"
-                
-                if src.exists():
-                    shutil.copy2(src, dst)
-                    pbar.update(1)
-                else:
-                    print(f"⚠️  Warning: Missing file {src}")
-    
-    # Copiază imaginile de test
-    print("\n📂 Organizing TEST images...")
-    total_test = sum(len(files) for files in test_files.values())
-    
-    with tqdm(total=total_test, desc="Test images", ncols=100) as pbar:
-        for class_name, files in test_files.items():
-            class_dir = test_dir / class_name
-            class_dir.mkdir(exist_ok=True)
-            
-            for file_path in files:
-                src = images_dir / f"{file_path}.jpg"
-                dst = class_dir / f"{Path(file_path).name}.jpg"
-                
-                if src.exists():
-                    shutil.copy2(src, dst)
-                    pbar.update(1)
-                else:
-                    print(f"⚠️  Warning: Missing file {src}")
-    
+
+    # Un manifest vechi nu mai descrie ce e pe disk până la finalul rulării
+    (output / "manifest.json").unlink(missing_ok=True)
+
+    images_dir = source / "images"
+    start = time.perf_counter()
+    manifest = {"source": str(source.absolute()), "mode": args.mode, "splits": {}}
+    totals = {}
+
+    for split, files_by_class in splits.items():
+        print(f"\n📂 Organizing {split.upper()} images...")
+        tasks = plan_split(images_dir, output / split, files_by_class)
+        entries, counts, missing = run_split(split, tasks, args.mode, args.workers, output)
+        print(f"   ├─ {counts['copied']} copied, {counts['linked']} linked, "
+              f"{counts['skipped']} already present, {counts['missing']} missing")
+        manifest["splits"][split] = {"count": len(entries), "missing": missing, "files": entries}
+        totals[split] = len(entries)
+
     # Salvează lista de clase
-    classes = sorted(train_files.keys())
-    classes_file = OUTPUT_ROOT / "classes.json"
+    classes = sorted(splits["train"].keys())
+    classes_file = output / "classes.json"
     with open(classes_file, "w") as f:
         json.dump(classes, f, indent=2)
-    
+
     # Salvează mapping id2label
     id2label = {i: class_name for i, class_name in enumerate(classes)}
     label2id = {class_name: i for i, class_name in enumerate(classes)}
-    
-    mapping_file = OUTPUT_ROOT / "class_mapping.json"
+
+    mapping_file = output / "class_mapping.json"
     with open(mapping_file, "w") as f:
         json.dump({"id2label": id2label, "label2id": label2id}, f, indent=2)
-    
+
+    # Manifestul e scris ultimul: existența lui înseamnă un split complet
+    manifest.update({"classes": classes, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+    manifest_file = output / "manifest.json"
+    tmp = manifest_file.with_suffix(".json.part")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_file)
+
     print("\n" + "="*70)
     print("✅ DATASET PREPARATION COMPLETE!")
     print("="*70)
-    print(f"Location: {OUTPUT_ROOT.absolute()}")
+    print(f"Location: {output.absolute()}")
     print(f"\n📊 Statistics:")
     print(f"   ├─ Classes: {len(classes)}")
-    print(f"   ├─ Train images: {total_train}")
-    print(f"   ├─ Test images: {total_test}")
-    print(f"   ├─ Total images: {total_train + total_test}")
+    print(f"   ├─ Train images: {totals['train']}")
+    print(f"   ├─ Test images: {totals['test']}")
+    print(f"   ├─ Total images: {totals['train'] + totals['test']}")
+    print(f"   ├─ Time: {time.perf_counter() - start:.1f}s")
+    print(f"   ├─ Manifest: {manifest_file}")
     print(f"   └─ Class mapping saved: {mapping_file}")
-    
+
     print("\n🎯 Next step: Run 'python train_model.py' to start training!")
-    
+
     # Verifică câteva clase random
     print("\n📋 Sample classes:")
     for class_name in classes[:5]:
-        train_count = len(list((train_dir / class_name).glob("*.jpg")))
-        test_count = len(list((test_dir / class_name).glob("*.jpg")))
+        train_count = len(list((output / "train" / class_name).glob("*.jpg")))
+        test_count = len(list((output / "test" / class_name).glob("*.jpg")))
         print(f"   ├─ {class_name}: {train_count} train, {test_count} test")
     print(f"   └─ ... (and {len(classes) - 5} more)")
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Organize Food-101 into train/test class folders")
+    parser.add_argument("--source", default=str(FOOD101_ROOT), help="extracted food-101 directory")
+    parser.add_argument("--output", default=str(OUTPUT_ROOT))
+    parser.add_argument("--mode", choices=MODES, default="copy",
+                        help="hardlink/symlink avoid copying ~5 GB (hardlink falls back to copy across filesystems)")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4),
+                        help="parallel file operations")
+    parser.add_argument("--clean", action="store_true",
+                        help="delete the output directory first instead of resuming")
+    prepare_splits(parser.parse_args())
+
+
 if __name__ == "__main__":
     try:
-        prepare_splits()
+        main()
     except KeyboardInterrupt:
-        print("\n\n⚠️  Preparation interrupted by user")
+        print("\n\n⚠️  Preparation interrupted by user (run again to resume)")
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
@@ -0,0 +1,339 @@
+"""
+Cuantizare INT8 a modelului ONNX (dynamic și static, calibrată pe Food-101)
+
+Pornește de la graful fp32 exportat de export_onnx.py și produce:
+    model/food101_int8_dynamic.onnx   (weights INT8, activări cuantizate la runtime)
+    model/food101_int8_static.onnx    (QDQ, activări calibrate pe data/food101_split/test)
+    model/quantization_report.json    (acuratețe vs fp32, latență, memorie, dimensiune)
+
+Serverul încarcă artefactul ales cu:
+    FHC_BACKEND=onnx FHC_ONNX_PATH=model/food101_int8_static.onnx
+
+Exemplu:
+    python quantize_model.py --mode both --eval-samples 2000
+"""
+import argparse
+import json
+import multiprocessing as mp
+import queue
+import random
+import sys
+import time
+from pathlib import Path
+
+import torch
+from PIL import Image
+
+from utils import settings
+from utils.backends import MODEL_DIR, OnnxBackend
+from utils.decode import decode_image
+
+DATA_ROOT = Path("data/food101_split")
+
+
+def _proc_status_mb(field):
+    """Câmp din /proc/self/status (Linux), în MB, sau None."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    """RSS-ul maxim al procesului curent.
+
+    VmHWM pornește de la zero la exec; ru_maxrss (fallback, KB pe Linux, bytes pe
+    macOS) păstrează maximul procesului părinte dintr-un fork, deci îl folosim doar
+    unde /proc lipsește.
+    """
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def current_rss_mb():
+    """RSS-ul procesului curent (Linux /proc, altfel maximul de mai sus)."""
+    rss = _proc_status_mb("VmRSS")
+    return rss if rss is not None else peak_rss_mb()
+
+
+def sample_split(split_dir: Path, count: int, seed: int, exclude=()):
+    """(path, class_name) aleatoare, aceleași pentru toate modelele comparate.
+
+    Imaginile din ``exclude`` (ex. cele de calibrare) nu sunt alese.
+    """
+    excluded = {p for p, _ in exclude}
+    paths = [p for p in sorted(split_dir.rglob("*.jpg")) if p not in excluded]
+    if not paths:
+        raise FileNotFoundError(f"No images found in {split_dir.absolute()}")
+    rng = random.Random(seed)
+    chosen = rng.sample(paths, min(count, len(paths)))
+    return [(p, p.parent.name) for p in chosen]
+
+
+def load_image(backend: OnnxBackend, path: Path):
+    """Același decode ca serverul (utils/decode.py, JPEG draft mode) + preprocesarea backend-ului."""
+    with open(path, "rb") as f:
+        img = decode_image(f.read(), min_size=backend.decode_size, max_pixels=settings.MAX_IMAGE_PIXELS)
+    return backend.preprocess(img)
+
+
+class CalibrationReader:
+    """CalibrationDataReader pentru onnxruntime.quantization.quantize_static."""
+
+    def __init__(self, backend: OnnxBackend, samples, batch_size: int = 8):
+        self.backend = backend
+        self.samples = samples
+        self.batch_size = batch_size
+        self._iter = None
+        self.rewind()
+
+    def _batches(self):
+        for i in range(0, len(self.samples), self.batch_size):
+            chunk = self.samples[i:i + self.batch_size]
+            batch = self.backend.collate([load_image(self.backend, p) for p, _ in chunk])
+            # collate refolosește buffer-ul, calibratorul poate păstra batch-urile
+            yield {self.backend.input_name: batch.numpy().copy()}
+
+    def get_next(self):
+        return next(self._iter, None)
+
+    def rewind(self):
+        self._iter = self._batches()
+
+
+def write_sidecar(source: Path, target: Path, quantization: dict):
+    """Copiază metadata fp32 (labels, preprocesare) lângă artefactul cuantizat."""
+    with open(source.with_suffix(".onnx.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["quantization"] = quantization
+    with open(target.with_suffix(".onnx.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def quantize_dynamic(fp32: Path, output: Path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic as ort_quantize_dynamic
+
+    ort_quantize_dynamic(str(fp32), str(output), weight_type=QuantType.QInt8)
+    write_sidecar(fp32, output, {"mode": "dynamic", "weight_type": "int8"})
+
+
+def quantize_static(fp32: Path, output: Path, calibration, method: str, per_channel: bool):
+    from onnxruntime.quantization import (CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static as ort_quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    # Shape inference + optimizări de bază, recomandat înainte de cuantizarea statică
+    prepared = output.with_name(output.stem + "_prep.onnx")
+    quant_pre_process(str(fp32), str(prepared))
+
+    reference = OnnxBackend(fp32, opt_level="disable")
+    reader = CalibrationReader(reference, calibration)
+    ort_quantize_static(
+        str(prepared),
+        str(output),
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=per_channel,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method={"minmax": CalibrationMethod.MinMax,
+                          "entropy": CalibrationMethod.Entropy,
+                          "percentile": CalibrationMethod.Percentile}[method],
+    )
+    prepared.unlink(missing_ok=True)
+    write_sidecar(fp32, output, {"mode": "static", "format": "QDQ",
+                                 "calibration_method": method,
+                                 "calibration_samples": len(calibration),
+                                 "per_channel": per_channel})
+
+
+def artifact_size_mb(path: Path):
+    """Dimensiunea grafului + a eventualelor weights externe (.onnx.data)."""
+    total = path.stat().st_size
+    data = path.with_suffix(".onnx.data")
+    if data.exists():
+        total += data.stat().st_size
+    return round(total / 1e6, 2)
+
+
+def evaluate(path: Path, samples, batch_size: int, threads: int):
+    """Acuratețe top-1/top-5 pe test split + latență și memorie pentru un artefact ONNX.
+
+    Rulează într-un proces nou (vezi evaluate_isolated), deci memoria măsurată
+    aparține doar acestui artefact.
+    """
+    rss_before = current_rss_mb()
+    backend = OnnxBackend(path, opt_level="all", intra_op_threads=threads)
+    label2id = {v.replace(" ", "_").lower(): k for k, v in backend.id2label.items()}
+
+    # Warm-up, ca prima măsurătoare să nu includă inițializarea sesiunii
+    backend.predict_logits(backend.collate([backend.preprocess(Image.new("RGB", (224, 224)))]))
+    session_rss = current_rss_mb()
+
+    top1 = top5 = 0
+    forward_s = 0.0
+    for i in range(0, len(samples), batch_size):
+        chunk = samples[i:i + batch_size]
+        batch = backend.collate([load_image(backend, p) for p, _ in chunk])
+        start = time.perf_counter()
+        logits = backend.predict_logits(batch)
+        forward_s += time.perf_counter() - start
+
+        predicted = torch.topk(logits, k=5, dim=1).indices.tolist()
+        for (_, class_name), top in zip(chunk, predicted):
+            target = label2id.get(class_name)
+            top1 += int(top[0] == target)
+            top5 += int(target in top)
+
+    # Latență la batch 1 (cazul unei singure cereri)
+    single = backend.collate([load_image(backend, samples[0][0])])
+    start = time.perf_counter()
+    for _ in range(20):
+        backend.predict_logits(single)
+    latency_b1 = (time.perf_counter() - start) / 20
+
+    n = len(samples)
+    return {
+        "artifact": str(path),
+        "size_mb": artifact_size_mb(path),
+        "top1_accuracy": round(100 * top1 / n, 2),
+        "top5_accuracy": round(100 * top5 / n, 2),
+        "latency_ms_batch1": round(latency_b1 * 1000, 2),
+        f"images_per_sec_batch{batch_size}": round(n / forward_s, 1),
+        # Sesiunea ONNX + warm-up față de procesul gol, și maximul întregii evaluări
+        "session_rss_mb": round(session_rss - rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def _evaluate_child(results, path, samples, batch_size, threads):
+    try:
+        results.put(("ok", evaluate(path, samples, batch_size, threads)))
+    except Exception as e:
+        results.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def evaluate_isolated(path: Path, samples, batch_size: int, threads: int):
+    """evaluate() într-un proces nou (spawn) per artefact.
+
+    Într-un singur proces memoria eliberată de sesiunile anterioare e refolosită
+    (nu e returnată sistemului), iar ru_maxrss e maximul pe toată durata procesului,
+    deci modelele evaluate mai târziu ar apărea mai mici decât sunt.
+    """
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=_evaluate_child, args=(results, path, samples, batch_size, threads))
+    proc.start()
+    try:
+        while True:
+            try:
+                status, result = results.get(timeout=5)
+                break
+            except queue.Empty:
+                if not proc.is_alive():
+                    raise RuntimeError(f"Evaluation of {path} exited with code {proc.exitcode}")
+    finally:
+        proc.join()
+    if status != "ok":
+        raise RuntimeError(f"Evaluation of {path} failed: {result}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 quantization for the ONNX classifier")
+    parser.add_argument("--input", default=str(MODEL_DIR / "food101.onnx"), help="fp32 graph from export_onnx.py")
+    parser.add_argument("--mode", choices=["dynamic", "static", "both"], default="both")
+    parser.add_argument("--data-dir", default=str(DATA_ROOT / "test"))
+    parser.add_argument("--calibration-samples", type=int, default=256)
+    parser.add_argument("--calibration-method", choices=["minmax", "entropy", "percentile"], default="minmax")
+    parser.add_argument("--no-per-channel", action="store_true")
+    parser.add_argument("--eval-samples", type=int, default=2000, help="0 = skip the accuracy report")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", default=str(MODEL_DIR / "quantization_report.json"))
+    args = parser.parse_args()
+
+    fp32 = Path(args.input)
+    if not fp32.exists():
+        print(f"❌ Error: {fp32.absolute()} not found. Run 'python export_onnx.py' first!")
+        return
+
+    print("=" * 70)
+    print("🔢 INT8 QUANTIZATION")
+    print("=" * 70)
+
+    outputs = {"fp32": fp32}
+    data_dir = Path(args.data_dir)
+    calibration = []
+
+    if args.mode in ("dynamic", "both"):
+        out = fp32.with_name(fp32.stem + "_int8_dynamic.onnx")
+        print(f"\n⚙️  Dynamic INT8 -> {out}")
+        quantize_dynamic(fp32, out)
+        outputs["int8_dynamic"] = out
+
+    if args.mode in ("static", "both"):
+        out = fp32.with_name(fp32.stem + "_int8_static.onnx")
+        calibration = sample_split(data_dir, args.calibration_samples, args.seed + 1)
+        print(f"\n⚙️  Static INT8 ({args.calibration_method}, {len(calibration)} calibration images) -> {out}")
+        quantize_static(fp32, out, calibration, args.calibration_method, not args.no_per_channel)
+        outputs["int8_static"] = out
+
+    for name, path in outputs.items():
+        print(f"   ├─ {name}: {path} ({artifact_size_mb(path)} MB)")
+
+    if args.eval_samples <= 0:
+        return
+
+    print(f"\n📊 Evaluating on {args.eval_samples} images from {data_dir}...")
+    # Fără imaginile de calibrare: delta de acuratețe se măsoară pe imagini nevăzute
+    samples = sample_split(data_dir, args.eval_samples, args.seed, exclude=calibration)
+    threads = torch.get_num_threads()
+    report = {"eval_samples": len(samples), "calibration_samples_excluded": len(calibration),
+              "threads": threads, "models": {}}
+    for name, path in outputs.items():
+        report["models"][name] = evaluate_isolated(path, samples, args.batch_size, threads)
+        print(f"   ├─ {name}: {report['models'][name]}")
+
+    base = report["models"]["fp32"]
+    speed_key = f"images_per_sec_batch{args.batch_size}"
+    for name, result in report["models"].items():
+        if name == "fp32":
+            continue
+        result["accuracy_delta_top1"] = round(result["top1_accuracy"] - base["top1_accuracy"], 2)
+        result["accuracy_delta_top5"] = round(result["top5_accuracy"] - base["top5_accuracy"], 2)
+        result["speedup_batch1"] = round(base["latency_ms_batch1"] / result["latency_ms_batch1"], 2)
+        result["throughput_speedup"] = round(result[speed_key] / base[speed_key], 2)
+        result["size_ratio"] = round(result["size_mb"] / base["size_mb"], 3)
+        result["peak_rss_ratio"] = round(result["peak_rss_mb"] / base["peak_rss_mb"], 3)
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "=" * 70)
+    print("✅ QUANTIZATION COMPLETE")
+    print("=" * 70)
+    for name, result in report["models"].items():
+        if name == "fp32":
+            continue
+        print(f"   {name}: top-1 {result['accuracy_delta_top1']:+.2f} pp, "
+              f"{result['speedup_batch1']}x faster (batch 1), "
+              f"{result['throughput_speedup']}x throughput, size x{result['size_ratio']}, "
+              f"peak RSS x{result['peak_rss_ratio']}")
+    print(f"Report saved at: {Path(args.report).absolute()}")
+    print(f"\n🎯 Serve it with: FHC_BACKEND=onnx FHC_ONNX_PATH={outputs.get('int8_static', fp32)}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Quantization interrupted by user")
@@ -1,23 +1,57 @@
-import io
-import json
+import asyncio
+import time
 from pathlib import Path
+from typing import Literal
 
 import torch
 import torch.nn.functional as F
-from fastapi import APIRouter, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from PIL import Image
-from transformers import AutoImageProcessor, AutoModelForImageClassification
 
-from utils.health_index import compute_health_index
-from utils.nutrition_map import NUTRITION_MAP
+from utils import settings
+from utils.archives import ArchiveError, extract_images
+from utils.batching import BatchScheduler
+from utils.decode import ImageDecodeError, ImageTooLargeError, decode_image
+from utils.embedding_index import EmbeddingIndex
+from utils.metrics import BYTES_BUCKETS, NULL_TIMER, PIXELS_BUCKETS, MetricsRegistry
+from utils.backends import backend_id, create_backend, load_labels
+from utils.model_manager import ModelManager
+from utils.nutrition_table import NutritionTable, normalize_label
+from utils.prediction_cache import PredictionCache
+from utils.responses import FastJSONResponse
+from utils.uploads import UploadError, UploadGuard, read_uploads
+from utils.workers import PoolFullError, WorkerPool, configure_torch_threads, default_torch_threads
 
 router = APIRouter()
 
 ROOT = Path(__file__).resolve().parents[1]
 LABELS_FILE = ROOT / "model" / "labels_food101.json"
 
-LABELS = json.load(open(LABELS_FILE, "r", encoding="utf-8"))
+# Tabelul claselor, construit o singură dată și indexat după id-ul clasei:
+# label-urile normalizate (lowercase + underscores) pentru top-k, datele nutriționale
+# și health index-ul (vectorizat); realiniat la id2label-ul backend-ului la warm-up
+nutrition_table = NutritionTable.from_id2label(load_labels(LABELS_FILE))
+
+
+def class_fields(label, entry):
+    """Câmpurile răspunsului care depind doar de clasă (nutriție, health index, culoare, mesaj)."""
+    if entry is None:
+        # Nu toate cele 101 clase au date nutriționale complete
+        return {"nutrition": None, "health_index": None, "health_color": "#4B7BEC",
+                "message": f"No nutrition data yet for '{label}'. Coming soon! 🍽️"}
+    nutrition, hi, color, msg = entry
+    return {"nutrition": nutrition, "health_index": hi, "health_color": color, "message": msg}
+
+
+def prerender_classes(table):
+    """Câmpurile statice ale fiecărei clase, construite o singură dată (la pornire)."""
+    return [class_fields(label, table.entry(class_id)) for class_id, label in enumerate(table.labels)]
+
+
+class_responses = prerender_classes(nutrition_table)
+
+DEFAULT_TOP_K = 5
 
 # ============================================================================
 # 🧠 CUSTOM TRAINED MODEL - Food-101 Classification
@@ -47,27 +81,214 @@ LABELS = json.load(open(LABELS_FILE, "r", encoding="utf-8"))
 #       Weights-urile sunt compatibile cu training-ul nostru custom
 # ============================================================================
 
-print("=" * 70)
-print("🧠 Loading Custom Trained Model...")
-print("=" * 70)
-print("📊 Model Information:")
-print("   ├─ Architecture: EfficientNet-B0")
-print("   ├─ Dataset: Food-101 (101 classes)")
-print("   ├─ Training: 3 epochs, ~12h CPU time")
-print("   ├─ Test Accuracy: 78.04%")
-print("   └─ Status: Production-ready ✅")
-print("=" * 70)
-
-# Load model (folosim arhitectura pre-antrenată pentru compatibilitate)
-# În producție, aici am încărca weights-urile noastre custom:
-# model.load_state_dict(torch.load("model/best_model.pth"))
-MODEL_NAME = "nateraw/food"  # Arhitectura EfficientNet-B0 pentru Food-101
-processor = AutoImageProcessor.from_pretrained(MODEL_NAME)
-model = AutoModelForImageClassification.from_pretrained(MODEL_NAME)
-model.eval()
-
-print("✅ Model loaded and ready for inference!")
-print("=" * 70)
+# Worker pool pentru decode/preprocess/forward, ca event loop-ul să rămână liber
+worker_pool = WorkerPool(
+    max_workers=settings.WORKER_THREADS,
+    max_pending=settings.MAX_PENDING_REQUESTS,
+    retry_after=settings.RETRY_AFTER_SECONDS,
+)
+torch_threads = configure_torch_threads(
+    settings.TORCH_THREADS or default_torch_threads(settings.WORKER_THREADS,
+                                                    settings.PROCESS_WORKERS))
+print(f"⚙️  Worker threads: {settings.WORKER_THREADS} | Torch intra-op threads: {torch_threads}")
+
+# Load model (implicit arhitectura pre-antrenată nateraw/food, pentru compatibilitate)
+# Weights-urile noastre custom (model/best_model.pth) se încarcă cu FHC_BACKEND=timm,
+# iar graful exportat cu export_onnx.py cu FHC_BACKEND=onnx (vezi utils/backends.py).
+# Încărcarea se face în background (lifespan în app.py), nu la import,
+# ca serverul să poată porni imediat.
+model_manager = ModelManager(
+    backend_id(settings),
+    lambda: create_backend(settings),
+    version=settings.MODEL_VERSION,
+)
+
+# Cache pentru upload-uri repetate (retry, double tap, aceeași poză partajată)
+prediction_cache = PredictionCache(
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    max_bytes=settings.CACHE_MAX_BYTES,
+    ttl_seconds=settings.CACHE_TTL_SECONDS,
+    disk_dir=settings.CACHE_DIR or None,
+    disk_max_bytes=settings.CACHE_DISK_MAX_BYTES,
+)
+
+
+# Metrici Prometheus la GET /metrics: latența pe stagii, rezultate, dimensiuni
+metrics = MetricsRegistry(enabled=settings.METRICS, prefix="fhc_")
+request_count = metrics.counter(
+    "requests_total", "Requests by endpoint and HTTP status", ["endpoint", "status"])
+request_latency = metrics.histogram(
+    "request_duration_seconds", "End-to-end request latency", ["endpoint"])
+stage_latency = metrics.histogram(
+    "stage_duration_seconds",
+    "Per-image time in each stage (read, cache, decode, preprocess, queue, collate, "
+    "forward, topk, postprocess, health, search)", ["stage"])
+prediction_outcomes = metrics.counter(
+    "predictions_total", "Predictions by outcome (ok, unknown = low confidence, "
+    "no_nutrition = missing nutrition data)", ["outcome"])
+image_bytes = metrics.histogram("image_bytes", "Uploaded image size in bytes",
+                                buckets=BYTES_BUCKETS)
+image_pixels = metrics.histogram("image_pixels", "Image size in pixels, from the header",
+                                 buckets=PIXELS_BUCKETS)
+
+
+def run_batch(items):
+    """Un singur forward pass pentru un batch de imagini preprocesate.
+
+    Primește o listă de (imagine uint8 (H, W, 3), k, embedding) și întoarce, pentru
+    fiecare imagine, tuplul (results, class_ids, probs, embedding, timings): top k ca
+    listă de {"label", "score"}, id-urile și probabilitățile ca liste Python,
+    embedding-ul normalizat L2 (numpy float32, doar dacă a fost cerut, altfel None),
+    duratele batch-ului.
+    """
+    start = time.perf_counter()
+    # Normalizare vectorizată a întregului batch într-un buffer prealocat
+    batch = model_manager.backend.collate([pixel_values for pixel_values, _, _ in items])
+    collated = time.perf_counter()
+    # Embedding-ul (intrarea clasificatorului) iese din același forward pass
+    embeddings = None
+    if any(want_embedding for _, _, want_embedding in items):
+        logits, features = model_manager.backend.predict_embeddings(batch)
+        with torch.no_grad():
+            embeddings = F.normalize(features.float(), dim=1).cpu().numpy()
+    else:
+        logits = model_manager.backend.predict_logits(batch)
+    forwarded = time.perf_counter()
+    # Softmax + top-k o singură dată pe tot batch-ul (k-ul maxim cerut), apoi
+    # scoruri și indici într-un singur transfer spre Python (float64: indicii rămân exacți)
+    k = min(max(top_k for _, top_k, _ in items), logits.shape[1])
+    with torch.no_grad():
+        top = torch.topk(F.softmax(logits, dim=1), k=k)
+        rows = torch.stack((top.values.double(), top.indices.double())).tolist()
+    topked = time.perf_counter()
+
+    labels = nutrition_table.labels
+    outputs = []
+    for row, ((_, top_k, want_embedding), probs, class_ids) in enumerate(zip(items, rows[0], rows[1])):
+        class_ids = [int(i) for i in class_ids[:top_k]]
+        probs = probs[:top_k]
+        results = [{"label": labels[i], "score": round(p, 4)} for i, p in zip(class_ids, probs)]
+        outputs.append((results, class_ids, probs, embeddings[row] if want_embedding else None))
+    timings = {"collate": collated - start, "forward": forwarded - collated,
+               "topk": topked - forwarded, "postprocess": time.perf_counter() - topked}
+    return [(*output, timings) for output in outputs]
+
+
+# Cererile concurente sunt grupate în batch-uri (vezi utils/batching.py)
+scheduler = BatchScheduler(
+    run_batch,
+    max_batch_size=settings.MAX_BATCH_SIZE,
+    max_wait_ms=settings.MAX_BATCH_WAIT_MS,
+    executor=worker_pool.executor,
+)
+
+
+def decode_and_preprocess(img_bytes, timer=NULL_TIMER):
+    """Bytes -> RGB PIL image -> imagine uint8 (H, W, 3) redimensionată. Rulează în worker pool."""
+    # JPEG-urile mari se decodează direct la rezoluție redusă (vezi utils/decode.py)
+    with timer.stage("decode"):
+        img = decode_image(img_bytes, min_size=model_manager.backend.decode_size,
+                           max_pixels=settings.MAX_IMAGE_PIXELS)
+    if metrics.enabled:
+        width, height = img.info["source_size"]
+        image_pixels.observe(width * height)
+    # Aceleași transformări ca în training: resize -> crop (normalizarea
+    # se face pe tot batch-ul în run_batch), vezi utils/preprocess.py
+    with timer.stage("preprocess"):
+        return model_manager.backend.preprocess(img)
+
+
+def lookup_cache(img_bytes, mode="top1", top_k=DEFAULT_TOP_K):
+    """Hash (SHA-256 pe bytes + versiunea modelului) și lookup în cache."""
+    # Parametrii impliciți păstrează cheile existente (și cache-ul de pe disk)
+    version = model_manager.version
+    if mode != "top1":
+        version += f":{mode}"
+    if top_k != DEFAULT_TOP_K:
+        version += f":k{top_k}"
+    key = PredictionCache.make_key(img_bytes, version)
+    return key, prediction_cache.get(key)
+
+
+def align_nutrition_table():
+    """Alt backend poate avea altă ordine a claselor (ex. id2label-ul modelului HF)."""
+    global nutrition_table, class_responses
+    if not nutrition_table.matches(model_manager.backend.id2label):
+        nutrition_table = NutritionTable.from_id2label(model_manager.backend.id2label)
+        class_responses = prerender_classes(nutrition_table)
+
+
+# Indexul de embedding-uri pentru /similar (opțional, vezi build_embedding_index.py);
+# None dacă lipsește sau a fost construit cu alt model
+embedding_index = None
+
+
+def load_embedding_index():
+    """Deschide indexul (memory-mapped) dacă există și corespunde modelului servit."""
+    global embedding_index
+    path = Path(settings.EMBEDDING_INDEX)
+    if not (path / "meta.json").exists():
+        print(f"ℹ️  No embedding index at {path}, /similar is disabled "
+              f"(run 'python build_embedding_index.py')")
+        return
+    if not model_manager.backend.supports_embeddings:
+        print(f"⚠️  Warning: The {model_manager.backend.name} backend has no embeddings, /similar is disabled")
+        return
+    try:
+        index = EmbeddingIndex(path)
+    except Exception as e:
+        print(f"⚠️  Warning: Could not load the embedding index: {e}")
+        return
+    # Embedding-urile altui model nu sunt comparabile cu cele ale modelului curent
+    if index.meta.get("model_id") != model_manager.version:
+        print(f"⚠️  Warning: Embedding index built with '{index.meta.get('model_id')}', "
+              f"serving '{model_manager.version}'; rebuild it, /similar is disabled")
+        return
+    embedding_index = index
+    print(f"🧭 Embedding index: {len(index)} images, {index.dim} dims "
+          f"({index.meta['dtype']}), {index.nlist} IVF lists")
+
+
+def warmup():
+    """Un forward pass pe o imagine neagră, ca prima cerere reală să fie rapidă."""
+    align_nutrition_table()
+    img = Image.new("RGB", (224, 224))
+    run_batch([(model_manager.backend.preprocess(img), DEFAULT_TOP_K, False)])
+
+
+def load_model():
+    """Încarcă + warm-up. Blocant, rulează într-un thread separat."""
+    print("=" * 70)
+    print("🧠 Loading Custom Trained Model...")
+    print("=" * 70)
+    print("📊 Model Information:")
+    print("   ├─ Architecture: EfficientNet-B0")
+    print("   ├─ Dataset: Food-101 (101 classes)")
+    print("   ├─ Training: 3 epochs, ~12h CPU time")
+    print("   ├─ Test Accuracy: 78.04%")
+    print("   └─ Status: Production-ready ✅")
+    print("=" * 70)
+
+    # Tabelul claselor se aliniază înainte ca modelul să fie marcat ready
+    model_manager.load_and_warmup(warmup if settings.WARMUP else align_nutrition_table)
+
+    if model_manager.ready:
+        print(f"✅ Model loaded and ready for inference! "
+              f"(load {model_manager.load_time_s}s, warm-up {model_manager.warmup_time_s}s)")
+        load_embedding_index()
+    else:
+        print(f"❌ Model failed to load: {model_manager.error}")
+    print("=" * 70)
+
+
+def start_loading():
+    """Pornește încărcarea modelului fără să blocheze event loop-ul."""
+    return asyncio.get_running_loop().run_in_executor(None, load_model)
+
+
+async def shutdown():
+    await scheduler.close()
+    worker_pool.shutdown()
 
 
 @router.get("/health")
@@ -75,36 +296,368 @@ def health():
     return {"status": "ok", "service": "Food Health Classifier"}
 
 
-@router.post("/predict-image")
-async def predict_image(file: UploadFile = File(...)):
-    img_bytes = await file.read()
+@router.get("/livez")
+def livez():
+    # Liveness: procesul răspunde, indiferent dacă modelul e încărcat
+    return {"status": "alive"}
+
+
+@router.get("/readyz")
+def readyz():
+    # Readiness: trimitem trafic doar după ce modelul e încărcat și încălzit
+    if model_manager.ready:
+        return {"status": "ready"}
+    return JSONResponse(status_code=503,
+                        content={"status": "not ready", "error": model_manager.error},
+                        headers={"Retry-After": str(settings.RETRY_AFTER_SECONDS)})
+
+
+@router.get("/model-status")
+def model_status():
+    return {**model_manager.status(),
+            "embedding_index": embedding_index.describe() if embedding_index is not None else None}
+
+
+@router.get("/batching-stats")
+def batching_stats():
+    return {**scheduler.stats(), **worker_pool.stats()}
+
+
+@router.get("/cache-stats")
+def cache_stats():
+    return prediction_cache.stats()
+
+
+@metrics.collector
+def runtime_metrics():
+    """Scheduler, worker pool, cache și model: citite din stats() la fiecare scrape."""
+    batching = scheduler.stats()
+    pool = worker_pool.stats()
+    cache = prediction_cache.stats()
+
+    # Histograma batch-urilor (dimensiune exactă -> număr) în bucket-uri cumulative
+    sizes = {int(size): count for size, count in batching["batch_size_histogram"].items()}
+    max_size = batching["max_batch_size"]
+    bounds = sorted({2 ** i for i in range(max_size.bit_length())} | {max_size})
+    batch_size = [("batch_size_bucket", {"le": str(bound)},
+                   sum(count for size, count in sizes.items() if size <= bound))
+                  for bound in bounds]
+    batch_size += [("batch_size_bucket", {"le": "+Inf"}, batching["batches_total"]),
+                   ("batch_size_sum", {}, batching["items_total"]),
+                   ("batch_size_count", {}, batching["batches_total"])]
+
+    return [
+        ("batch_size", "histogram", "Images per forward pass", batch_size),
+        ("batch_queue_depth", "gauge", "Images waiting for the next batch",
+         [("batch_queue_depth", {}, batching["queue_depth"])]),
+        ("batch_errors_total", "counter", "Failed forward passes",
+         [("batch_errors_total", {}, batching["errors_total"])]),
+        ("pending_requests", "gauge", "Requests admitted and not finished",
+         [("pending_requests", {}, pool["pending_requests"])]),
+        ("rejected_requests_total", "counter", "Requests rejected with 503 (backpressure)",
+         [("rejected_requests_total", {}, pool["rejected_total"])]),
+        ("cache_lookups_total", "counter", "Prediction cache lookups by result",
+         [("cache_lookups_total", {"result": "hit"}, cache["hits"]),
+          ("cache_lookups_total", {"result": "disk_hit"}, cache["disk_hits"]),
+          ("cache_lookups_total", {"result": "miss"}, cache["misses"])]),
+        ("cache_entries", "gauge", "Entries in the in-memory prediction cache",
+         [("cache_entries", {}, cache["entries"])]),
+        ("cache_bytes", "gauge", "Bytes held by the in-memory prediction cache",
+         [("cache_bytes", {}, cache["bytes"])]),
+        ("model_ready", "gauge", "1 once the model is loaded and warmed up",
+         [("model_ready", {}, int(model_manager.ready))]),
+    ]
+
+
+@router.get("/metrics")
+def prometheus_metrics():
+    if not metrics.enabled:
+        return PlainTextResponse("Metrics are disabled (FHC_METRICS=0)\n", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def new_timer():
+    # Server-Timing are nevoie de durate chiar dacă /metrics e dezactivat
+    return metrics.timer(force=settings.SERVER_TIMING)
+
+
+def record_stages(timer):
+    if metrics.enabled:
+        for stage, seconds in timer.stages.items():
+            stage_latency.observe(seconds, stage)
+
+
+def record_request(endpoint, response, timer):
+    """Contoare + latență per endpoint și, opțional, header-ul Server-Timing."""
+    if metrics.enabled:
+        request_count.inc(endpoint, response.status_code)
+        request_latency.observe(timer.total(), endpoint)
+        record_stages(timer)
+    if settings.SERVER_TIMING:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return response
+
+
+def busy_response(e: PoolFullError):
+    return JSONResponse(status_code=503,
+                        content={"error": "Server busy, please retry"},
+                        headers={"Retry-After": str(e.retry_after)})
+
+
+# Body-ul e citit în streaming (utils/uploads.py), nu prin UploadFile;
+# schema de mai jos păstrează câmpurile formularului în documentația OpenAPI
+def upload_schema(field, many=False):
+    file_schema = {"type": "string", "format": "binary"}
+    if many:
+        file_schema = {"type": "array", "items": file_schema}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "required": [field], "properties": {field: file_schema}}}}}}
+
+
+# Marjă pentru header-ele multipart peste dimensiunea fișierului
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def new_image_guard(filename):
+    return UploadGuard(filename, max_bytes=settings.MAX_UPLOAD_BYTES,
+                       max_pixels=settings.MAX_IMAGE_PIXELS)
+
+
+def new_batch_guard(filename):
+    # Arhivele zip/tar sunt limitate doar de dimensiunea totală a cererii
+    return UploadGuard(filename, max_bytes=settings.MAX_UPLOAD_BYTES,
+                       max_pixels=settings.MAX_IMAGE_PIXELS, allow_archives=True,
+                       max_archive_bytes=settings.MAX_BATCH_UPLOAD_BYTES)
+
+
+def upload_error_response(e: UploadError):
+    return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+
+
+def missing_file_response(field):
+    return JSONResponse(status_code=422, content={"error": f"No file uploaded (form field '{field}')"})
+
+
+# mode=top1: nutriția clasei de top (doar peste 50% confidence);
+# mode=blend: în plus, estimarea ponderată cu probabilitățile din top k (câmpul "estimate")
+ResponseMode = Literal["top1", "blend"]
+# Numărul de predicții din răspuns (cheia rămâne "top5" pentru compatibilitate)
+TopK = Query(DEFAULT_TOP_K, ge=1, le=101, description="Number of predictions returned in 'top5'")
+
+
+@router.post("/predict-image", openapi_extra=upload_schema("file"))
+async def predict_image(request: Request, mode: ResponseMode = "top1", top_k: int = TopK):
+    timer = new_timer()
+    try:
+        with worker_pool.admit():
+            response = await classify_upload(request, timer, mode, top_k)
+    except PoolFullError as e:
+        response = busy_response(e)
+    return record_request("/predict-image", response, timer)
+
+
+def not_ready_response():
+    return JSONResponse(status_code=503,
+                        content={"error": "Model is loading, please retry"},
+                        headers={"Retry-After": str(settings.RETRY_AFTER_SECONDS)})
+
+
+async def classify_upload(request: Request, timer=NULL_TIMER, mode="top1", top_k=DEFAULT_TOP_K):
+    if not model_manager.ready:
+        return not_ready_response()
+
+    img_bytes, error = await read_single_upload(request, timer)
+    if error is not None:
+        return error
 
     try:
-        img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-    except:
-        return JSONResponse(status_code=400,
-                            content={"error": "Invalid image"})
-
-    # Preprocessing cu procesorul antrenat
-    # Aceleași transformări ca în training: resize -> normalize -> tensor
-    inputs = processor(images=img, return_tensors="pt")
-    
+        content, cache_hit = await classify_bytes(img_bytes, timer, mode, top_k)
+    except ImageTooLargeError:
+        return image_too_large_response()
+    except ImageDecodeError:
+        return invalid_image_response()
+
+    return FastJSONResponse(content=content, headers={"X-Cache": "HIT" if cache_hit else "MISS"})
+
+
+async def read_single_upload(request: Request, timer=NULL_TIMER):
+    """Citește câmpul "file" -> (bytes, None) sau (None, răspunsul de eroare)."""
+    # Upload-urile prea mari sau care nu sunt imagini se opresc la primii bytes
+    try:
+        with timer.stage("read"):
+            guards = await read_uploads(
+                request, new_image_guard,
+                max_body_bytes=settings.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+                max_files=1, stop_on_error=True)
+            if not guards:
+                return None, missing_file_response("file")
+            return guards[0].finish(), None
+    except UploadError as e:
+        return None, upload_error_response(e)
+
+
+def image_too_large_response():
+    return JSONResponse(status_code=413, content={"error": "Image too large"})
+
+
+def invalid_image_response():
+    return JSONResponse(status_code=400, content={"error": "Invalid image"})
+
+
+async def preprocess_bytes(img_bytes, timer=NULL_TIMER):
+    """decode_and_preprocess în worker pool; orice eroare de decode devine ImageDecodeError."""
+    try:
+        return await worker_pool.run(decode_and_preprocess, img_bytes, timer)
+    except ImageDecodeError:
+        raise
+    except Exception as e:
+        raise ImageDecodeError(str(e)) from e
+
+
+async def submit(pixel_values, timer=NULL_TIMER, top_k=DEFAULT_TOP_K, want_embedding=False):
+    """Trimite imaginea în scheduler și adaugă duratele batch-ului în ``timer``."""
+    submitted = time.perf_counter()
+    output = await scheduler.submit((pixel_values, top_k, want_embedding))
+    waited = time.perf_counter() - submitted
+    batch_timings = output[-1]
+    # Timpul până la începutul forward pass-ului = așteptarea în coadă
+    timer.add("queue", max(0.0, waited - sum(batch_timings.values())))
+    for stage, seconds in batch_timings.items():
+        timer.add(stage, seconds)
+    return output
+
+
+async def classify_bytes(img_bytes, timer=NULL_TIMER, mode="top1", top_k=DEFAULT_TOP_K):
+    """Clasifică o imagine -> (răspuns, cache_hit). Aruncă ImageDecodeError.
+
+    Duratele fiecărui stagiu se adaugă în ``timer`` (vezi utils/metrics.py).
+    """
+    if metrics.enabled:
+        image_bytes.observe(len(img_bytes))
+
+    # Aceeași poză încărcată din nou -> răspuns direct din cache
+    cache_key = None
+    if prediction_cache.enabled:
+        with timer.stage("cache"):
+            cache_key, cached = await worker_pool.run(lookup_cache, img_bytes, mode, top_k)
+        if cached is not None:
+            record_outcome(cached)
+            return cached, True
+
+    pixel_values = await preprocess_bytes(img_bytes, timer)
+
     # Inferență cu modelul nostru antrenat
-    # Forward pass prin EfficientNet-B0 → softmax → top 5 predictions
-    with torch.no_grad():
-        outputs = model(**inputs)
-        logits = outputs.logits
-        probs = F.softmax(logits, dim=1)[0]
-        top5 = torch.topk(probs, k=5)
-
-    results = []
-    for score, idx in zip(top5.values, top5.indices):
-        # Extragem label-ul din mapping-ul Food-101
-        predicted_class = model.config.id2label[idx.item()]
-        # Normalizăm formatul (lowercase + underscores)
-        label = predicted_class.replace(" ", "_").lower()
-        results.append({"label": label, "score": round(score.item(), 4)})
+    # Forward pass prin EfficientNet-B0 → softmax → top k predictions (cu label-uri),
+    # împreună cu celelalte cereri sosite în același timp
+    results, class_ids, probs, _, batch_timings = await submit(pixel_values, timer, top_k)
+
+    with timer.stage("health"):
+        content = build_response(results, class_ids[0])
+        if mode == "blend":
+            # Aceleași probabilități softmax, fără alt forward pass
+            content["estimate"] = nutrition_table.blend(class_ids, probs)
+    record_outcome(content)
+    if cache_key is not None:
+        await worker_pool.run(prediction_cache.put, cache_key, content)
+    return content, False
+
+
+def record_outcome(content):
+    if metrics.enabled:
+        if content["food"] == "Unknown":
+            outcome = "unknown"
+        elif content["nutrition"] is None:
+            outcome = "no_nutrition"
+        else:
+            outcome = "ok"
+        prediction_outcomes.inc(outcome)
+
+
+@router.post("/predict-images", openapi_extra=upload_schema("files", many=True))
+async def predict_images(request: Request, mode: ResponseMode = "top1", top_k: int = TopK):
+    """Mai multe imagini (sau arhive zip/tar) într-o singură cerere.
+
+    Toate imaginile intră simultan în scheduler, deci sunt clasificate în
+    unul sau mai multe forward pass-uri batch-uite.
+    """
+    timer = new_timer()
+    try:
+        with worker_pool.admit():
+            response = await classify_many(request, timer, mode, top_k)
+    except PoolFullError as e:
+        response = busy_response(e)
+    return record_request("/predict-images", response, timer)
+
 
+async def classify_many(request: Request, timer=NULL_TIMER, mode="top1", top_k=DEFAULT_TOP_K):
+    if not model_manager.ready:
+        return not_ready_response()
+
+    # Fișierele respinse (tip necunoscut, prea mari) devin erori per imagine;
+    # doar depășirea limitei totale oprește citirea cererii
+    try:
+        with timer.stage("read"):
+            guards = await read_uploads(
+                request, new_batch_guard,
+                max_body_bytes=settings.MAX_BATCH_UPLOAD_BYTES,
+                max_files=settings.MAX_IMAGES_PER_REQUEST, stop_on_error=False)
+    except UploadError as e:
+        return upload_error_response(e)
+    if not guards:
+        return missing_file_response("files")
+
+    # Expandăm arhivele în imagini individuale; membrii trec prin aceleași verificări
+    # ca un upload direct, iar totalul dezarhivat e limitat pe toată cererea
+    items = []
+    expanded = 0
+    for guard in guards:
+        try:
+            data = guard.finish()
+        except UploadError as e:
+            items.append((guard.filename, e))
+            continue
+        if guard.is_archive:
+            try:
+                members, expanded = await worker_pool.run(
+                    extract_images, data, settings.MAX_IMAGES_PER_REQUEST,
+                    settings.MAX_ARCHIVE_BYTES, new_image_guard, expanded)
+            except ArchiveError as e:
+                # O arhivă invalidă devine o eroare doar pentru ea, ca decode-ul eșuat
+                items.append((guard.filename, e))
+                continue
+            items.extend(members)
+        else:
+            items.append((guard.filename, data))
+
+        if len(items) > settings.MAX_IMAGES_PER_REQUEST:
+            return JSONResponse(status_code=413, content={
+                "error": f"Too many images (max {settings.MAX_IMAGES_PER_REQUEST} per request)"})
+
+    async def classify_item(filename, img_bytes):
+        if isinstance(img_bytes, (UploadError, ArchiveError)):
+            return {"filename": filename, "error": str(img_bytes)}
+        # Stagiile fiecărei imagini intră separat în histograma per stagiu
+        item_timer = new_timer()
+        try:
+            content, _ = await classify_bytes(img_bytes, item_timer, mode, top_k)
+        except ImageTooLargeError:
+            return {"filename": filename, "error": "Image too large"}
+        except ImageDecodeError:
+            return {"filename": filename, "error": "Invalid image"}
+        finally:
+            record_stages(item_timer)
+        return {"filename": filename, **content}
+
+    results = await asyncio.gather(*(classify_item(name, data) for name, data in items))
+    return FastJSONResponse(content={
+        "count": len(results),
+        "errors": sum(1 for r in results if "error" in r),
+        "results": list(results),
+    })
+
+
+def build_response(results, class_id):
+    """Top k + id-ul clasei de top -> răspunsul complet (food, nutrition, health index, mesaj)."""
     # BEST PREDICTION
     label = results[0]["label"]
     confidence = results[0]["score"]
@@ -112,7 +665,7 @@ async def predict_image(file: UploadFile = File(...)):
     # Aplicăm threshold de confidence (setat empiric în training)
     # Dacă modelul nu e sigur (< 50%), returnăm "Unknown"
     if confidence < 0.50:
-        return JSONResponse(content={
+        return {
             "food": "Unknown",
             "confidence": confidence,
             "nutrition": None,
@@ -120,33 +673,102 @@ async def predict_image(file: UploadFile = File(...)):
             "health_color": "#999999",
             "message": f"🤔 Hmm, not confident enough ({confidence*100:.1f}%). Try a prepared dish like pizza, burger, pasta, etc.",
             "top5": results
-        })
+        }
 
-    # Verificăm dacă avem date nutriționale pentru această clasă
-    # (nu toate cele 101 clase au date nutriționale complete)
-    if label not in NUTRITION_MAP:
-        return JSONResponse(content={
-            "food": label,
-            "confidence": confidence,
-            "nutrition": None,
-            "health_index": None,
-            "health_color": "#4B7BEC",
-            "message": f"No nutrition data yet for '{label}'. Coming soon! 🍽️",
-            "top5": results
-        })
-
-    # Predicție validă cu date nutriționale complete ✅
-    # Calculăm health index bazat pe macronutrienți
-    nutrition = NUTRITION_MAP[label]
-    hi, color, msg = compute_health_index(nutrition)
-
-    return JSONResponse(content={
+    # Predicție validă: nutriția, health index-ul (bazat pe macronutrienți) și mesajul
+    # clasei sunt deja construite; per cerere se adaugă doar food/confidence/top5
+    return {
         "food": label,
         "confidence": confidence,
-        "nutrition": nutrition,
-        "health_index": hi,
-        "health_color": color,
-        "message": msg,
+        **class_responses[class_id],
         "top5": results
-    })
+    }
 
+
+# ============================================================================
+# 🧭 EMBEDDINGS + SIMILAR DISHES
+# ============================================================================
+# Vectorul penultim al modelului (intrarea clasificatorului, normalizat L2) iese
+# din același forward pass batch-uit ca predicția. /similar îl caută în indexul
+# IVF al imaginilor de referință (vezi utils/embedding_index.py): "looks like"
+# + detecția de near-duplicate. Răspunsurile nu trec prin cache-ul de predicții.
+
+@router.post("/embed", openapi_extra=upload_schema("file"))
+async def embed_image(request: Request):
+    timer = new_timer()
+    try:
+        with worker_pool.admit():
+            response = await embed_upload(request, timer)
+    except PoolFullError as e:
+        response = busy_response(e)
+    return record_request("/embed", response, timer)
+
+
+@router.post("/similar", openapi_extra=upload_schema("file"))
+async def similar_images(
+    request: Request,
+    k: int = Query(10, ge=1, le=settings.SIMILAR_MAX_K, description="Number of similar images"),
+    nprobe: int = Query(settings.SIMILAR_NPROBE, ge=1, description="IVF lists scanned"),
+):
+    timer = new_timer()
+    try:
+        with worker_pool.admit():
+            response = await embed_upload(request, timer, similar_k=k, nprobe=nprobe)
+    except PoolFullError as e:
+        response = busy_response(e)
+    return record_request("/similar", response, timer)
+
+
+async def embed_upload(request: Request, timer=NULL_TIMER, similar_k=None, nprobe=1):
+    """Embedding-ul imaginii (/embed) sau, cu ``similar_k``, cele mai apropiate imagini (/similar)."""
+    if not model_manager.ready:
+        return not_ready_response()
+    if not model_manager.backend.supports_embeddings:
+        return JSONResponse(status_code=501, content={
+            "error": f"The {model_manager.backend.name} backend does not expose embeddings"})
+    # Referință locală: indexul poate fi înlocuit între timp
+    index = embedding_index
+    if similar_k is not None and index is None:
+        return JSONResponse(status_code=503, content={
+            "error": "No embedding index loaded (run 'python build_embedding_index.py')"})
+
+    img_bytes, error = await read_single_upload(request, timer)
+    if error is not None:
+        return error
+    if metrics.enabled:
+        image_bytes.observe(len(img_bytes))
+
+    try:
+        pixel_values = await preprocess_bytes(img_bytes, timer)
+    except ImageTooLargeError:
+        return image_too_large_response()
+    except ImageDecodeError:
+        return invalid_image_response()
+
+    results, _, _, embedding, _ = await submit(pixel_values, timer, top_k=1, want_embedding=True)
+    prediction = {"food": results[0]["label"], "confidence": results[0]["score"]}
+
+    if similar_k is None:
+        return FastJSONResponse(content={
+            **prediction,
+            "model_version": model_manager.version,
+            "dim": len(embedding),
+            "embedding": embedding.tolist(),
+        })
+
+    start = time.perf_counter()
+    scores, ids = await worker_pool.run(index.search, embedding, similar_k, nprobe)
+    searched = time.perf_counter() - start
+    timer.add("search", searched)
+    labels = index.classes
+    return FastJSONResponse(content={
+        **prediction,
+        "count": len(ids),
+        "search_ms": round(searched * 1000, 2),
+        "results": [{
+            "path": index.paths[i],
+            "label": normalize_label(labels[index.labels[i]]) if labels else int(index.labels[i]),
+            "score": round(score, 4),
+            "near_duplicate": score >= settings.NEAR_DUPLICATE_THRESHOLD,
+        } for score, i in zip(scores.tolist(), ids.tolist())],
+    })
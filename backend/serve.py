@@ -0,0 +1,102 @@
+"""
+Pornește serverul cu mai multe procese uvicorn care împart aceleași weights
+
+1. Procesul părinte încarcă modelul o singură dată și scrie toate weights-urile
+   într-un fișier din /dev/shm (adică în RAM), plus metadata (labels, preprocesare,
+   config-ul arhitecturii), vezi utils/shared_weights.py.
+2. Fiecare worker uvicorn construiește arhitectura fără weights și mapează
+   fișierul cu torch.load(mmap=True): paginile sunt partajate între procese,
+   nu copiate, iar pornirea unui worker nu mai descarcă/citește modelul.
+3. Core-urile se împart între procese (FHC_PROCESS_WORKERS): fiecare worker
+   folosește cpu_count / workers thread-uri torch, fără oversubscription.
+
+Backend-ul onnx nu are weights partajabile (sesiunea ONNX Runtime e per proces);
+în cazul lui se pornesc doar workerii, cu thread-urile împărțite.
+
+Exemplu:
+    python serve.py --workers 4 --port 8000
+    FHC_BACKEND=timm python serve.py --workers 2
+"""
+import argparse
+import gc
+import os
+import time
+
+from utils.shared_weights import (DEFAULT_SHARED_DIR, read_meta, save_shared_weights, shared_weights_path,
+                                  source_files, source_fingerprint)
+
+
+def prepare_shared_weights(shared_dir, rebuild: bool):
+    """Încarcă modelul o dată și scrie fișierul partajat (sau îl refolosește)."""
+    from utils import settings
+    from utils.backends import backend_id, create_backend
+    from utils.model_manager import ModelManager
+
+    # Aceeași versiune ca în cheia cache-ului: alt model sau FHC_MODEL_VERSION => alt fișier
+    version = ModelManager(backend_id(settings), None, version=settings.MODEL_VERSION).version
+    # Un checkpoint reantrenat la aceeași cale (timm) are altă dimensiune/mtime => alt fișier
+    fingerprint = source_fingerprint(source_files(settings))
+    path = shared_weights_path(shared_dir, version, fingerprint)
+
+    if path.exists() and not rebuild:
+        try:
+            meta = read_meta(path)
+            if meta["model_version"] == version and meta.get("source_fingerprint", "") == fingerprint:
+                print(f"♻️  Reusing shared weights: {path}")
+                return path
+        except (OSError, ValueError, KeyError):
+            pass
+
+    print(f"🧠 Loading {version} once for all workers...")
+    start = time.perf_counter()
+    backend = create_backend(settings)
+    save_shared_weights(backend, path, version, fingerprint)
+    size_mb = path.stat().st_size / 1e6
+    print(f"✅ Shared weights written: {path} ({size_mb:.1f} MB, {time.perf_counter() - start:.1f}s)")
+
+    # Părintele doar supraveghează workerii, nu are nevoie de model
+    del backend
+    gc.collect()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process server with shared model weights")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--shared-dir", default=str(DEFAULT_SHARED_DIR))
+    parser.add_argument("--rebuild", action="store_true", help="rewrite the shared weights file")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    # Setate înainte de importul setărilor, ca și părintele să le vadă
+    os.environ["FHC_PROCESS_WORKERS"] = str(workers)
+
+    from utils import settings
+    from utils.workers import default_torch_threads
+
+    print("=" * 70)
+    print(f"🚀 STARTING {workers} SERVER PROCESSES")
+    print("=" * 70)
+
+    if settings.BACKEND in ("hf", "timm"):
+        path = prepare_shared_weights(args.shared_dir, args.rebuild)
+        os.environ["FHC_SHARED_WEIGHTS"] = str(path)
+    else:
+        print(f"⚠️  Backend '{settings.BACKEND}' keeps one model copy per process")
+
+    threads = settings.TORCH_THREADS or default_torch_threads(settings.WORKER_THREADS, workers)
+    print(f"⚙️  Per process: {settings.WORKER_THREADS} worker threads, {threads} torch threads "
+          f"({os.cpu_count()} CPUs / {workers} processes)")
+    print("=" * 70)
+
+    import uvicorn
+
+    uvicorn.run("app:app", host=args.host, port=args.port, workers=workers,
+                log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
 """
 Antrenează un model EfficientNet-B0 pe Food-101 dataset
 Rezultat: model antrenat salvat în model/best_model.pth
+
+Exemplu:
+    python train_model.py
+    python train_model.py --shards data/food101_shards   (după pack_shards.py)
+    python train_model.py --bf16 --channels-last --compile   (mod rapid pe CPU)
+    torchrun --nproc_per_node 4 train_model.py                 (DDP, gloo)
+    torchrun --nnodes 2 --node_rank 0 --master_addr host0 --nproc_per_node 8 train_model.py
+    python train_model.py --resume                             (continuă din ultimul checkpoint)
+    python train_model.py --autotune                           (batch size și workeri măsurați pe host)
 """
+import argparse
+import os
+import sys
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, DistributedSampler
 from torchvision import datasets, transforms
 import timm
 from pathlib import Path
@@ -13,30 +25,100 @@ import json
 from tqdm import tqdm
 import time
 
+from utils.preprocess import Preprocessor
+from utils.autotune import autotune
+from utils.checkpoints import CheckpointManager, SkipSampler, set_rng_state
+from utils.distributed import (accumulation_steps, all_reduce_min, all_reduce_sum, any_rank,
+                               broadcast_buffers, broadcast_object, cleanup_distributed,
+                               default_micro_batch, fit_micro_batch, init_distributed, rank_indices)
+from utils.eval_cache import load_eval_cache
+from utils.shards import ShardDataset, ShardIterableDataset
+from utils.training import TrainingMode, measure_train_throughput
+
 # ========== CONFIGURAȚIE ==========
 DATA_ROOT = Path("data/food101_split")
 SAVE_DIR = Path("model")
 SAVE_DIR.mkdir(exist_ok=True)
 
-BATCH_SIZE = 32  # Reduce la 16 dacă ai probleme cu memoria
+BATCH_SIZE = 32  # Reduce la 16 dacă ai probleme cu memoria (sau folosește --autotune)
 NUM_EPOCHS = 10  # Poți face mai multe pentru acuratețe mai mare (20-30 epochs ideal)
 LEARNING_RATE = 0.001
 NUM_WORKERS = 4  # Paralel data loading (reduce la 0 dacă ai probleme)
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train EfficientNet-B0 on Food-101")
+    parser.add_argument("--shards", default=None,
+                        help="packed shard directory from pack_shards.py (default: ImageFolder over DATA_ROOT)")
+    parser.add_argument("--shuffle-buffer", type=int, default=2000,
+                        help="per-worker shuffle buffer when reading shards")
+    parser.add_argument("--eval-cache-dir", default="data/eval_cache",
+                        help="where the preprocessed uint8 test set is cached between epochs and runs")
+    parser.add_argument("--no-eval-cache", action="store_true",
+                        help="decode the test images every epoch instead")
+    # Mod rapid (opt-in): checkpoint-urile rămân în formatul obișnuit (fp32, state_dict necompilat)
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 autocast for forward + loss")
+    parser.add_argument("--channels-last", action="store_true", help="NHWC model and inputs")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the model when available")
+    parser.add_argument("--compare-steps", type=int, default=10,
+                        help="training steps timed for the fp32 vs selected mode comparison (0 = skip)")
+    # DDP (torchrun): BATCH_SIZE rămâne batch-ul efectiv = micro-batch x procese x pași de acumulare
+    parser.add_argument("--micro-batch", type=int, default=None,
+                        help="per-process batch under torchrun (default: BATCH_SIZE / processes); "
+                             "gradients are accumulated to keep the effective batch at BATCH_SIZE")
+    # Checkpoint-uri complete (model, optimizer, scheduler, RNG, istoric), scrise atomic
+    parser.add_argument("--resume", nargs="?", const="latest", default=None,
+                        help="continue from a checkpoint file, or the latest in model/checkpoints/")
+    parser.add_argument("--checkpoint-minutes", type=float, default=30.0,
+                        help="save a checkpoint at least this often (0 = only at epoch end)")
+    parser.add_argument("--checkpoint-steps", type=int, default=0,
+                        help="also save every N optimizer steps (0 = off)")
+    parser.add_argument("--keep-checkpoints", type=int, default=3, help="how many checkpoints to keep")
+    parser.add_argument("--seed", type=int, default=0, help="data order seed (needed to resume mid-epoch)")
+    # Autotune: batch size din memoria disponibilă, workeri/prefetch din throughput, cache per host
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help=f"effective batch size (default: {BATCH_SIZE}, or the tuned batch with --autotune)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"DataLoader workers (default: {NUM_WORKERS}, or the tuned value with --autotune)")
+    parser.add_argument("--autotune", action="store_true",
+                        help="measure the largest batch that fits in memory and the fastest "
+                             "workers/prefetch on this host (cached in --autotune-dir)")
+    parser.add_argument("--retune", action="store_true", help="ignore the cached autotune result")
+    parser.add_argument("--memory-budget", type=float, default=0.7,
+                        help="fraction of the currently available memory the tuned batch may use")
+    parser.add_argument("--autotune-dir", default="data/autotune", help="autotune cache directory")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    dist_ctx = init_distributed()
+    try:
+        train(args, dist_ctx)
+    finally:
+        cleanup_distributed(dist_ctx)
+
+def train(args, dist_ctx):
+    if not dist_ctx.is_main:
+        # Doar rank 0 afișează progresul și scrie fișiere
+        sys.stdout = open(os.devnull, "w")
+    batch_size = args.batch_size or BATCH_SIZE
+    num_workers = NUM_WORKERS if args.workers is None else args.workers
+    prefetch_factor = None
+    
     print("="*70)
     print("🧠 FOOD-101 MODEL TRAINING")
     print("="*70)
     print(f"Device: {DEVICE}")
-    print(f"Batch size: {BATCH_SIZE}")
+    print(f"Batch size: {batch_size if args.batch_size or not args.autotune else 'auto'}")
     print(f"Epochs: {NUM_EPOCHS}")
     print(f"Learning rate: {LEARNING_RATE}")
+    mode = TrainingMode(DEVICE, bf16=args.bf16, channels_last=args.channels_last, compile=args.compile)
+    print(f"Training mode: {mode.describe()}")
     print()
     
     # Verifică dacă dataset-ul există
-    if not DATA_ROOT.exists():
+    if args.shards is None and not DATA_ROOT.exists():
         print(f"❌ Error: Dataset not found at {DATA_ROOT.absolute()}")
         print("   Please run 'python prepare_dataset.py' first!")
         return
@@ -44,66 +126,167 @@ def main():
     # ========== TRANSFORMĂRI IMAGINI ==========
     print("🖼️  Setting up image transformations...")
     
+    # Preprocesarea deterministă comună cu serving-ul (utils/preprocess.py):
+    # Resize((256, 256)) -> CenterCrop(224) -> normalizare ImageNet
+    preprocessor = Preprocessor()
+    
     # Transformări pentru TRAINING (cu augmentări)
     train_transform = transforms.Compose([
-        transforms.Resize((256, 256)),
-        transforms.RandomCrop(224),
+        transforms.Resize(preprocessor.resize),
+        transforms.RandomCrop(preprocessor.crop),
         transforms.RandomHorizontalFlip(),
         transforms.RandomRotation(10),
         transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2),
         transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+        transforms.Normalize(preprocessor.mean, preprocessor.std)
     ])
     
-    # Transformări pentru TEST (fără augmentări)
-    test_transform = transforms.Compose([
-        transforms.Resize((256, 256)),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
+    # Transformări pentru TEST (fără augmentări): DataLoader-ul întoarce uint8,
+    # normalizarea se face vectorizat pe tot batch-ul, într-un buffer refolosit
+    test_transform = preprocessor.uint8_tensor
     
     # ========== ÎNCARCĂ DATASET ==========
     print("📂 Loading datasets...")
     try:
-        train_dataset = datasets.ImageFolder(DATA_ROOT / "train", transform=train_transform)
-        test_dataset = datasets.ImageFolder(DATA_ROOT / "test", transform=test_transform)
+        if args.shards:
+            # Shard-uri mari citite prin mmap: secvențial, câte un shard per worker,
+            # amestecate printr-un shuffle buffer (nu prin DataLoader)
+            train_dataset = ShardIterableDataset(args.shards, "train", transform=train_transform,
+                                                 shuffle_buffer=args.shuffle_buffer)
+            test_dataset = ShardDataset(args.shards, "test", transform=test_transform)
+        else:
+            train_dataset = datasets.ImageFolder(DATA_ROOT / "train", transform=train_transform)
+            test_dataset = datasets.ImageFolder(DATA_ROOT / "test", transform=test_transform)
     except Exception as e:
         print(f"❌ Error loading dataset: {e}")
         return
     
+    # Fiecare proces vede o parte din train (DistributedSampler / shard-uri pe rank)
+    # și o felie contiguă din test, fără padding, deci fiecare imagine contează o dată.
+    # Ordinea depinde doar de seed + epocă, ca o rulare reluată să poată sări ce a văzut.
+    train_sampler = None
+    if not args.shards:
+        train_sampler = SkipSampler(DistributedSampler(
+            train_dataset, num_replicas=dist_ctx.world_size, rank=dist_ctx.rank, shuffle=True, seed=args.seed))
+    else:
+        train_dataset.seed = args.seed
+    test_indices = rank_indices(len(test_dataset), dist_ctx)
+    num_classes = len(train_dataset.classes)
+    
+    # ========== AUTOTUNE ==========
+    # Un singur proces per host măsoară (memoria și core-urile sunt comune), ceilalți
+    # citesc rezultatul din cache; toate procesele folosesc apoi minimul găsit
+    if args.autotune:
+        tune_kwargs = dict(num_classes=num_classes, arch="efficientnet_b0",
+                           workload={"mode": mode.to_dict(), "data": "shards" if args.shards else "imagefolder"},
+                           cache_dir=args.autotune_dir, budget_fraction=args.memory_budget,
+                           local_processes=dist_ctx.local_world_size)
+        if dist_ctx.local_rank == 0:
+            tuned = autotune(mode, train_dataset, retune=args.retune, **tune_kwargs)
+        dist_ctx.barrier()
+        if dist_ctx.local_rank != 0:
+            tuned = autotune(mode, train_dataset, **tune_kwargs)
+        tuned_batch, tuned_workers, tuned_prefetch = all_reduce_min(
+            [tuned["batch_size"], tuned["num_workers"], tuned["prefetch_factor"]], dist_ctx)
+        if args.batch_size:
+            # Batch-ul efectiv e fixat: cel mai mare micro-batch care încape, restul prin acumulare
+            micro_batch = args.micro_batch or fit_micro_batch(batch_size, tuned_batch, dist_ctx)
+        else:
+            micro_batch = args.micro_batch or tuned_batch
+            batch_size = micro_batch * dist_ctx.world_size
+        if args.workers is None:
+            num_workers = tuned_workers
+            prefetch_factor = tuned_prefetch or None
+        print(f"✅ Autotuned: micro-batch {micro_batch} | workers {num_workers} | "
+              f"prefetch {prefetch_factor or '-'} ({tuned['images_per_sec']:.1f} img/s measured)")
+        print()
+    else:
+        micro_batch = args.micro_batch or default_micro_batch(batch_size, dist_ctx)
+    accum_steps = accumulation_steps(batch_size, micro_batch, dist_ctx)
+    # Evaluarea (fără gradienți) folosește batch-ul efectiv, dar nu mai mult decât a încăput la autotune
+    eval_batch = micro_batch if args.autotune else batch_size
+    
+    if dist_ctx.enabled or accum_steps > 1 or args.autotune:
+        print(f"Batch size: {batch_size} | Processes: {dist_ctx.world_size} (gloo) | "
+              f"Micro-batch: {micro_batch} | Accumulation steps: {accum_steps}")
+        print()
+    
+    loader_kwargs = {"num_workers": num_workers, "pin_memory": DEVICE.type == 'cuda'}
+    if args.shards:
+        # len() = eșantioanele acestui rank, care depind de câți workeri împart shard-urile
+        train_dataset.num_workers = num_workers
+    if num_workers > 0 and prefetch_factor:
+        loader_kwargs["prefetch_factor"] = prefetch_factor
     train_loader = DataLoader(
         train_dataset, 
-        batch_size=BATCH_SIZE, 
-        shuffle=True, 
-        num_workers=NUM_WORKERS,
-        pin_memory=True if DEVICE.type == 'cuda' else False
+        batch_size=micro_batch, 
+        sampler=train_sampler,
+        **loader_kwargs
     )
     test_loader = DataLoader(
         test_dataset, 
-        batch_size=BATCH_SIZE, 
+        batch_size=eval_batch, 
         shuffle=False, 
-        num_workers=NUM_WORKERS,
-        pin_memory=True if DEVICE.type == 'cuda' else False
+        sampler=test_indices if dist_ctx.enabled else None, 
+        **loader_kwargs
     )
     
-    num_classes = len(train_dataset.classes)
     print(f"✅ Dataset loaded:")
-    print(f"   ├─ Train images: {len(train_dataset)}")
+    print(f"   ├─ Train images: {len(train_dataset.targets)}")
     print(f"   ├─ Test images: {len(test_dataset)}")
     print(f"   ├─ Classes: {num_classes}")
     print(f"   └─ Batches per epoch: {len(train_loader)}")
     print()
     
+    # Setul de test preprocesat (uint8) se calculează o singură dată și se refolosește;
+    # cheia cache-ului include parametrii transformării
+    eval_cache = None
+    if not args.no_eval_cache:
+        print("🗄️  Preparing eval cache...")
+        # Un proces per host îl construiește (data/ nu e neapărat comun între host-uri),
+        # celelalte procese de pe host îl găsesc gata după barieră
+        if dist_ctx.local_rank == 0:
+            eval_cache, built = load_eval_cache(test_dataset, preprocessor, args.eval_cache_dir,
+                                                batch_size=eval_batch, num_workers=num_workers)
+        dist_ctx.barrier()
+        if dist_ctx.local_rank != 0:
+            eval_cache, built = load_eval_cache(test_dataset, preprocessor, args.eval_cache_dir)
+        print(f"✅ Eval cache {'built' if built else 'reused'}: {eval_cache.path}")
+        print()
+    
+    def test_batches():
+        if eval_cache is None:
+            return test_loader
+        return eval_cache.batches(eval_batch, test_indices)
+    
     # ========== CREEAZĂ MODEL ==========
     print("🧠 Creating model...")
     try:
         model = timm.create_model('efficientnet_b0', pretrained=True, num_classes=num_classes)
-        model = model.to(DEVICE)
     except Exception as e:
         print(f"❌ Error creating model: {e}")
         return
     
+    # Checkpoint de reluare: citit de rank 0 și trimis tuturor proceselor
+    checkpoints = CheckpointManager(SAVE_DIR / "checkpoints", keep=args.keep_checkpoints,
+                                    every_minutes=args.checkpoint_minutes, every_steps=args.checkpoint_steps)
+    resume_state = None
+    if args.resume:
+        if dist_ctx.is_main:
+            resume_path = checkpoints.latest() if args.resume == "latest" else Path(args.resume)
+            if resume_path is None or not resume_path.exists():
+                print(f"⚠️  No checkpoint found ({args.resume}), starting from scratch")
+            else:
+                print(f"♻️  Resuming from {resume_path}")
+                resume_state = checkpoints.load(resume_path)
+        resume_state = broadcast_object(resume_state, dist_ctx)
+    if resume_state is not None:
+        if resume_state.get("micro_batch") != micro_batch or resume_state.get("world_size") != dist_ctx.world_size:
+            print("⚠️  Batch layout differs from the checkpoint: the current epoch restarts from its beginning")
+            resume_state["step"] = 0
+            resume_state["epoch_stats"] = None
+        model.load_state_dict(resume_state["model_state_dict"])
+    
     total_params = sum(p.numel() for p in model.parameters())
     trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
     print(f"✅ Model: EfficientNet-B0")
@@ -111,11 +294,49 @@ def main():
     print(f"   └─ Trainable parameters: {trainable_params:,}")
     print()
     
+    # Comparație de throughput pe un batch sintetic: bucla fp32 de bază vs modul ales
+    throughput = None
+    if dist_ctx.is_main and not mode.is_baseline and args.compare_steps > 0:
+        print(f"⏱️  Comparing training throughput ({args.compare_steps} steps, batch {micro_batch})...")
+        baseline_ips = measure_train_throughput(model, TrainingMode(DEVICE), micro_batch, num_classes,
+                                                steps=args.compare_steps)
+        mode_ips = measure_train_throughput(model, mode, micro_batch, num_classes, steps=args.compare_steps)
+        throughput = {"baseline_images_per_sec": baseline_ips, "mode_images_per_sec": mode_ips,
+                      "speedup": mode_ips / baseline_ips}
+        print(f"   ├─ fp32 NCHW (baseline): {baseline_ips:.1f} img/s")
+        print(f"   ├─ {mode.describe()}: {mode_ips:.1f} img/s")
+        print(f"   └─ Speedup: {throughput['speedup']:.2f}x")
+        print()
+    
+    # model = ce se apelează (poate compilat); mode.module = modelul salvat în checkpoint-uri
+    model = mode.prepare_model(model, distributed=dist_ctx.enabled)
+    
     # Loss function și optimizer
     criterion = nn.CrossEntropyLoss()
-    optimizer = optim.Adam(model.parameters(), lr=LEARNING_RATE)
+    optimizer = optim.Adam(mode.module.parameters(), lr=LEARNING_RATE)
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='max', factor=0.5, patience=2)
     
+    # Cu shard-uri sub DDP procesele pot avea un număr diferit de batch-uri: orice colectivă
+    # în afara DDP (decizia de checkpoint) s-ar bloca, deci salvăm doar la final de epocă
+    mid_epoch_checkpoints = not (args.shards and dist_ctx.enabled)
+    
+    def checkpoint_state(epoch, step, global_step, epoch_stats):
+        return {
+            "epoch": epoch,
+            "step": step,  # pași de optimizer deja făcuți în această epocă
+            "global_step": global_step,
+            "model_state_dict": mode.module.state_dict(),
+            "optimizer_state_dict": optimizer.state_dict(),
+            "scheduler_state_dict": scheduler.state_dict(),
+            "training_history": training_history,
+            "best_accuracy": best_accuracy,
+            "epoch_stats": epoch_stats,
+            "elapsed": time.time() - start_time,
+            "micro_batch": micro_batch,
+            "world_size": dist_ctx.world_size,
+            "batch_size": batch_size,
+        }
+    
     # ========== TRAINING LOOP ==========
     best_accuracy = 0.0
     training_history = {
@@ -123,68 +344,131 @@ def main():
         "train_acc": [],
         "test_loss": [],
         "test_acc": [],
-        "learning_rates": []
+        "learning_rates": [],
+        "train_images_per_sec": []
     }
     
+    start_epoch, resume_step, global_step = 0, 0, 0
+    epoch_stats = None
+    start_time = time.time()
+    if resume_state is not None:
+        optimizer.load_state_dict(resume_state["optimizer_state_dict"])
+        scheduler.load_state_dict(resume_state["scheduler_state_dict"])
+        training_history.update(resume_state["training_history"])
+        best_accuracy = resume_state["best_accuracy"]
+        start_epoch, resume_step = resume_state["epoch"], resume_state["step"]
+        global_step = resume_state["global_step"]
+        epoch_stats = resume_state["epoch_stats"]
+        start_time -= resume_state["elapsed"]
+        set_rng_state(resume_state["rng"])
+        checkpoints.mark(global_step)
+        print(f"♻️  Continuing at epoch {start_epoch + 1}, step {resume_step} (global step {global_step})")
+        print()
+        resume_state = None  # eliberează memoria (state dict-uri duplicate)
+    
     print("🚀 Starting training...")
     print("="*70)
-    start_time = time.time()
     
-    for epoch in range(NUM_EPOCHS):
+    for epoch in range(start_epoch, NUM_EPOCHS):
         epoch_start = time.time()
         print(f"\n{'='*70}")
         print(f"Epoch {epoch+1}/{NUM_EPOCHS}")
         print(f"{'='*70}")
         
         # ===== TRAINING PHASE =====
+        # La reluare se sar micro-batch-urile deja antrenate din epoca curentă
+        skip_batches = resume_step * accum_steps if epoch == start_epoch else 0
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch, skip=skip_batches * micro_batch)
+        else:
+            train_dataset.set_epoch(epoch, skip_batches=skip_batches, batch_size=micro_batch)
         model.train()
         train_loss = 0.0
         train_correct = 0
         train_total = 0
+        train_batches = 0  # cu shard-uri, fiecare worker are propriul ultim batch parțial
+        step = skip_batches // accum_steps
+        images_before = 0
+        if epoch == start_epoch and epoch_stats:
+            # Statisticile (deja agregate) ale părții de epocă dinaintea întreruperii,
+            # adăugate o singură dată (pe rank 0) la suma de la final
+            images_before = epoch_stats[3]
+            if dist_ctx.is_main:
+                train_loss, train_batches, train_correct, train_total = epoch_stats
+        
+        # Gradienții se acumulează pe accum_steps micro-batch-uri; all-reduce-ul DDP
+        # rulează doar pe ultimul. Un rest incomplet la final de epocă e ignorat.
+        optimizer.zero_grad()
+        train_bar = tqdm(train_loader, desc="Training", ncols=100, leave=False, disable=not dist_ctx.is_main)
+        with mode.join():
+            for micro_step, (images, labels) in enumerate(train_bar):
+                images, labels = mode.inputs(images), labels.to(DEVICE)
+                sync = (micro_step + 1) % accum_steps == 0
+                
+                # Forward + backward pass
+                with mode.no_sync(sync):
+                    with mode.autocast():
+                        outputs = model(images)
+                        loss = criterion(outputs, labels)
+                    (loss / accum_steps).backward()
+                if sync:
+                    optimizer.step()
+                    optimizer.zero_grad()
+                    step += 1
+                    global_step += 1
+                
+                # Statistics
+                train_loss += loss.item()
+                train_batches += 1
+                _, predicted = torch.max(outputs, 1)
+                train_total += labels.size(0)
+                train_correct += (predicted == labels).sum().item()
+                
+                # Update progress bar
+                train_bar.set_postfix({
+                    'loss': f'{loss.item():.4f}',
+                    'acc': f'{100 * train_correct / train_total:.2f}%'
+                })
+                
+                # Checkpoint periodic (timp / pași), doar între pași de optimizer
+                if sync and mid_epoch_checkpoints and any_rank(checkpoints.due(global_step), dist_ctx):
+                    stats = all_reduce_sum([train_loss, train_batches, train_correct, train_total], dist_ctx)
+                    if dist_ctx.is_main:
+                        path = checkpoints.save(checkpoint_state(epoch, step, global_step, stats))
+                        train_bar.write(f"💾 Checkpoint saved: {path}")
+                    else:
+                        checkpoints.mark(global_step)
         
-        train_bar = tqdm(train_loader, desc="Training", ncols=100, leave=False)
-        for images, labels in train_bar:
-            images, labels = images.to(DEVICE), labels.to(DEVICE)
-            
-            # Forward pass
-            outputs = model(images)
-            loss = criterion(outputs, labels)
-            
-            # Backward pass
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-            
-            # Statistics
-            train_loss += loss.item()
-            _, predicted = torch.max(outputs, 1)
-            train_total += labels.size(0)
-            train_correct += (predicted == labels).sum().item()
-            
-            # Update progress bar
-            train_bar.set_postfix({
-                'loss': f'{loss.item():.4f}',
-                'acc': f'{100 * train_correct / train_total:.2f}%'
-            })
+        # Statistici agregate peste toate procesele
+        train_loss, train_batches, train_correct, train_total = all_reduce_sum(
+            [train_loss, train_batches, train_correct, train_total], dist_ctx)
         
         train_accuracy = 100 * train_correct / train_total
-        avg_train_loss = train_loss / len(train_loader)
+        avg_train_loss = train_loss / train_batches
+        train_ips = (train_total - images_before) / (time.time() - epoch_start)
         
         # ===== TESTING PHASE =====
+        # Statisticile BatchNorm ale rank-ului 0 (cel salvat) în toate procesele
+        broadcast_buffers(mode.module, dist_ctx)
         model.eval()
         test_loss = 0.0
         test_correct = 0
         test_total = 0
+        test_batches_seen = 0
         
-        test_bar = tqdm(test_loader, desc="Testing", ncols=100, leave=False)
+        test_bar = tqdm(test_batches(), total=len(test_loader), desc="Testing", ncols=100, leave=False,
+                        disable=not dist_ctx.is_main)
         with torch.no_grad():
             for images, labels in test_bar:
-                images, labels = images.to(DEVICE), labels.to(DEVICE)
+                images = mode.inputs(preprocessor.normalize(images))
+                labels = labels.to(DEVICE)
                 
-                outputs = model(images)
-                loss = criterion(outputs, labels)
+                with mode.autocast():
+                    outputs = model(images)
+                    loss = criterion(outputs, labels)
                 
                 test_loss += loss.item()
+                test_batches_seen += 1
                 _, predicted = torch.max(outputs, 1)
                 test_total += labels.size(0)
                 test_correct += (predicted == labels).sum().item()
@@ -194,8 +478,10 @@ def main():
                     'acc': f'{100 * test_correct / test_total:.2f}%'
                 })
         
+        test_loss, test_batches_seen, test_correct, test_total = all_reduce_sum(
+            [test_loss, test_batches_seen, test_correct, test_total], dist_ctx)
         test_accuracy = 100 * test_correct / test_total
-        avg_test_loss = test_loss / len(test_loader)
+        avg_test_loss = test_loss / test_batches_seen
         
         # Update learning rate scheduler
         scheduler.step(test_accuracy)
@@ -207,6 +493,7 @@ def main():
         training_history["test_loss"].append(avg_test_loss)
         training_history["test_acc"].append(test_accuracy)
         training_history["learning_rates"].append(current_lr)
+        training_history["train_images_per_sec"].append(train_ips)
         
         epoch_time = time.time() - epoch_start
         
@@ -215,28 +502,27 @@ def main():
         print(f"   ├─ Train Loss: {avg_train_loss:.4f} | Train Acc: {train_accuracy:.2f}%")
         print(f"   ├─ Test Loss:  {avg_test_loss:.4f} | Test Acc:  {test_accuracy:.2f}%")
         print(f"   ├─ Learning Rate: {current_lr:.6f}")
+        print(f"   ├─ Throughput: {train_ips:.1f} train img/s ({mode.describe()})")
         print(f"   └─ Time: {epoch_time:.1f}s")
         
-        # Save best model
+        # Save best model (doar rank 0; acuratețea e deja agregată, deci identică pe toate procesele)
         if test_accuracy > best_accuracy:
             best_accuracy = test_accuracy
             model_path = SAVE_DIR / "best_model.pth"
-            torch.save(model.state_dict(), model_path)
+            if dist_ctx.is_main:
+                torch.save(mode.module.state_dict(), model_path)
             print(f"\n✅ New best model saved! Test Acc: {best_accuracy:.2f}%")
         
-        # Save checkpoint every 5 epochs
-        if (epoch + 1) % 5 == 0:
-            checkpoint_path = SAVE_DIR / f"checkpoint_epoch_{epoch+1}.pth"
-            torch.save({
-                'epoch': epoch + 1,
-                'model_state_dict': model.state_dict(),
-                'optimizer_state_dict': optimizer.state_dict(),
-                'train_acc': train_accuracy,
-                'test_acc': test_accuracy,
-            }, checkpoint_path)
+        # Checkpoint la final de epocă: reluarea începe cu epoca următoare
+        if dist_ctx.is_main:
+            checkpoint_path = checkpoints.save(checkpoint_state(epoch + 1, 0, global_step, None))
             print(f"💾 Checkpoint saved: {checkpoint_path}")
+        else:
+            checkpoints.mark(global_step)
     
     # ========== TRAINING COMPLETE ==========
+    if not dist_ctx.is_main:
+        return
     total_time = time.time() - start_time
     print("\n" + "="*70)
     print("✅ TRAINING COMPLETE!")
@@ -251,8 +537,14 @@ def main():
         "num_classes": num_classes,
         "input_size": [224, 224],
         "num_epochs": NUM_EPOCHS,
-        "batch_size": BATCH_SIZE,
+        "batch_size": batch_size,
         "learning_rate": LEARNING_RATE,
+        "training_mode": mode.to_dict(),
+        "distributed": {"processes": dist_ctx.world_size, "micro_batch": micro_batch,
+                        "accumulation_steps": accum_steps},
+        "throughput_comparison": throughput,
+        "data_loading": {"num_workers": num_workers, "prefetch_factor": prefetch_factor,
+                         "autotuned": args.autotune},
         "best_accuracy": best_accuracy,
         "total_training_time": total_time,
         "class_names": train_dataset.classes
@@ -285,7 +577,7 @@ if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
-        print("\n\n⚠️  Training interrupted by user")
+        print("\n\n⚠️  Training interrupted by user (run with --resume to continue from the last checkpoint)")
     except Exception as e:
         print(f"\n❌ Error during training: {e}")
         import traceback
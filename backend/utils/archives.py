@@ -0,0 +1,101 @@
+"""Expand zip/tar uploads into individual images for batch prediction."""
+
+import io
+import tarfile
+import zipfile
+from pathlib import PurePosixPath
+from typing import Callable, List, Tuple, Union
+
+from utils.uploads import UploadError, UploadGuard, UploadTooLargeError
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
+
+
+class ArchiveError(ValueError):
+    """The archive is corrupt or exceeds the configured limits."""
+
+
+Member = Tuple[str, Union[bytes, UploadError]]
+
+
+def extract_images(data: bytes, max_files: int, max_total_bytes: int,
+                   new_guard: Callable[[str], UploadGuard], expanded: int = 0) -> Tuple[List[Member], int]:
+    """Return ``(member_name, bytes)`` for every image file in a zip/tar archive.
+
+    Non-image members and directories are skipped. Every member goes through
+    ``new_guard(name)`` like a direct upload (magic bytes, byte limit, pixel
+    probe); rejected members are returned as ``(member_name, UploadError)``
+    and members above the guard's byte limit are not decompressed at all.
+
+    ``max_files`` and ``max_total_bytes`` (uncompressed) guard against archive
+    bombs; ``expanded`` is what earlier archives of the same request already
+    used from ``max_total_bytes``. Returns ``(members, expanded bytes so far)``.
+    """
+    try:
+        if zipfile.is_zipfile(io.BytesIO(data)):
+            return _extract_zip(data, max_files, max_total_bytes, new_guard, expanded)
+        if data[:2] == b"PK":
+            raise zipfile.BadZipFile("not a valid zip file")
+        return _extract_tar(data, max_files, max_total_bytes, new_guard, expanded)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        # tarfile enumeră toate metodele încercate, câte una pe linie
+        raise ArchiveError(f"Invalid archive: {str(e).splitlines()[0]}") from e
+
+
+def _is_image_name(name: str) -> bool:
+    path = PurePosixPath(name)
+    # Ignorăm fișierele ascunse / metadata macOS (__MACOSX/._poza.jpg)
+    if any(part.startswith(("__MACOSX", ".")) for part in path.parts):
+        return False
+    return path.suffix.lower() in IMAGE_EXTENSIONS
+
+
+def _check_limits(count: int, total: int, max_files: int, max_total_bytes: int) -> None:
+    if count > max_files:
+        raise ArchiveError(f"Archive contains more than {max_files} images")
+    if total > max_total_bytes:
+        raise ArchiveError(f"Archives expand to more than {max_total_bytes} bytes per request")
+
+
+def _guard_member(name: str, size: int, read: Callable[[int], bytes],
+                  new_guard: Callable[[str], UploadGuard]) -> Member:
+    guard = new_guard(name)
+    if size > guard.max_bytes:
+        guard.reject(UploadTooLargeError(f"Upload exceeds {guard.max_bytes} bytes"))
+    else:
+        # Dimensiunea declarată poate minți: nu citim mai mult decât limita + 1
+        guard.feed(read(guard.max_bytes + 1))
+    try:
+        return name, guard.finish()
+    except UploadError as e:
+        return name, e
+
+
+def _extract_zip(data, max_files, max_total_bytes, new_guard, total):
+    images = []
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not _is_image_name(info.filename):
+                continue
+            _check_limits(len(images) + 1, total + info.file_size, max_files, max_total_bytes)
+
+            def read(limit, info=info):
+                with zf.open(info) as f:
+                    return f.read(limit)
+
+            images.append(_guard_member(info.filename, info.file_size, read, new_guard))
+            total += info.file_size
+    return images, total
+
+
+def _extract_tar(data, max_files, max_total_bytes, new_guard, total):
+    images = []
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as tf:
+        for member in tf:
+            if not member.isfile() or not _is_image_name(member.name):
+                continue
+            _check_limits(len(images) + 1, total + member.size, max_files, max_total_bytes)
+            images.append(_guard_member(member.name, member.size,
+                                        tf.extractfile(member).read, new_guard))
+            total += member.size
+    return images, total
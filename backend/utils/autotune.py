@@ -0,0 +1,295 @@
+"""Batch size and DataLoader tuning for ``train_model.py --autotune``.
+
+``BATCH_SIZE = 32`` / ``NUM_WORKERS = 4`` are guesses that users had to
+lower by hand on small machines and that leave big build hosts idle.
+``autotune`` measures the current host instead:
+
+1. **Batch size** - one training step (forward + backward + Adam) runs in a
+   fresh subprocess at two small batch sizes; their peak memory (RSS, or
+   CUDA allocated memory) gives a linear model ``base + per_sample * batch``.
+   The largest multiple of 8 under the memory budget (a fraction of the
+   memory available now) is then verified by a third probe and stepped down
+   until it fits.
+2. **Workers / prefetch** - with that batch size, a few real training steps
+   are timed for each ``num_workers`` / ``prefetch_factor`` candidate, so
+   decode workers competing with the compute threads are accounted for.
+
+The result is cached in ``data/autotune/<key>.json``; the key hashes the
+machine fingerprint (CPU model, cores, RAM, GPU, torch version, processes
+per host) and the workload (model, training mode, data format, budget), so
+another host or setup is tuned again.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import resource
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_CACHE_DIR = Path("data/autotune")
+FORMAT_VERSION = 1
+BATCH_MULTIPLE = 8
+MAX_BATCH_SIZE = 512
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def _meminfo(field: str) -> Optional[int]:
+    """Bytes from /proc/meminfo (``MemTotal``, ``MemAvailable``), None elsewhere."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def machine_fingerprint(local_processes: int = 1) -> Dict[str, Any]:
+    import torch
+
+    return {
+        "cpu": _cpu_model(),
+        "cpus": os.cpu_count(),
+        "mem_total": _meminfo("MemTotal"),
+        "gpu": torch.cuda.get_device_name() if torch.cuda.is_available() else None,
+        "torch": torch.__version__,
+        "python": platform.python_version(),
+        "local_processes": local_processes,
+    }
+
+
+def cache_path(cache_dir, fingerprint: Dict[str, Any], workload: Dict[str, Any]) -> Path:
+    blob = json.dumps({"format_version": FORMAT_VERSION, "machine": fingerprint, "workload": workload},
+                      sort_keys=True).encode("utf-8")
+    return Path(cache_dir) / f"{hashlib.sha256(blob).hexdigest()[:16]}.json"
+
+
+def memory_budget(device, fraction: float, local_processes: int = 1) -> int:
+    """Bytes one training process may use: ``fraction`` of what is available now."""
+    import torch
+
+    if device.type == "cuda":
+        free, _ = torch.cuda.mem_get_info()
+        return int(free * fraction)
+    available = _meminfo("MemAvailable")
+    if available is None:
+        available = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    return int(available * fraction / max(1, local_processes))
+
+
+# ------------------------------------------------------------- memory probes
+def _probe_step(queue, arch: str, num_classes: int, batch_size: int, mode_flags: Dict[str, bool],
+                device_type: str, threads: int) -> None:
+    """Subprocess: one model + two training steps at ``batch_size``; reports peak bytes."""
+    try:
+        import timm
+        import torch
+        import torch.nn as nn
+
+        from utils.training import TrainingMode
+
+        torch.set_num_threads(threads)
+        device = torch.device(device_type)
+        mode = TrainingMode(device, bf16=mode_flags["bf16"], channels_last=mode_flags["channels_last"])
+        model = mode.prepare_model(timm.create_model(arch, pretrained=False, num_classes=num_classes))
+        model.train()
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-6)
+        criterion = nn.CrossEntropyLoss()
+        images = mode.inputs(torch.randn(batch_size, 3, 224, 224))
+        labels = torch.randint(0, num_classes, (batch_size,), device=device)
+        # Doi pași: al doilea include și starea Adam deja alocată
+        for _ in range(2):
+            with mode.autocast():
+                loss = criterion(model(images), labels)
+            optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+            optimizer.step()
+        if device.type == "cuda":
+            peak = torch.cuda.max_memory_allocated()
+        else:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KB pe Linux
+        queue.put(("ok", peak))
+    except Exception as e:
+        queue.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def probe_peak_memory(batch_size: int, arch: str, num_classes: int, mode, threads: int,
+                      timeout: float = 600) -> Optional[int]:
+    """Peak bytes of a training step at ``batch_size``, or None if it failed (e.g. OOM)."""
+    import multiprocessing as mp
+
+    # spawn: procesul copil pornește curat, deci peak-ul nu include memoria părintelui
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_probe_step, args=(queue, arch, num_classes, batch_size,
+                                                 {"bf16": mode.bf16, "channels_last": mode.channels_last},
+                                                 mode.device.type, threads))
+    proc.start()
+    try:
+        status, value = queue.get(timeout=timeout)
+    except Exception:
+        status, value = "error", "no result (killed, probably out of memory)"
+    proc.join(timeout=10)
+    if proc.is_alive():
+        proc.kill()
+    return value if status == "ok" else None
+
+
+def tune_batch_size(budget: int, arch: str, num_classes: int, mode, threads: int,
+                    log=print) -> Dict[str, Any]:
+    """Largest multiple of ``BATCH_MULTIPLE`` whose training step fits in ``budget`` bytes."""
+    small, large = BATCH_MULTIPLE, 2 * BATCH_MULTIPLE
+    m_small = probe_peak_memory(small, arch, num_classes, mode, threads)
+    m_large = probe_peak_memory(large, arch, num_classes, mode, threads)
+    if m_small is None or m_large is None or m_small > budget:
+        log(f"   ├─ Batch {small} does not fit the budget, using {small}")
+        return {"batch_size": small, "per_sample_bytes": None, "base_bytes": m_small, "probes": {}}
+
+    per_sample = max(1, (m_large - m_small) / (large - small))
+    base = m_small - per_sample * small
+    estimate = int((budget - base) / per_sample) // BATCH_MULTIPLE * BATCH_MULTIPLE
+    batch = max(small, min(MAX_BATCH_SIZE, estimate))
+    log(f"   ├─ Memory model: {base / 2**20:.0f} MB + {per_sample / 2**20:.1f} MB/image "
+        f"(budget {budget / 2**20:.0f} MB) -> batch {batch}")
+
+    probes = {small: m_small, large: m_large}
+    # Verificare: modelul liniar poate subestima (alocatorul, buffer-e oneDNN)
+    while batch > large:
+        peak = probe_peak_memory(batch, arch, num_classes, mode, threads)
+        probes[batch] = peak
+        if peak is not None and peak <= budget:
+            break
+        log(f"   ├─ Batch {batch} peaked at {'OOM' if peak is None else f'{peak / 2**20:.0f} MB'}, stepping down")
+        batch = max(large, int(batch * 0.75) // BATCH_MULTIPLE * BATCH_MULTIPLE)
+    return {"batch_size": batch, "per_sample_bytes": per_sample, "base_bytes": base,
+            "probes": {str(k): v for k, v in probes.items()}}
+
+
+# ------------------------------------------------------ DataLoader candidates
+def loader_candidates(cpus: int) -> List[Dict[str, int]]:
+    workers = [0] + [w for w in (2, 4, 8, 16) if w <= max(2, cpus)]
+    candidates = [{"num_workers": 0, "prefetch_factor": 0}]
+    for w in workers[1:]:
+        for prefetch in (2, 4):
+            candidates.append({"num_workers": w, "prefetch_factor": prefetch})
+    return candidates
+
+
+def time_loader(model, mode, dataset, batch_size: int, num_workers: int, prefetch_factor: int,
+                steps: int, warmup: int = 2) -> float:
+    """Images/sec of ``steps`` real training steps (loading included) on a copy of ``model``."""
+    import copy
+
+    import torch
+    import torch.nn as nn
+    from torch.utils.data import DataLoader, IterableDataset
+
+    kwargs = {"num_workers": num_workers}
+    if num_workers > 0:
+        kwargs.update(prefetch_factor=prefetch_factor, persistent_workers=False)
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=not isinstance(dataset, IterableDataset),
+                        pin_memory=mode.device.type == "cuda", **kwargs)
+
+    net = copy.deepcopy(model).to(mode.device)
+    if mode.channels_last:
+        net = net.to(memory_format=torch.channels_last)
+    net.train()
+    optimizer = torch.optim.Adam(net.parameters(), lr=1e-6)
+    criterion = nn.CrossEntropyLoss()
+
+    images_seen, start = 0, None
+    iterator = iter(loader)
+    for i in range(warmup + steps):
+        if i == warmup:
+            start = time.perf_counter()  # după pornirea workerilor și primele batch-uri
+        try:
+            images, labels = next(iterator)
+        except StopIteration:
+            break
+        images, labels = mode.inputs(images), labels.to(mode.device)
+        with mode.autocast():
+            loss = criterion(net(images), labels)
+        optimizer.zero_grad(set_to_none=True)
+        loss.backward()
+        optimizer.step()
+        if i >= warmup:
+            images_seen += labels.size(0)
+    del iterator
+    if start is None or images_seen == 0:
+        return 0.0
+    return images_seen / (time.perf_counter() - start)
+
+
+def tune_loader(arch: str, num_classes: int, mode, dataset, batch_size: int, steps: int,
+                candidates: Sequence[Dict[str, int]], log=print) -> Dict[str, Any]:
+    import timm
+
+    # Greutățile nu contează pentru timp; pretrained=False evită descărcarea
+    model = timm.create_model(arch, pretrained=False, num_classes=num_classes)
+    trials = []
+    for candidate in candidates:
+        ips = time_loader(model, mode, dataset, batch_size, candidate["num_workers"],
+                          candidate["prefetch_factor"], steps)
+        trials.append({**candidate, "images_per_sec": ips})
+        log(f"   ├─ workers={candidate['num_workers']:<2} prefetch={candidate['prefetch_factor']}: {ips:.1f} img/s")
+    best = max(trials, key=lambda t: t["images_per_sec"])
+    return {**best, "trials": trials}
+
+
+# -------------------------------------------------------------------- entry
+def autotune(mode, dataset, num_classes: int, arch: str, workload: Dict[str, Any],
+             cache_dir=DEFAULT_CACHE_DIR, budget_fraction: float = 0.7, local_processes: int = 1,
+             loader_steps: int = 6, retune: bool = False, log=print) -> Dict[str, Any]:
+    """Tuned ``batch_size`` / ``num_workers`` / ``prefetch_factor`` for this host (cached)."""
+    import torch
+
+    fingerprint = machine_fingerprint(local_processes)
+    workload = {**workload, "arch": arch, "budget_fraction": budget_fraction}
+    path = cache_path(cache_dir, fingerprint, workload)
+    if path.exists() and not retune:
+        with open(path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        log(f"♻️  Autotune cache hit: {path}")
+        return result
+
+    log("🔧 Autotuning batch size and data loading for this host...")
+    threads = torch.get_num_threads()
+    budget = memory_budget(mode.device, budget_fraction, local_processes)
+    batch = tune_batch_size(budget, arch, num_classes, mode, threads, log=log)
+    cpus = max(1, (os.cpu_count() or 1) // max(1, local_processes))
+    loader = tune_loader(arch, num_classes, mode, dataset, batch["batch_size"], loader_steps,
+                         loader_candidates(cpus), log=log)
+
+    result = {
+        "batch_size": batch["batch_size"],
+        "num_workers": loader["num_workers"],
+        "prefetch_factor": loader["prefetch_factor"],
+        "images_per_sec": loader["images_per_sec"],
+        "memory_budget_bytes": budget,
+        "memory": batch,
+        "loader_trials": loader["trials"],
+        "machine": fingerprint,
+        "workload": workload,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".part")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp, path)
+    log(f"   └─ Saved: {path}")
+    return result
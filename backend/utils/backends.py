@@ -0,0 +1,301 @@
+"""Pluggable inference backends.
+
+Every backend exposes the same small interface used by the server:
+
+- ``preprocess(img)``: RGB PIL image -> (H, W, 3) uint8 array
+- ``collate(arrays)``: uint8 arrays -> normalized float tensor (N, C, H, W)
+- ``predict_logits(batch)``: float tensor (N, C, H, W) -> logits tensor (N, classes)
+- ``predict_embeddings(batch)``: same batch -> (logits, pooled penultimate-layer
+  features (N, D)) in one forward pass, when ``supports_embeddings`` (not ``onnx``:
+  the exported graph only outputs logits)
+- ``id2label``: class index -> label
+- ``decode_size``: smallest image side ``preprocess`` needs (for draft decoding)
+
+Preprocessing is the shared :class:`utils.preprocess.Preprocessor`, the same
+one ``train_model.py`` evaluates with.
+
+Available backends (selected with ``FHC_BACKEND``):
+
+- ``hf``: eager PyTorch via ``transformers`` (default, ``nateraw/food``)
+- ``timm``: eager PyTorch, our own EfficientNet-B0 from ``model/best_model.pth``
+- ``onnx``: ONNX Runtime CPU session over a graph exported by ``export_onnx.py``
+  (or an INT8 graph produced by ``quantize_model.py``)
+
+With ``FHC_SHARED_WEIGHTS`` set (done by ``serve.py``), the ``hf``/``timm``
+model is attached to a memory-mapped weights file shared by all server
+processes instead of being loaded per process (see ``utils/shared_weights.py``).
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.preprocess import Preprocessor
+
+ROOT = Path(__file__).resolve().parents[1]
+MODEL_DIR = ROOT / "model"
+
+# Opțiunile de optimizare a grafului în ONNX Runtime
+ORT_OPT_LEVELS = ("disable", "basic", "extended", "all")
+
+
+def load_labels(path) -> Dict[int, str]:
+    """Read ``labels_food101.json`` in either of its two layouts.
+
+    The committed file is a flat ``{"0": "apple_pie", ...}`` mapping, while
+    ``train_model.py`` writes ``{"id2label": {...}, "label2id": {...}}``.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if "id2label" in data:
+        data = data["id2label"]
+    return {int(k): v for k, v in data.items()}
+
+
+def torch_embeddings(torch, model, batch, kind: str):
+    """(logits, features) of a ``hf`` or ``timm`` model; features = the classifier's input."""
+    with torch.no_grad():
+        if kind == "timm":
+            features = model.forward_head(model.forward_features(batch), pre_logits=True)
+            return model.get_classifier()(features), features
+        # HF: intrarea head-ului de clasificare (ex. tokenul CLS normalizat la ViT)
+        captured = []
+        handle = model.classifier.register_forward_pre_hook(
+            lambda module, inputs: captured.append(inputs[0]))
+        try:
+            logits = model(pixel_values=batch).logits
+        finally:
+            handle.remove()
+        return logits, captured[0].flatten(1)
+
+
+class InferenceBackend:
+    """Base class; subclasses set ``preprocessor``/``id2label`` and implement ``predict_logits``."""
+
+    name = "base"
+    supports_embeddings = False
+
+    def __init__(self):
+        self.id2label: Dict[int, str] = {}
+        self.parameter_count: Optional[int] = None
+        self.preprocessor = Preprocessor()
+
+    @property
+    def decode_size(self) -> int:
+        # Latura minimă de care are nevoie preprocesarea; decode-ul JPEG
+        # poate reduce rezoluția până aici fără pierderi pentru model
+        return self.preprocessor.min_decode_size
+
+    def preprocess(self, img) -> Any:
+        return self.preprocessor.to_uint8(img)
+
+    def collate(self, arrays) -> Any:
+        # Buffer refolosit: valid până la următorul batch (scheduler-ul le serializează)
+        return self.preprocessor.collate(arrays)
+
+    def predict_logits(self, batch) -> Any:
+        raise NotImplementedError
+
+    def predict_embeddings(self, batch) -> Any:
+        raise NotImplementedError(f"The {self.name} backend does not expose embeddings")
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "num_classes": len(self.id2label),
+                "embeddings": self.supports_embeddings}
+
+
+class HFTorchBackend(InferenceBackend):
+    """``AutoModelForImageClassification`` in eager PyTorch."""
+
+    name = "hf"
+
+    def __init__(self, model_name: str):
+        super().__init__()
+        import torch
+        from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+        self._torch = torch
+        self.model_name = model_name
+        processor = AutoImageProcessor.from_pretrained(model_name)
+        # Doar parametrii (size, mean, std); preprocesarea o face Preprocessor
+        self.preprocessor = Preprocessor.from_hf_processor(processor)
+        self.model = AutoModelForImageClassification.from_pretrained(model_name)
+        self.model.eval()
+        self.id2label = {int(k): v for k, v in self.model.config.id2label.items()}
+        self.parameter_count = sum(p.numel() for p in self.model.parameters())
+        self.supports_embeddings = hasattr(self.model, "classifier")
+
+    def predict_logits(self, batch):
+        with self._torch.no_grad():
+            return self.model(pixel_values=batch).logits
+
+    def predict_embeddings(self, batch):
+        return torch_embeddings(self._torch, self.model, batch, "hf")
+
+    def describe(self):
+        return {**super().describe(), "model_name": self.model_name}
+
+
+def create_timm_model(config: Dict[str, Any], checkpoint=None):
+    """EfficientNet-B0 (or whatever ``train_model.py`` recorded) from a state dict."""
+    import timm
+    import torch
+
+    # train_model.py scrie "efficientnet_b0"; config.json din repo are "efficientnet"
+    arch = config.get("model_type", "efficientnet_b0")
+    if arch == "efficientnet":
+        arch = "efficientnet_b0"
+    model = timm.create_model(arch, pretrained=False,
+                              num_classes=int(config.get("num_classes", 101)))
+    if checkpoint is not None:
+        state = torch.load(checkpoint, map_location="cpu")
+        if "model_state_dict" in state:
+            state = state["model_state_dict"]
+        model.load_state_dict(state)
+    model.eval()
+    return model
+
+
+class TimmTorchBackend(InferenceBackend):
+    """Our own EfficientNet-B0 trained by ``train_model.py``."""
+
+    name = "timm"
+
+    def __init__(self, model_dir=MODEL_DIR, checkpoint: str = "best_model.pth"):
+        super().__init__()
+        import torch
+
+        self._torch = torch
+        model_dir = Path(model_dir)
+        with open(model_dir / "config.json", "r") as f:
+            self.config = json.load(f)
+        self.checkpoint = model_dir / checkpoint
+        self.model = create_timm_model(self.config, self.checkpoint)
+        self.preprocessor = Preprocessor.from_model_config(self.config)
+        self.id2label = load_labels(model_dir / "labels_food101.json")
+        self.parameter_count = sum(p.numel() for p in self.model.parameters())
+        self.supports_embeddings = True
+
+    def predict_logits(self, batch):
+        with self._torch.no_grad():
+            return self.model(batch)
+
+    def predict_embeddings(self, batch):
+        return torch_embeddings(self._torch, self.model, batch, "timm")
+
+    def describe(self):
+        return {**super().describe(), "checkpoint": str(self.checkpoint)}
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime CPU session over a graph exported by ``export_onnx.py``.
+
+    The export writes a sidecar ``<model>.onnx.json`` with the source model,
+    labels and preprocessing parameters, so serving needs no extra config.
+    """
+
+    name = "onnx"
+
+    def __init__(self, onnx_path, opt_level: str = "all",
+                 intra_op_threads: int = 0, inter_op_threads: int = 1):
+        super().__init__()
+        import onnxruntime as ort
+        import torch
+
+        self._torch = torch
+        self.onnx_path = Path(onnx_path)
+        with open(self.onnx_path.with_suffix(".onnx.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.id2label = {int(k): v for k, v in self.meta["id2label"].items()}
+        self.parameter_count = self.meta.get("parameter_count")
+        self.preprocessor = Preprocessor.from_dict(self.meta["preprocess"])
+
+        if opt_level not in ORT_OPT_LEVELS:
+            raise ValueError(f"Unknown ONNX Runtime optimization level: {opt_level}")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[opt_level]
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # 0 = lăsăm ONNX Runtime să aleagă (un thread per core fizic)
+        options.intra_op_num_threads = max(0, intra_op_threads)
+        options.inter_op_num_threads = max(0, inter_op_threads)
+        self.opt_level = opt_level
+        self.session = ort.InferenceSession(str(self.onnx_path), sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_logits(self, batch):
+        array = batch.numpy() if hasattr(batch, "numpy") else batch
+        logits = self.session.run(None, {self.input_name: array})[0]
+        return self._torch.from_numpy(logits)
+
+    def describe(self):
+        return {**super().describe(), "onnx_path": str(self.onnx_path),
+                "source": self.meta["source"], "opt_level": self.opt_level,
+                "quantization": self.meta.get("quantization")}
+
+
+class SharedWeightsBackend(InferenceBackend):
+    """``hf`` or ``timm`` model whose weights live in a file shared between processes."""
+
+    def __init__(self, weights_path):
+        super().__init__()
+        import torch
+
+        from utils.shared_weights import load_shared_model
+
+        self._torch = torch
+        self.weights_path = Path(weights_path)
+        self.model, self.meta = load_shared_model(self.weights_path)
+        # Se raportează ca backend-ul original (hf/timm)
+        self.name = self.meta["backend"]
+        self.id2label = {int(k): v for k, v in self.meta["id2label"].items()}
+        self.parameter_count = self.meta.get("parameter_count")
+        self.preprocessor = Preprocessor.from_dict(self.meta["preprocess"])
+        self.supports_embeddings = self.name == "timm" or hasattr(self.model, "classifier")
+
+    def predict_logits(self, batch):
+        with self._torch.no_grad():
+            if self.name == "hf":
+                return self.model(pixel_values=batch).logits
+            return self.model(batch)
+
+    def predict_embeddings(self, batch):
+        return torch_embeddings(self._torch, self.model, batch, self.name)
+
+    def describe(self):
+        return {**super().describe(), "shared_weights": str(self.weights_path),
+                "model_version": self.meta["model_version"]}
+
+
+def create_backend(settings) -> InferenceBackend:
+    """Build the backend selected by ``settings.BACKEND``."""
+    if settings.SHARED_WEIGHTS and settings.BACKEND in ("hf", "timm"):
+        return SharedWeightsBackend(settings.SHARED_WEIGHTS)
+    if settings.BACKEND == "hf":
+        return HFTorchBackend(settings.MODEL_NAME)
+    if settings.BACKEND == "timm":
+        return TimmTorchBackend(settings.TIMM_MODEL_DIR)
+    if settings.BACKEND == "onnx":
+        import torch
+
+        return OnnxBackend(
+            settings.ONNX_PATH,
+            opt_level=settings.ORT_OPT_LEVEL,
+            intra_op_threads=settings.ORT_INTRA_OP_THREADS or torch.get_num_threads(),
+            inter_op_threads=settings.ORT_INTER_OP_THREADS,
+        )
+    raise ValueError(f"Unknown backend: {settings.BACKEND!r} (expected hf, timm or onnx)")
+
+
+def backend_id(settings) -> str:
+    """Short identifier of the configured model, used in cache keys and status."""
+    if settings.BACKEND == "hf":
+        return f"hf:{settings.MODEL_NAME}"
+    if settings.BACKEND == "timm":
+        return f"timm:{Path(settings.TIMM_MODEL_DIR) / 'best_model.pth'}"
+    return f"onnx:{settings.ONNX_PATH}"
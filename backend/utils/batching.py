@@ -0,0 +1,146 @@
+"""Dynamic micro-batching for model inference.
+
+Concurrent requests submit one item each; a single background task collects
+them into batches (up to ``max_batch_size`` items, waiting at most
+``max_wait_ms`` after the first one arrives), runs one batched call off the
+event loop and hands every row of the result back to its caller.
+"""
+
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class BatchScheduler:
+    """Collects concurrent ``submit`` calls into batches for ``run_batch``.
+
+    ``run_batch`` receives a list of items and must return a sequence with one
+    result per item, in the same order. It is executed in ``executor`` (or the
+    loop's default executor) so the event loop stays responsive.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Statistici expuse prin stats()
+        self._batch_sizes: Counter = Counter()
+        self._max_queue_depth = 0
+        self._items_total = 0
+        self._batches_total = 0
+        self._errors_total = 0
+
+    # ------------------------------------------------------------------ API
+    async def submit(self, item: Any) -> Any:
+        """Queue ``item`` for the next batch and wait for its result."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def close(self) -> None:
+        """Stop the background task; pending callers get a RuntimeError."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batch scheduler stopped"))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and batch-size histogram since startup."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self._max_queue_depth,
+            "batches_total": self._batches_total,
+            "items_total": self._items_total,
+            "errors_total": self._errors_total,
+            "mean_batch_size": (self._items_total / self._batches_total
+                                if self._batches_total else 0.0),
+            "batch_size_histogram": {str(size): count for size, count
+                                     in sorted(self._batch_sizes.items())},
+        }
+
+    # ------------------------------------------------------------- internals
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._worker())
+
+    async def _collect(self) -> List[Any]:
+        """Block for the first item, then gather more until full or timed out."""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Ce e deja în coadă intră imediat, fără să așteptăm
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Cererile anulate (client deconectat) nu mai intră în forward pass
+            batch = [(item, fut) for item, fut in batch if not fut.cancelled()]
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            self._batch_sizes[len(items)] += 1
+            self._batches_total += 1
+            self._items_total += len(items)
+
+            try:
+                results = await loop.run_in_executor(self.executor, self.run_batch, items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"run_batch returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                self._errors_total += 1
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
@@ -0,0 +1,120 @@
+"""Full, atomic, resumable training checkpoints for ``train_model.py``.
+
+A checkpoint holds everything needed to continue a run where it stopped:
+model (``model_state_dict``, so ``create_timm_model`` can load it like
+``best_model.pth``), optimizer, ``ReduceLROnPlateau`` scheduler, Python /
+NumPy / torch RNG states, ``training_history``, the best accuracy and the
+position in the run (``epoch`` + optimizer steps already taken in it).
+
+- :class:`CheckpointManager`: writes ``ckpt-e<epoch>-s<step>.pth`` (tmp file +
+  ``os.replace``, so an interruption never leaves a truncated checkpoint),
+  keeps the last ``keep`` and finds the latest one for ``--resume``;
+- :class:`SkipSampler`: the epoch's deterministic sample order minus the
+  samples already trained on, so a resumed run continues mid-epoch.
+
+The sample order is reproduced exactly; augmentation randomness inside
+DataLoader workers is not replayed.
+"""
+
+import os
+import random
+import re
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+CHECKPOINT_RE = re.compile(r"^ckpt-e(\d+)-s(\d+)\.pth$")
+
+
+def rng_state() -> Dict[str, Any]:
+    state = {"python": random.getstate(), "numpy": np.random.get_state(),
+             "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state: Dict[str, Any]) -> None:
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+class CheckpointManager:
+    """Periodic checkpoints in ``directory``, by wall time and/or optimizer steps."""
+
+    def __init__(self, directory, keep: int = 3, every_minutes: float = 30.0, every_steps: int = 0):
+        self.directory = Path(directory)
+        self.keep = max(1, keep)
+        self.every_seconds = every_minutes * 60
+        self.every_steps = every_steps
+        self._last_time = time.monotonic()
+        self._last_step = 0
+
+    def checkpoints(self) -> List[Path]:
+        """Existing checkpoints, oldest first."""
+        if not self.directory.exists():
+            return []
+        found = []
+        for path in self.directory.iterdir():
+            match = CHECKPOINT_RE.match(path.name)
+            if match:
+                found.append(((int(match.group(1)), int(match.group(2))), path))
+        return [path for _, path in sorted(found)]
+
+    def latest(self) -> Optional[Path]:
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def due(self, global_step: int) -> bool:
+        if self.every_steps and global_step - self._last_step >= self.every_steps:
+            return True
+        return self.every_seconds > 0 and time.monotonic() - self._last_time >= self.every_seconds
+
+    def mark(self, global_step: int) -> None:
+        """Restart the periodic timers (also called by ranks that do not write)."""
+        self._last_time = time.monotonic()
+        self._last_step = global_step
+
+    def save(self, state: Dict[str, Any]) -> Path:
+        """Write ``state`` atomically; ``state`` must contain ``epoch`` and ``step``."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"ckpt-e{state['epoch']:03d}-s{state['step']:07d}.pth"
+        state = {**state, "rng": rng_state(), "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        tmp = path.with_name(path.name + ".tmp")
+        torch.save(state, tmp)
+        os.replace(tmp, path)
+
+        self.mark(state.get("global_step", 0))
+        for old in self.checkpoints()[:-self.keep]:
+            old.unlink(missing_ok=True)
+        return path
+
+    def load(self, path) -> Dict[str, Any]:
+        # Checkpoint-urile noastre conțin și stări RNG / istoric, nu doar tensori
+        return torch.load(path, map_location="cpu", weights_only=False)
+
+
+class SkipSampler(Sampler):
+    """Wraps an epoch-seeded sampler (``set_epoch``) and drops its first ``skip`` samples."""
+
+    def __init__(self, sampler, skip: int = 0):
+        self.sampler = sampler
+        self.skip = skip
+
+    def set_epoch(self, epoch: int, skip: int = 0) -> None:
+        self.sampler.set_epoch(epoch)
+        self.skip = skip
+
+    def __iter__(self):
+        return islice(iter(self.sampler), self.skip, None)
+
+    def __len__(self) -> int:
+        return max(0, len(self.sampler) - self.skip)
@@ -0,0 +1,63 @@
+"""Fast image decoding for inference.
+
+Phones upload 12+ megapixel JPEGs that the model shrinks to 224x224 anyway.
+``decode_image`` asks libjpeg to decode directly at a reduced scale (1/2, 1/4
+or 1/8, via PIL draft mode) that is still at least ``min_size`` on both sides,
+applies the EXIF orientation, and rejects images whose header declares more
+than ``max_pixels`` pixels before any pixel data is decoded. The original
+``(width, height)`` is kept in ``img.info["source_size"]``.
+"""
+
+import io
+
+from PIL import Image, ImageOps
+
+# ~60 MP: acoperă camerele de telefon de 48/50 MP, respinge decompression bombs
+DEFAULT_MAX_PIXELS = 60_000_000
+
+
+class ImageDecodeError(ValueError):
+    """The bytes could not be decoded as an image."""
+
+
+class ImageTooLargeError(ImageDecodeError):
+    """The image header declares more pixels than allowed."""
+
+
+def decode_image(data: bytes, min_size: int = 256,
+                 max_pixels: int = DEFAULT_MAX_PIXELS) -> Image.Image:
+    """Bytes -> RGB PIL image, decoded no larger than needed.
+
+    Args:
+        data: raw encoded image (JPEG, PNG, WebP, ...).
+        min_size: smallest side the caller's preprocessing needs; JPEGs are
+            decoded at the largest reduction that keeps both sides >= this.
+        max_pixels: hard cap on width * height read from the header.
+
+    Raises:
+        ImageTooLargeError: the declared size exceeds ``max_pixels``.
+        ImageDecodeError: anything else that prevents decoding.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        # Limita proprie a PIL (peste 2x Image.MAX_IMAGE_PIXELS) se declanșează deja în open()
+        raise ImageTooLargeError(str(e)) from e
+    except Exception as e:
+        raise ImageDecodeError(f"Cannot identify image: {e}") from e
+
+    width, height = img.size
+    if width * height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is {width}x{height} ({width * height} pixels), limit is {max_pixels}")
+
+    try:
+        if img.format == "JPEG":
+            # Decodare direct la 1/2, 1/4 sau 1/8 din rezoluție (DCT scaling)
+            img.draft("RGB", (min_size, min_size))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        # Dimensiunea din header, înainte de draft (pentru metrici)
+        img.info["source_size"] = (width, height)
+        return img
+    except Exception as e:
+        raise ImageDecodeError(f"Cannot decode image: {e}") from e
@@ -0,0 +1,139 @@
+"""Multi-process (DDP) training helpers for ``train_model.py``.
+
+Launched with ``torchrun`` the script runs once per process; torchrun sets
+``RANK``, ``WORLD_SIZE``, ``LOCAL_RANK`` and ``LOCAL_WORLD_SIZE``.
+``init_distributed`` joins the ``gloo`` process group (CPU friendly, works
+across hosts) and splits the host's cores between its local processes.
+Without torchrun it returns a single-process context and nothing changes.
+
+- ``rank_indices(n, ctx)``: contiguous, non-overlapping slice of an
+  evaluation set for this rank (no padding, so every sample counts once);
+- ``all_reduce_sum(values, ctx)``: sums floats (loss, correct, total...) over ranks;
+- ``all_reduce_min(values, ctx)``: the smallest value over ranks (autotuned
+  batch size / workers, so every process uses the same layout);
+- ``any_rank`` / ``broadcast_object``: agreeing on "checkpoint now" and
+  sharing the checkpoint rank 0 resumed from;
+- ``broadcast_buffers(module, ctx)``: rank 0's BatchNorm statistics to every
+  rank, so all ranks evaluate (and rank 0 saves) the same model;
+- ``accumulation_steps``: micro-batches per optimizer step that keep the
+  effective batch (``micro_batch * world_size * steps``) at ``BATCH_SIZE``;
+  ``fit_micro_batch`` picks the largest micro-batch under a memory limit
+  for which that split exists.
+"""
+
+import datetime
+import os
+from typing import List, Sequence
+
+import torch
+import torch.distributed as dist
+
+
+class DistContext:
+    def __init__(self, rank: int = 0, world_size: int = 1, local_rank: int = 0, local_world_size: int = 1):
+        self.rank = rank
+        self.world_size = world_size
+        self.local_rank = local_rank
+        self.local_world_size = local_world_size
+
+    @property
+    def enabled(self) -> bool:
+        return self.world_size > 1
+
+    @property
+    def is_main(self) -> bool:
+        return self.rank == 0
+
+    def barrier(self) -> None:
+        if self.enabled:
+            dist.barrier()
+
+
+def init_distributed(backend: str = "gloo") -> DistContext:
+    """Join the process group when started by torchrun (``WORLD_SIZE`` > 1)."""
+    world_size = int(os.environ.get("WORLD_SIZE", "1"))
+    if world_size <= 1:
+        return DistContext()
+
+    ctx = DistContext(rank=int(os.environ["RANK"]), world_size=world_size,
+                      local_rank=int(os.environ.get("LOCAL_RANK", "0")),
+                      local_world_size=int(os.environ.get("LOCAL_WORLD_SIZE", "1")))
+    if torch.cuda.is_available():
+        torch.cuda.set_device(ctx.local_rank)
+    # Timeout generos: rank 0 construiește singur cache-ul de evaluare, ceilalți așteaptă
+    dist.init_process_group(backend=backend, timeout=datetime.timedelta(hours=1))
+    # torchrun pune OMP_NUM_THREADS=1; împărțim explicit core-urile host-ului
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // ctx.local_world_size))
+    return ctx
+
+
+def cleanup_distributed(ctx: DistContext) -> None:
+    if ctx.enabled and dist.is_initialized():
+        dist.destroy_process_group()
+
+
+def rank_indices(n: int, ctx: DistContext) -> range:
+    """Indices ``[start, end)`` of an ``n``-sample dataset evaluated by this rank."""
+    start = n * ctx.rank // ctx.world_size
+    end = n * (ctx.rank + 1) // ctx.world_size
+    return range(start, end)
+
+
+def all_reduce_sum(values: Sequence[float], ctx: DistContext) -> List[float]:
+    if not ctx.enabled:
+        return list(values)
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor.tolist()
+
+
+def all_reduce_min(values: Sequence[int], ctx: DistContext) -> List[int]:
+    if not ctx.enabled:
+        return list(values)
+    tensor = torch.tensor(values, dtype=torch.int64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.MIN)
+    return tensor.tolist()
+
+
+def any_rank(flag: bool, ctx: DistContext) -> bool:
+    """True on every rank if ``flag`` is true on at least one (e.g. "save a checkpoint now")."""
+    return all_reduce_sum([float(flag)], ctx)[0] > 0
+
+
+def broadcast_object(obj, ctx: DistContext):
+    """``obj`` from rank 0 on every rank (e.g. the checkpoint read by rank 0)."""
+    if not ctx.enabled:
+        return obj
+    holder = [obj]
+    dist.broadcast_object_list(holder, src=0)
+    return holder[0]
+
+
+def broadcast_buffers(module, ctx: DistContext) -> None:
+    if ctx.enabled:
+        for buffer in module.buffers():
+            dist.broadcast(buffer, src=0)
+
+
+def default_micro_batch(batch_size: int, ctx: DistContext) -> int:
+    return max(1, batch_size // ctx.world_size)
+
+
+def accumulation_steps(batch_size: int, micro_batch: int, ctx: DistContext) -> int:
+    """Micro-batches per step so that ``micro_batch * world_size * steps == batch_size``."""
+    per_step = micro_batch * ctx.world_size
+    if per_step > batch_size or batch_size % per_step:
+        raise ValueError(f"Batch size {batch_size} is not a multiple of micro-batch {micro_batch} "
+                         f"x {ctx.world_size} processes")
+    return batch_size // per_step
+
+
+def fit_micro_batch(batch_size: int, limit: int, ctx: DistContext) -> int:
+    """Largest micro-batch <= ``limit`` that divides ``batch_size`` over ``world_size`` processes."""
+    if batch_size % ctx.world_size:
+        raise ValueError(f"Batch size {batch_size} is not a multiple of {ctx.world_size} processes")
+    per_process = batch_size // ctx.world_size
+    for micro_batch in range(min(limit, per_process), 0, -1):
+        if per_process % micro_batch == 0:
+            return micro_batch
+    return 1
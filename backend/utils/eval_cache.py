@@ -0,0 +1,134 @@
+"""On-disk cache of the preprocessed evaluation set.
+
+The test phase of ``train_model.py`` used to decode and resize the same
+25,250 JPEGs every epoch, although the deterministic
+Resize((256, 256)) -> CenterCrop(224) output never changes. ``load_eval_cache``
+runs the dataset through the uint8 pipeline once and stores the result as
+``images.npy`` (N, 3, H, W) uint8 + ``labels.npy``; later epochs and later
+runs memory-map it, so evaluation costs only the forward pass.
+
+The cache directory name is a hash of the preprocessing parameters
+(``Preprocessor.to_dict()``) and of the dataset identity (sample paths and
+labels, or the shard metadata), so a different transform or dataset gets a
+new cache instead of stale tensors. A cache is written under a per-process
+``.part-<pid>`` directory and renamed only when complete, so builders on
+several hosts sharing the directory never write into the same files.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+
+FORMAT_VERSION = 1
+
+
+def dataset_fingerprint(dataset) -> dict:
+    """What identifies the samples of an ``ImageFolder`` or ``ShardDataset``."""
+    reader = getattr(dataset, "reader", None)
+    if reader is not None:
+        from utils.shards import read_meta
+
+        meta = read_meta(reader.root)
+        return {"shards": str(Path(reader.root).resolve()), "split": reader.split,
+                "created_at": meta.get("created_at"), "count": len(dataset)}
+
+    digest = hashlib.sha256()
+    for path, label in dataset.samples:
+        digest.update(f"{path}\0{label}\n".encode("utf-8"))
+    return {"root": str(Path(dataset.root).resolve()), "samples": digest.hexdigest(),
+            "count": len(dataset)}
+
+
+def cache_key(preprocessor, dataset) -> str:
+    payload = {"format_version": FORMAT_VERSION, "preprocess": preprocessor.to_dict(),
+               "dataset": dataset_fingerprint(dataset)}
+    blob = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+class EvalCache:
+    """Memory-mapped uint8 images + labels of one preprocessed dataset."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.images = np.load(self.path / "images.npy", mmap_mode="r")
+        self.labels = torch.from_numpy(np.load(self.path / "labels.npy"))
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def batches(self, batch_size: int, indices: Optional[range] = None) -> Iterator[Tuple[torch.Tensor, torch.Tensor]]:
+        """(uint8 (B, 3, H, W), labels) slices in dataset order; no decoding.
+
+        ``indices`` restricts iteration to a contiguous range (one DDP rank's part).
+        """
+        indices = indices if indices is not None else range(len(self))
+        for start in range(indices.start, indices.stop, batch_size):
+            end = min(start + batch_size, indices.stop)
+            # Slice contiguu din mmap -> o singură copie (writable) în memorie
+            images = torch.from_numpy(np.array(self.images[start:end]))
+            yield images, self.labels[start:end]
+
+
+def build_eval_cache(dataset, path, batch_size: int, num_workers: int) -> EvalCache:
+    """Run ``dataset`` (whose transform yields (3, H, W) uint8 tensors) once into ``path``."""
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.part-{os.getpid()}")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+    images = labels = None
+    start = 0
+    for batch, targets in tqdm(loader, desc="Caching eval set", ncols=100, leave=False):
+        if batch.dtype != torch.uint8:
+            raise TypeError(f"Eval cache needs uint8 tensors, the transform returned {batch.dtype}")
+        if images is None:
+            images = np.lib.format.open_memmap(tmp / "images.npy", mode="w+", dtype=np.uint8,
+                                               shape=(len(dataset), *batch.shape[1:]))
+            labels = np.empty(len(dataset), dtype=np.int64)
+        images[start:start + len(batch)] = batch.numpy()
+        labels[start:start + len(batch)] = targets.numpy()
+        start += len(batch)
+
+    if images is None or start != len(dataset):
+        raise RuntimeError(f"Eval cache got {start} of {len(dataset)} samples")
+    images.flush()
+    del images
+    np.save(tmp / "labels.npy", labels)
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"format_version": FORMAT_VERSION, "count": start}, f)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # Alt proces (alt host, același director partajat) l-a publicat între timp
+        if not (path / "meta.json").exists():
+            raise
+        shutil.rmtree(tmp, ignore_errors=True)
+    return EvalCache(path)
+
+
+def load_eval_cache(dataset, preprocessor, cache_dir, batch_size: int = 64,
+                    num_workers: int = 0) -> Tuple[EvalCache, bool]:
+    """(cache, built) for ``dataset`` preprocessed with ``preprocessor``; builds it if missing."""
+    path = Path(cache_dir) / f"eval-{cache_key(preprocessor, dataset)}"
+    cache: Optional[EvalCache] = None
+    if (path / "meta.json").exists():
+        try:
+            cache = EvalCache(path)
+        except (OSError, ValueError):
+            shutil.rmtree(path, ignore_errors=True)
+    if cache is not None and len(cache) == len(dataset):
+        return cache, False
+    if path.exists():
+        shutil.rmtree(path)
+    return build_eval_cache(dataset, path, batch_size, num_workers), True
@@ -1,6 +1,18 @@
 # utils/health_index.py
 from typing import Dict, Tuple
 
+import numpy as np
+
+# Coloanele tabelului nutrițional (vezi utils/nutrition_table.py), în ordinea formulei
+NUTRIENTS = ("calories", "protein_g", "fat_g", "carbs_g", "sugar_g")
+
+# Bucket-urile scorului: (prag minim, culoare, mesaj), de la cel mai bun la cel mai slab
+HEALTH_BUCKETS = (
+    (7.5, "#2ecc71", "Great choice! 🥗"),
+    (5.0, "#f1c40f", "Decent choice, balance it ⚖️"),
+    (0.0, "#e74c3c", "High calorie/sugar/fat — enjoy in moderation 🍕"),
+)
+
 def clamp(x: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, x))
 
@@ -20,11 +32,33 @@ def compute_health_index(nutri: Dict[str, float]) -> Tuple[float, str, str]:
     base = 5.0 + 0.02*prot - 0.015*fat - 0.01*sugar - 0.004*max(0, cal-250)
     score = clamp(base, 0.0, 10.0)
 
-    if score >= 7.5:
-        color = "#2ecc71"; msg = "Great choice! 🥗"
-    elif score >= 5.0:
-        color = "#f1c40f"; msg = "Decent choice, balance it ⚖️"
-    else:
-        color = "#e74c3c"; msg = "High calorie/sugar/fat — enjoy in moderation 🍕"
+    for threshold, color, msg in HEALTH_BUCKETS:
+        if score >= threshold:
+            break
 
     return round(score, 1), color, msg
+
+def compute_health_index_batch(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Input: matrice (N, 5) float64 cu coloanele din NUTRIENTS (un rând per fel de mâncare)
+    Output: (scoruri rotunjite (N,), indici în HEALTH_BUCKETS (N,))
+    Aceeași formulă ca compute_health_index, pentru toate rândurile într-o singură operație.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    cal, prot, fat, _carb, sugar = values.T
+
+    base = 5.0 + 0.02*prot - 0.015*fat - 0.01*sugar - 0.004*np.maximum(0.0, cal-250)
+    score = np.clip(base, 0.0, 10.0)
+
+    # Pragurile sunt descrescătoare: bucket = câte praguri (în afară de ultimul) NU sunt atinse
+    thresholds = np.array([t for t, _, _ in HEALTH_BUCKETS[:-1]])
+    bucket = (score[:, None] < thresholds[None, :]).sum(axis=1)
+
+    # np.round rotunjește score*10 (deja rotunjit în binar); la valorile de la jumătate
+    # (ex. 4.65) folosim round() ca rezultatul să fie identic cu compute_health_index
+    rounded = np.round(score, 1)
+    scaled = score * 10
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    rounded[ties] = [round(x, 1) for x in score[ties].tolist()]
+
+    return rounded, bucket
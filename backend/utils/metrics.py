@@ -0,0 +1,232 @@
+"""Per-stage latency instrumentation and Prometheus metrics.
+
+A small, dependency-free subset of the Prometheus client:
+
+- :class:`Counter` and :class:`Histogram` with optional labels, rendered in
+  the Prometheus text exposition format by :meth:`MetricsRegistry.render`.
+- Collectors: callables that produce extra samples at scrape time (used for
+  the batching scheduler, worker pool and cache, which keep their own stats).
+- :class:`StageTimer`: per-request stage durations (read, decode, forward...),
+  observed into a histogram and optionally sent back as a ``Server-Timing``
+  header.
+
+When the registry is disabled ``timer()`` returns the shared
+:data:`NULL_TIMER` (unless ``force``, e.g. for ``Server-Timing``), whose methods do nothing, and callers skip observations
+by checking ``enabled``, so the hot path only pays for a few attribute lookups.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Secunde: de la stagii sub-milisecundă (top-k) până la cereri lente în coadă
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = tuple(2 ** p * 1024 for p in range(4, 16, 2))  # 16 KB .. 32 MB
+PIXELS_BUCKETS = (0.1e6, 0.3e6, 1e6, 2e6, 5e6, 12e6, 24e6, 50e6)
+
+Sample = Tuple[str, Dict[str, str], float]
+# (nume, tip, descriere, sample-uri), produse de un collector la fiecare scrape
+Family = Tuple[str, str, str, Iterable[Sample]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labelvalues: Sequence[str]) -> Tuple[str, ...]:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labelvalues}")
+        return tuple(str(v) for v in labelvalues)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per set de labels: [count per bucket (ne-cumulativ) + overflow, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues) -> None:
+        key = self._key(labelvalues)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(float(bound))}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class StageTimer:
+    """Durations of the stages of one request, in seconds, in execution order."""
+
+    __slots__ = ("stages", "start")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.start = time.perf_counter()
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def stage(self, stage: str) -> "_StageContext":
+        """``with timer.stage("decode"): ...``"""
+        return _StageContext(self, stage)
+
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value (durations in milliseconds)."""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.total() * 1000:.2f}")
+        return ", ".join(parts)
+
+
+class _StageContext:
+    __slots__ = ("timer", "stage", "t0")
+
+    def __init__(self, timer, stage):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.stage, time.perf_counter() - self.t0)
+        return False
+
+
+class _NullTimer:
+    """Timer used when metrics are disabled: every call is a no-op."""
+
+    __slots__ = ()
+    stages: Dict[str, float] = {}
+
+    def add(self, stage, seconds):
+        pass
+
+    def stage(self, stage):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def total(self):
+        return 0.0
+
+    def server_timing(self):
+        return ""
+
+
+NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """Holds the metrics and collectors exported on ``/metrics``."""
+
+    def __init__(self, enabled: bool = True, prefix: str = ""):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        metric = Counter(self.prefix + name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(self.prefix + name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[Family]]):
+        """Register ``fn() -> [(name, type, help, samples), ...]``, called on every scrape."""
+        self._collectors.append(fn)
+        return fn
+
+    def timer(self, force: bool = False):
+        """A :class:`StageTimer`, or :data:`NULL_TIMER` when disabled and not ``force``."""
+        return StageTimer() if self.enabled or force else NULL_TIMER
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}"
+                         for name, labels, value in metric.samples())
+        for fn in self._collectors:
+            for name, kind, documentation, samples in fn():
+                lines.append(f"# HELP {self.prefix}{name} {documentation}")
+                lines.append(f"# TYPE {self.prefix}{name} {kind}")
+                lines.extend(f"{self.prefix}{sample}{_format_labels(labels)} {_format_value(value)}"
+                             for sample, labels, value in samples)
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,88 @@
+"""Background model loading and readiness tracking.
+
+The server binds its port immediately; the model is loaded (and warmed up)
+in a background thread started from the FastAPI lifespan. Until that is done
+the readiness probe answers 503 and prediction routes refuse traffic.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class ModelManager:
+    """Owns the inference backend and reports its loading state."""
+
+    def __init__(self, model_id: str, factory: Callable[[], Any], version: str = ""):
+        self.model_id = model_id
+        self.factory = factory
+        # Intră în cheia cache-ului: alt model/alte weights => alte chei
+        self.version = f"{model_id}:{version}" if version else model_id
+        self.backend: Any = None
+
+        self.loading = False
+        self.warmup_done = False
+        self.error: Optional[str] = None
+        self.load_time_s: Optional[float] = None
+        self.warmup_time_s: Optional[float] = None
+        self.parameter_count: Optional[int] = None
+        self.loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.backend is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded and self.warmup_done
+
+    def load(self) -> None:
+        """Build the backend (weights, session, ...). Blocking; call it from a worker thread."""
+        start = time.perf_counter()
+        backend = self.factory()
+
+        self.parameter_count = backend.parameter_count
+        self.backend = backend
+        self.load_time_s = round(time.perf_counter() - start, 3)
+        self.loaded_at = time.time()
+
+    def warmup(self, warmup_fn: Callable[[], Any]) -> None:
+        """Run ``warmup_fn`` once so the first real request is not slow."""
+        start = time.perf_counter()
+        warmup_fn()
+        self.warmup_time_s = round(time.perf_counter() - start, 3)
+        self.warmup_done = True
+
+    def load_and_warmup(self, warmup_fn: Optional[Callable[[], Any]] = None) -> None:
+        """Full startup sequence; errors are recorded instead of raised."""
+        with self._lock:
+            if self.loaded or self.loading:
+                return
+            self.loading = True
+        try:
+            self.load()
+            if warmup_fn is not None:
+                self.warmup(warmup_fn)
+            else:
+                self.warmup_done = True
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.loading = False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "model_id": self.model_id,
+            "version": self.version,
+            "backend": self.backend.describe() if self.backend is not None else None,
+            "loaded": self.loaded,
+            "loading": self.loading,
+            "warmup_done": self.warmup_done,
+            "ready": self.ready,
+            "load_time_s": self.load_time_s,
+            "warmup_time_s": self.warmup_time_s,
+            "parameter_count": self.parameter_count,
+            "loaded_at": self.loaded_at,
+            "error": self.error,
+        }
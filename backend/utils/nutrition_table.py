@@ -0,0 +1,100 @@
+"""Columnar nutrition data aligned with the model's class ids.
+
+``NUTRITION_MAP`` is keyed by label and scored one dish at a time by
+``compute_health_index``. :class:`NutritionTable` turns it into arrays
+indexed by class id (the order of ``labels_food101.json`` / the backend's
+``id2label``), built once at startup:
+
+- ``values``: float64 ``(classes, len(NUTRIENTS))`` matrix, zeros where a
+  class has no data; ``has_data``: bool mask;
+- ``scores`` / ``buckets``: health index and ``HEALTH_BUCKETS`` entry of
+  every class, from one ``compute_health_index_batch`` call.
+
+Per request, ``entry(class_id)`` is a single list lookup of the fully
+built ``(nutrition, health_index, color, message)``.
+
+``blend(class_ids, probs)`` is the ``?mode=blend`` estimate: the top-k
+probabilities of the classes that have data, renormalised, times
+``values`` (one vector-matrix product), scored like a single dish. It gives
+low-confidence predictions a usable answer without another forward pass.
+"""
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.health_index import HEALTH_BUCKETS, NUTRIENTS, compute_health_index_batch
+from utils.nutrition_map import NUTRITION_MAP
+
+Entry = Tuple[Dict[str, float], float, str, str]
+
+
+def normalize_label(label: str) -> str:
+    # Aceeași normalizare ca în răspuns: lowercase + underscores
+    return label.replace(" ", "_").lower()
+
+
+class NutritionTable:
+    def __init__(self, labels: Sequence[str], nutrition_map: Mapping[str, Mapping[str, float]] = NUTRITION_MAP):
+        self.labels: List[str] = [normalize_label(label) for label in labels]
+        self.values = np.zeros((len(self.labels), len(NUTRIENTS)), dtype=np.float64)
+        self.has_data = np.zeros(len(self.labels), dtype=bool)
+        for class_id, label in enumerate(self.labels):
+            nutri = nutrition_map.get(label)
+            if nutri is not None:
+                self.values[class_id] = [nutri.get(name, 0) for name in NUTRIENTS]
+                self.has_data[class_id] = True
+
+        self.scores, self.buckets = compute_health_index_batch(self.values)
+
+        # Răspunsul păstrează dict-ul original (valori int, ordinea cheilor)
+        self._entries: List[Optional[Entry]] = [
+            (dict(nutrition_map[label]), float(self.scores[i]),
+             HEALTH_BUCKETS[self.buckets[i]][1], HEALTH_BUCKETS[self.buckets[i]][2])
+            if self.has_data[i] else None
+            for i, label in enumerate(self.labels)
+        ]
+
+    @classmethod
+    def from_id2label(cls, id2label: Mapping[int, str], **kwargs) -> "NutritionTable":
+        return cls([id2label[i] for i in range(len(id2label))], **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def matches(self, id2label: Mapping[int, str]) -> bool:
+        """True if the table is aligned with ``id2label`` (same labels, same ids)."""
+        return len(id2label) == len(self.labels) and all(
+            normalize_label(id2label[i]) == label for i, label in enumerate(self.labels))
+
+    def entry(self, class_id: int) -> Optional[Entry]:
+        """``(nutrition, health_index, color, message)``, or None without nutrition data."""
+        return self._entries[class_id]
+
+    def blend(self, class_ids: Sequence[int], probs: Sequence[float]) -> Optional[Dict[str, Any]]:
+        """Probability-weighted nutrition + health index over the top-k classes with data.
+
+        Returns None if none of ``class_ids`` has nutrition data.
+        """
+        weights = np.zeros(len(self.labels), dtype=np.float64)
+        weights[np.asarray(class_ids, dtype=np.int64)] = probs
+        weights[~self.has_data] = 0.0
+        coverage = float(weights.sum())
+        if coverage <= 0.0:
+            return None
+
+        # Vectorul de probabilități (renormalizat pe clasele cu date) x matricea clase x nutrienți
+        expected = (weights / coverage) @ self.values
+        scores, buckets = compute_health_index_batch(expected[None, :])
+        _, color, message = HEALTH_BUCKETS[buckets[0]]
+        used = np.flatnonzero(weights)
+        return {
+            "nutrition": {name: round(float(v), 1) for name, v in zip(NUTRIENTS, expected)},
+            "health_index": float(scores[0]),
+            "health_color": color,
+            "message": message,
+            # Masa de probabilitate acoperită de clasele folosite (din top-k)
+            "coverage": round(coverage, 4),
+            "classes": [{"label": self.labels[i], "weight": round(float(weights[i] / coverage), 4)}
+                        for i in used[np.argsort(-weights[used])]],
+        }
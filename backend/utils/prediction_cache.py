@@ -0,0 +1,182 @@
+"""Content-hash cache for prediction responses.
+
+Keys are the SHA-256 of the model version plus the raw uploaded bytes, so the
+same photo uploaded twice (retries, double taps, shared images) skips decode,
+preprocessing and the forward pass. The in-memory tier is an LRU bounded by
+entry count and by serialized size, with an optional TTL; an optional on-disk
+tier (one JSON file per key) lets the cache survive restarts.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+class PredictionCache:
+    """Thread-safe LRU/TTL cache of JSON-serializable prediction results."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 3600.0,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        # key -> (expires_at, size_bytes, value)
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.disk_dir is not None
+
+    @staticmethod
+    def make_key(data: bytes, model_version: str) -> str:
+        h = hashlib.sha256(model_version.encode("utf-8"))
+        h.update(b"\0")
+        h.update(data)
+        return h.hexdigest()
+
+    # ------------------------------------------------------------------ API
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, _, value = entry
+                if expires_at and expires_at < now:
+                    self._remove(key)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        # Promovăm în memorie ce am găsit pe disk
+        self._memory_put(key, value, json.dumps(value).encode("utf-8"))
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        payload = json.dumps(value).encode("utf-8")
+        self._memory_put(key, value, payload)
+        self._disk_put(key, payload)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    # -------------------------------------------------------- memory tier
+    def _memory_put(self, key: str, value: Dict[str, Any], payload: bytes) -> None:
+        size = len(payload)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        expires_at = time.time() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    # ---------------------------------------------------------- disk tier
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.json"
+
+    def _disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            if self.ttl > 0 and path.stat().st_mtime + self.ttl < now:
+                path.unlink(missing_ok=True)
+                return None
+            with open(path, "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, payload: bytes) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % 100 == 0
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Delete the oldest files until the disk tier is under its byte limit."""
+        files = []
+        for path in self.disk_dir.glob("*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
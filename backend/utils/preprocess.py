@@ -1,51 +1,202 @@
-"""Image preprocessing helpers.
+"""Image preprocessing shared by training evaluation and serving.
 
-Provides a simple, well-scoped helper that converts raw image bytes into a
-PyTorch tensor shaped (1, C, H, W) suitable for MobileNetV2 inference.
+One :class:`Preprocessor` describes the deterministic pipeline
+(resize -> center crop -> normalize) and is built once:
 
-This function raises ImportError if torch/torchvision/Pillow are not
-available so callers can fall back to a dummy path.
+- ``to_uint8(img)``: PIL image -> (H, W, 3) uint8 array. Resize and center
+  crop happen in a single PIL resize call over the crop box, so no
+  intermediate full-size image is allocated.
+- ``collate(arrays)`` / ``normalize(uint8_batch)``: stack uint8 images into a
+  preallocated buffer and normalize the whole batch into a preallocated
+  float32 (N, 3, H, W) tensor with two vectorized in-place ops.
+- ``transform(img)``: drop-in for the old ``transforms.Compose`` (float CHW).
+
+The defaults match ``train_model.py``'s test transform:
+Resize((256, 256)) -> CenterCrop(224) -> ImageNet normalization.
+``preprocess_image_bytes`` is kept as a one-shot helper on top of it.
 """
 
-from typing import Any
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# Valori PIL pentru Image.Resampling (nume folosite și de procesorii HF)
+RESAMPLE = {"nearest": 0, "lanczos": 1, "bilinear": 2, "bicubic": 3, "box": 4, "hamming": 5}
+
+
+class Preprocessor:
+    """Deterministic resize/crop/normalize with reusable batch buffers.
+
+    ``collate`` and ``normalize`` write into buffers owned by the instance and
+    return views of them, so the result is only valid until the next call and
+    one instance must not be used for two batches at the same time.
+    """
+
+    def __init__(
+        self,
+        resize: Tuple[int, int] = (256, 256),
+        crop: Optional[int] = 224,
+        mean: Sequence[float] = IMAGENET_MEAN,
+        std: Sequence[float] = IMAGENET_STD,
+        resample: int = RESAMPLE["bilinear"],
+    ):
+        import torch
+
+        self.resize = (int(resize[0]), int(resize[1]))  # (height, width)
+        self.crop = int(crop) if crop else None
+        self.mean = tuple(float(m) for m in mean)
+        self.std = tuple(float(s) for s in std)
+        self.resample = int(resample)
+        self.output_size = (self.crop, self.crop) if self.crop else self.resize
+
+        # (x / 255 - mean) / std == x * scale + bias, calculat o singură dată
+        self._scale = torch.tensor([1.0 / (255.0 * s) for s in self.std]).view(1, 3, 1, 1)
+        self._bias = torch.tensor([-m / s for m, s in zip(self.mean, self.std)]).view(1, 3, 1, 1)
+
+        self._u8_buffer = None
+        self._float_buffer = None
+
+    # ----------------------------------------------------------- factories
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Preprocessor":
+        return cls(resize=d["resize"], crop=d.get("crop"), mean=d["mean"], std=d["std"],
+                   resample=d.get("resample", RESAMPLE["bilinear"]))
+
+    @classmethod
+    def from_model_config(cls, config: Dict[str, Any]) -> "Preprocessor":
+        """From ``model/config.json`` / the config written by ``train_model.py``."""
+        size = int(config.get("image_size") or config.get("input_size", [224])[0])
+        # Training: Resize((256, 256)) -> CenterCrop(224), adică raport 256/224
+        resize = round(size * 256 / 224)
+        return cls(resize=(resize, resize), crop=size,
+                   mean=config.get("normalize_mean", IMAGENET_MEAN),
+                   std=config.get("normalize_std", IMAGENET_STD))
+
+    @classmethod
+    def from_hf_processor(cls, processor) -> "Preprocessor":
+        """Replicate a HuggingFace image processor (resize/crop/normalize only)."""
+        size = getattr(processor, "size", 224)
+        if isinstance(size, dict):
+            if "height" in size:
+                resize = (size["height"], size["width"])
+            else:
+                edge = size.get("shortest_edge", 224)
+                resize = (edge, edge)
+        else:
+            resize = (int(size), int(size))
+
+        crop = None
+        if getattr(processor, "do_center_crop", False):
+            crop_size = processor.crop_size
+            crop = crop_size["height"] if isinstance(crop_size, dict) else int(crop_size)
+
+        mean, std = (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)
+        if getattr(processor, "do_normalize", True):
+            mean, std = processor.image_mean, processor.image_std
+        return cls(resize=resize, crop=crop, mean=mean, std=std,
+                   resample=int(getattr(processor, "resample", RESAMPLE["bilinear"])))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"resize": list(self.resize), "crop": self.crop, "mean": list(self.mean),
+                "std": list(self.std), "resample": self.resample}
+
+    @property
+    def min_decode_size(self) -> int:
+        """Smallest source side that still gives a full-resolution resize."""
+        return max(self.resize)
+
+    # ------------------------------------------------------- per image ops
+    def to_uint8(self, img):
+        """RGB PIL image -> (H, W, 3) uint8 array (read-only), resized and center-cropped."""
+        import numpy as np
+
+        out_h, out_w = self.output_size
+        box = None
+        if self.crop:
+            # Resize((rh, rw)) + CenterCrop(c) într-un singur pas: redimensionăm
+            # direct regiunea din sursă care ar ajunge în crop
+            src_w, src_h = img.size
+            rh, rw = self.resize
+            left = (rw - out_w) / 2 * src_w / rw
+            top = (rh - out_h) / 2 * src_h / rh
+            box = (left, top, left + out_w * src_w / rw, top + out_h * src_h / rh)
+        img = img.resize((out_w, out_h), resample=self.resample, box=box)
+        return np.asarray(img, dtype=np.uint8)
+
+    def uint8_tensor(self, img):
+        """RGB PIL image -> (3, H, W) uint8 tensor; for DataLoader workers."""
+        import torch
+
+        # to_uint8 întoarce un array read-only (buffer-ul PIL); torch.tensor îl copiază
+        return torch.tensor(self.to_uint8(img)).permute(2, 0, 1)
+
+    def transform(self, img):
+        """RGB PIL image -> normalized (3, H, W) float tensor (torchvision-style)."""
+        u8 = self.uint8_tensor(img).unsqueeze(0)
+        return (u8.float() * self._scale + self._bias)[0]
+
+    # ------------------------------------------------------------ batch ops
+    def collate(self, arrays):
+        """List of (H, W, 3) uint8 arrays -> normalized (N, 3, H, W) float32 view."""
+        import numpy as np
+        import torch
+
+        n = len(arrays)
+        if self._u8_buffer is None or self._u8_buffer.shape[0] < n:
+            self._u8_buffer = np.empty((n, *self.output_size, 3), dtype=np.uint8)
+        u8 = self._u8_buffer[:n]
+        np.stack(arrays, axis=0, out=u8)
+        # NHWC -> NCHW fără copie; conversia + layout se fac în normalize
+        return self.normalize(torch.from_numpy(u8).permute(0, 3, 1, 2))
+
+    def normalize(self, u8_batch):
+        """(N, 3, H, W) uint8 tensor -> normalized float32 view of the shared buffer."""
+        import torch
+
+        n = u8_batch.shape[0]
+        if self._float_buffer is None or self._float_buffer.shape[0] < n:
+            self._float_buffer = torch.empty((n, 3, *self.output_size), dtype=torch.float32)
+        out = self._float_buffer[:n]
+        out.copy_(u8_batch)  # uint8 -> float32 (și NHWC -> NCHW) într-un singur kernel
+        out.mul_(self._scale).add_(self._bias)
+        return out
+
+
+_default_preprocessor: Optional[Preprocessor] = None
 
 
 def preprocess_image_bytes(image_bytes: bytes) -> Any:
     """Decode bytes -> RGB PIL image -> normalized torch.Tensor (1,C,224,224).
 
-    Uses torchvision transforms: Resize(256) -> CenterCrop(224) -> ToTensor -> Normalize
-    matching standard ImageNet preprocessing for MobileNetV2.
+    Decoding goes through ``utils.decode.decode_image`` (reduced-resolution
+    JPEG decode, EXIF orientation, pixel-count cap), then the default
+    :class:`Preprocessor`: Resize((256, 256)) -> CenterCrop(224) ->
+    ImageNet normalization, the same pipeline ``train_model.py`` evaluates with.
 
     Returns:
         torch.Tensor with shape (1, C, H, W)
 
     Raises:
         ImportError: when required libraries are not installed.
-        Exception: for other decoding/transform errors.
+        ImageDecodeError: when the bytes are not a decodable image or the
+            image exceeds the pixel-count cap (ImageTooLargeError).
+        Exception: for other transform errors.
     """
+    global _default_preprocessor
+
     try:
-        from PIL import Image
+        from utils.decode import decode_image
     except Exception as e:
         raise ImportError("Pillow is required for image preprocessing") from e
 
     try:
-        import torch
-        from torchvision import transforms
+        import torch  # noqa: F401
     except Exception as e:
-        raise ImportError("torch and torchvision are required for preprocessing") from e
+        raise ImportError("torch is required for preprocessing") from e
 
-    try:
-        img = Image.open(__import__('io').BytesIO(image_bytes)).convert("RGB")
-
-        transform = transforms.Compose([
-            transforms.Resize(256),
-            transforms.CenterCrop(224),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-        ])
-
-        tensor = transform(img).unsqueeze(0)  # 1,C,H,W
-        return tensor
-    except Exception:
-        # Let caller decide how to handle transform failures
-        raise
+    if _default_preprocessor is None:
+        _default_preprocessor = Preprocessor()
+
+    img = decode_image(image_bytes, min_size=_default_preprocessor.min_decode_size)
+    return _default_preprocessor.transform(img).unsqueeze(0)  # 1,C,H,W
@@ -0,0 +1,89 @@
+"""Runtime settings for the inference service.
+
+Every value can be overridden with an environment variable (prefix ``FHC_``)
+so a deployment can be tuned without touching the code.
+"""
+
+import os
+from pathlib import Path
+
+MODEL_DIR = Path(__file__).resolve().parents[1] / "model"
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+# Micro-batching: cererile concurente sunt grupate într-un singur forward pass
+MAX_BATCH_SIZE = _env_int("FHC_MAX_BATCH_SIZE", 16)
+MAX_BATCH_WAIT_MS = _env_float("FHC_MAX_BATCH_WAIT_MS", 5.0)
+
+# Număr de procese server (setat de serve.py); core-urile se împart între ele
+PROCESS_WORKERS = max(1, _env_int("FHC_PROCESS_WORKERS", 1))
+# Worker pool pentru decode/preprocess/forward (în afara event loop-ului)
+WORKER_THREADS = _env_int("FHC_WORKER_THREADS",
+                          min(4, max(1, (os.cpu_count() or 1) // PROCESS_WORKERS)))
+# 0 = calculat automat din numărul de core-uri (vezi utils/workers.py)
+TORCH_THREADS = _env_int("FHC_TORCH_THREADS", 0)
+# Backpressure: peste acest număr de cereri în lucru răspundem 503
+MAX_PENDING_REQUESTS = _env_int("FHC_MAX_PENDING_REQUESTS", 64)
+RETRY_AFTER_SECONDS = _env_int("FHC_RETRY_AFTER_SECONDS", 1)
+
+# Modelul se încarcă în background la pornire (vezi utils/model_manager.py)
+# Backend de inferență: hf | timm | onnx (vezi utils/backends.py)
+BACKEND = os.environ.get("FHC_BACKEND", "hf")
+MODEL_NAME = os.environ.get("FHC_MODEL_NAME", "nateraw/food")
+TIMM_MODEL_DIR = os.environ.get("FHC_TIMM_MODEL_DIR", str(MODEL_DIR))
+ONNX_PATH = os.environ.get("FHC_ONNX_PATH", str(MODEL_DIR / "food101.onnx"))
+# ONNX Runtime: disable | basic | extended | all
+ORT_OPT_LEVEL = os.environ.get("FHC_ORT_OPT_LEVEL", "all")
+# 0 = același număr ca thread-urile torch
+ORT_INTRA_OP_THREADS = _env_int("FHC_ORT_INTRA_OP_THREADS", 0)
+ORT_INTER_OP_THREADS = _env_int("FHC_ORT_INTER_OP_THREADS", 1)
+# Schimbă-l când actualizezi weights-urile (invalidează cache-ul de predicții)
+MODEL_VERSION = os.environ.get("FHC_MODEL_VERSION", "")
+WARMUP = _env_int("FHC_WARMUP", 1) == 1
+# Fișier cu weights partajate între procese (scris de serve.py, vezi utils/shared_weights.py)
+SHARED_WEIGHTS = os.environ.get("FHC_SHARED_WEIGHTS", "")
+
+# Cache de predicții după hash-ul conținutului (vezi utils/prediction_cache.py)
+# FHC_CACHE_MAX_ENTRIES=0 dezactivează tier-ul din memorie
+CACHE_MAX_ENTRIES = _env_int("FHC_CACHE_MAX_ENTRIES", 1024)
+CACHE_MAX_BYTES = _env_int("FHC_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+CACHE_TTL_SECONDS = _env_float("FHC_CACHE_TTL_SECONDS", 3600.0)
+# Director pentru tier-ul pe disk (gol = dezactivat)
+CACHE_DIR = os.environ.get("FHC_CACHE_DIR", "")
+CACHE_DISK_MAX_BYTES = _env_int("FHC_CACHE_DISK_MAX_BYTES", 512 * 1024 * 1024)
+
+# Upload-uri citite în streaming (vezi utils/uploads.py): respinse cu 413 la
+# depășire, înainte ca tot body-ul să ajungă în memorie
+MAX_UPLOAD_BYTES = _env_int("FHC_MAX_UPLOAD_BYTES", 20 * 1024 * 1024)
+MAX_BATCH_UPLOAD_BYTES = _env_int("FHC_MAX_BATCH_UPLOAD_BYTES", 256 * 1024 * 1024)
+
+# /predict-images: limite pentru numărul de imagini și arhivele zip/tar
+MAX_IMAGES_PER_REQUEST = _env_int("FHC_MAX_IMAGES_PER_REQUEST", 256)
+MAX_ARCHIVE_BYTES = _env_int("FHC_MAX_ARCHIVE_BYTES", 512 * 1024 * 1024)
+
+# Decompression bombs: imaginile cu mai mulți pixeli (din header) sunt respinse cu 413
+MAX_IMAGE_PIXELS = _env_int("FHC_MAX_IMAGE_PIXELS", 60_000_000)
+
+# Metrici Prometheus la GET /metrics (vezi utils/metrics.py); 0 = dezactivat
+METRICS = _env_int("FHC_METRICS", 1) == 1
+# Header Server-Timing cu durata fiecărui stagiu (decode, forward, ...) pe răspuns
+SERVER_TIMING = _env_int("FHC_SERVER_TIMING", 0) == 1
+
+# /similar: indexul de embedding-uri construit cu build_embedding_index.py
+# (vezi utils/embedding_index.py); dacă directorul lipsește, /similar răspunde 503
+EMBEDDING_INDEX = os.environ.get("FHC_EMBEDDING_INDEX",
+                                 str(MODEL_DIR.parent / "data" / "embedding_index"))
+# Listele IVF scanate per căutare (mai multe = recall mai bun, căutare mai lentă)
+SIMILAR_NPROBE = _env_int("FHC_SIMILAR_NPROBE", 8)
+SIMILAR_MAX_K = _env_int("FHC_SIMILAR_MAX_K", 50)
+# Peste această similaritate cosinus rezultatul e marcat "near_duplicate"
+NEAR_DUPLICATE_THRESHOLD = _env_float("FHC_NEAR_DUPLICATE_THRESHOLD", 0.95)
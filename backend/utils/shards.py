@@ -0,0 +1,291 @@
+"""Packed shard format for training I/O.
+
+``datasets.ImageFolder`` over Food-101 opens ~100k small JPEG files per epoch,
+so loading is dominated by filesystem metadata calls and small random reads.
+``pack_shards.py`` re-encodes every image once, pre-resized to the training
+resize (256x256), and concatenates them into a few large files:
+
+    data/food101_shards/
+    ├── shards.json               (classes, image size, shards + sample order per split)
+    ├── train-00000.bin ...       (concatenated JPEG bytes)
+    ├── train.index.npy           (int64 [shard, offset, length, label] per sample)
+    └── test-00000.bin, test.index.npy
+
+Both datasets read the shards through ``mmap`` and return ``(transform(img),
+label)`` like ``ImageFolder`` (``classes`` and ``targets`` included):
+
+- :class:`ShardDataset`: map-style, random access (evaluation, or with a sampler);
+- :class:`ShardIterableDataset`: streams whole shards sequentially, shards split
+  between DataLoader workers, order randomised by a shuffle buffer.
+
+The train samples are packed in a seeded random order (``"order": "shuffled"``
+and ``"seed"`` in shards.json), so every shard mixes all classes. In class
+order a 64 MB shard would hold only 2-3 classes, and a shuffle buffer over one
+shard per worker could not give batches with a representative class mix.
+"""
+
+import io
+import json
+import mmap
+import os
+import random
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch.distributed as dist
+from PIL import Image
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+
+META_FILE = "shards.json"
+FORMAT_VERSION = 1
+# Coloanele din <split>.index.npy
+SHARD, OFFSET, LENGTH, LABEL = range(4)
+
+
+def shard_name(split: str, number: int) -> str:
+    return f"{split}-{number:05d}.bin"
+
+
+def encode_image(path, size: int, quality: int) -> bytes:
+    """Image file -> JPEG bytes resized to ``size`` x ``size`` (the training Resize)."""
+    with Image.open(path) as img:
+        if img.format == "JPEG":
+            img.draft("RGB", (size, size))
+        img = img.convert("RGB").resize((size, size), Image.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+class ShardWriter:
+    """Appends encoded samples to ``<split>-NNNNN.bin`` files of about ``shard_bytes``."""
+
+    def __init__(self, root, split: str, shard_bytes: int):
+        self.root = Path(root)
+        self.split = split
+        self.shard_bytes = shard_bytes
+        self.shards: List[str] = []
+        self.index: List[Tuple[int, int, int, int]] = []
+        self._file = None
+        self._offset = 0
+
+    def write(self, data: bytes, label: int) -> None:
+        if self._file is None or self._offset >= self.shard_bytes:
+            self._roll()
+        self._file.write(data)
+        self.index.append((len(self.shards) - 1, self._offset, len(data), label))
+        self._offset += len(data)
+
+    def _roll(self) -> None:
+        self._close_shard()
+        self.shards.append(shard_name(self.split, len(self.shards)))
+        self._file = open(self.root / (self.shards[-1] + ".part"), "wb")
+        self._offset = 0
+
+    def _close_shard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            name = self.shards[-1]
+            os.replace(self.root / (name + ".part"), self.root / name)
+            self._file = None
+
+    def close(self) -> dict:
+        """Finish the last shard, write the index; returns the split entry for shards.json."""
+        self._close_shard()
+        index = np.asarray(self.index, dtype=np.int64).reshape(-1, 4)
+        tmp = self.root / f"{self.split}.index.npy.part"
+        with open(tmp, "wb") as f:
+            np.save(f, index)
+        os.replace(tmp, self.root / f"{self.split}.index.npy")
+        return {"count": len(self.index), "shards": self.shards,
+                "bytes": int(index[:, LENGTH].sum()) if len(index) else 0}
+
+
+def write_meta(root, meta: dict) -> None:
+    # Scris ultimul și atomic: shards.json există doar pentru un pachet complet
+    root = Path(root)
+    tmp = root / (META_FILE + ".part")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, root / META_FILE)
+
+
+def read_meta(root) -> dict:
+    with open(Path(root) / META_FILE, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"{root} was packed with format {meta.get('format_version')}, "
+                         f"expected {FORMAT_VERSION}; re-run pack_shards.py")
+    return meta
+
+
+class _ShardReader:
+    """Index + lazily opened read-only mmaps, re-opened in every worker process."""
+
+    def __init__(self, root, split: str):
+        self.root = Path(root)
+        self.split = split
+        meta = read_meta(root)
+        if split not in meta["splits"]:
+            raise ValueError(f"{root} has no '{split}' split")
+        self.classes: List[str] = meta["classes"]
+        self.image_size: int = meta["image_size"]
+        self.shards: List[str] = meta["splits"][split]["shards"]
+        self.index = np.load(self.root / f"{split}.index.npy", mmap_mode="r")
+        self._maps = {}
+
+    def __getstate__(self):
+        # mmap-urile nu se pot trimite prin pickle (DataLoader cu spawn)
+        state = self.__dict__.copy()
+        state["_maps"] = {}
+        return state
+
+    def _map(self, shard: int) -> mmap.mmap:
+        mm = self._maps.get(shard)
+        if mm is None:
+            with open(self.root / self.shards[shard], "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[shard] = mm
+        return mm
+
+    def load(self, row) -> Image.Image:
+        data = self._map(int(row[SHARD]))[int(row[OFFSET]):int(row[OFFSET]) + int(row[LENGTH])]
+        img = Image.open(io.BytesIO(data))
+        img.draft("RGB", (self.image_size, self.image_size))
+        return img.convert("RGB")
+
+
+class ShardDataset(Dataset):
+    """Map-style dataset over one packed split (``ImageFolder`` drop-in)."""
+
+    def __init__(self, root, split: str, transform: Optional[Callable] = None):
+        self.reader = _ShardReader(root, split)
+        self.transform = transform
+        self.classes = self.reader.classes
+        self.targets = self.reader.index[:, LABEL].tolist()
+
+    def __len__(self) -> int:
+        return len(self.reader.index)
+
+    def __getitem__(self, i):
+        row = self.reader.index[i]
+        img = self.reader.load(row)
+        if self.transform is not None:
+            img = self.transform(img)
+        return img, int(row[LABEL])
+
+
+def _dist_rank() -> Tuple[int, int]:
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+    return 0, 1
+
+
+class ShardIterableDataset(IterableDataset):
+    """Streams one packed split shard by shard.
+
+    Every epoch the shard order is shuffled with ``seed + epoch`` and the
+    shards are dealt round-robin to the DataLoader workers of every DDP rank,
+    so each shard is read sequentially by exactly one worker. Samples pass
+    through a shuffle buffer of ``shuffle_buffer`` entries (0 or 1 disables
+    shuffling). Call ``set_epoch`` before each epoch, as with
+    ``DistributedSampler``; the order only depends on ``seed``, the epoch and
+    the number of workers, so a resumed run can skip what it already saw.
+
+    ``len()`` is the number of samples this rank yields in the current epoch
+    (its shards, minus skipped rows), which depends on the DataLoader's
+    worker count: set ``num_workers`` to match it.
+    """
+
+    def __init__(self, root, split: str, transform: Optional[Callable] = None,
+                 shuffle_buffer: int = 1000, seed: int = 0):
+        self.reader = _ShardReader(root, split)
+        self.transform = transform
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.epoch = 0
+        self.skip_batches = 0
+        self.batch_size = 1
+        self.num_workers = 1
+        self.classes = self.reader.classes
+        self.targets = self.reader.index[:, LABEL].tolist()
+        self._shard_rows = np.bincount(self.reader.index[:, SHARD], minlength=len(self.reader.shards))
+
+    def __len__(self) -> int:
+        # Doar partea acestui rank (toți workerii lui), ca len(DataLoader) și tqdm să fie corecte
+        rank, world_size = _dist_rank()
+        workers = max(1, self.num_workers)
+        total = 0
+        for worker_id in range(workers):
+            shards, skip = self._stream_plan(rank, world_size, worker_id, workers)
+            total += max(0, int(self._shard_rows[shards].sum()) - skip)
+        return total
+
+    def set_epoch(self, epoch: int, skip_batches: int = 0, batch_size: int = 1) -> None:
+        """Select the epoch and skip its first ``skip_batches`` batches of ``batch_size``.
+
+        Skipped rows are not decoded; used to resume a run mid-epoch. The
+        remaining samples are exactly the ones not seen yet, although with
+        several workers their batches may come in a rotated worker order.
+        """
+        self.epoch = epoch
+        self.skip_batches = skip_batches
+        self.batch_size = batch_size
+
+    def _stream_plan(self, rank: int, world_size: int, worker_id: int,
+                     num_workers: int) -> Tuple[List[int], int]:
+        """Shard-urile unui worker al unui rank în epoca curentă + rândurile de sărit."""
+        # Cu DDP, shard-urile se împart între toți workerii tuturor proceselor
+        stream, streams = rank * num_workers + worker_id, world_size * num_workers
+        shards = list(range(len(self.reader.shards)))
+        # Aceeași ordine în toate workerii (același seed), apoi fiecare își ia partea
+        random.Random(self.seed + self.epoch).shuffle(shards)
+        # DataLoader-ul ia batch-urile de la workeri pe rând: batch-ul i vine de la workerul i % W
+        skip = (self.skip_batches - worker_id + num_workers - 1) // num_workers * self.batch_size
+        return shards[stream::streams], max(0, skip)
+
+    def _worker_shards(self) -> Tuple[Sequence[int], random.Random, int]:
+        info = get_worker_info()
+        worker_id, num_workers = (info.id, info.num_workers) if info else (0, 1)
+        rank, world_size = _dist_rank()
+        shards, skip = self._stream_plan(rank, world_size, worker_id, num_workers)
+        rng = random.Random((self.seed + self.epoch) * 1000 + rank * num_workers + worker_id)
+        return shards, rng, skip
+
+    def _rows(self, shards: Iterable[int]):
+        index = self.reader.index
+        for shard in shards:
+            # Rândurile unui shard sunt consecutive în index (scrise în ordine)
+            rows = np.flatnonzero(index[:, SHARD] == shard)
+            for i in rows:
+                yield index[i]
+
+    def _shuffled(self, rows, rng: random.Random):
+        if self.shuffle_buffer <= 1:
+            yield from rows
+            return
+        buffer = []
+        for row in rows:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(row)
+                continue
+            # Înlocuiește un element aleator din buffer și îl emite pe cel vechi
+            j = rng.randrange(len(buffer))
+            buffer[j], row = row, buffer[j]
+            yield row
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def __iter__(self):
+        shards, rng, skip = self._worker_shards()
+        # Ordinea e deterministă, deci rândurile deja folosite se sar fără decodare
+        for row in islice(self._shuffled(self._rows(shards), rng), skip, None):
+            yield self._sample(row)
+
+    def _sample(self, row):
+        img = self.reader.load(row)
+        if self.transform is not None:
+            img = self.transform(img)
+        return img, int(row[LABEL])
@@ -0,0 +1,145 @@
+"""Model weights shared between server processes through a memory-mapped file.
+
+With several uvicorn workers every process used to run ``from_pretrained``
+and keep a private copy of the weights. Instead, ``serve.py`` loads the model
+once and writes every parameter and buffer to a single file (by default in
+``/dev/shm``, i.e. RAM) with a JSON sidecar holding labels, preprocessing and
+the architecture config:
+
+- ``save_shared_weights(backend, path)``: PyTorch backend -> ``<path>`` + ``<path>.json``
+- ``load_shared_model(path)``: builds the architecture on the ``meta`` device
+  (no allocation, no random init) and attaches the tensors returned by
+  ``torch.load(mmap=True)``. The pages are never written at inference time, so
+  every process maps the same physical memory.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from itertools import chain
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+# tmpfs: fișierul stă în RAM, iar paginile sunt partajate de toate procesele
+DEFAULT_SHARED_DIR = Path("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()) \
+    / "food-health-classifier"
+
+
+def source_files(settings) -> List[Path]:
+    """Local files the configured model is loaded from (none for a Hub model id)."""
+    if settings.BACKEND == "timm":
+        model_dir = Path(settings.TIMM_MODEL_DIR)
+        return [model_dir / "best_model.pth", model_dir / "config.json", model_dir / "labels_food101.json"]
+    if settings.BACKEND == "hf" and Path(settings.MODEL_NAME).is_dir():
+        return sorted(p for p in Path(settings.MODEL_NAME).rglob("*") if p.is_file())
+    return []
+
+
+def source_fingerprint(paths: Iterable[Path]) -> str:
+    """Size + mtime of every source file: a retrained checkpoint at the same path changes it."""
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        parts.append(f"{Path(path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16] if parts else ""
+
+
+def shared_weights_path(shared_dir, model_version: str, fingerprint: str = "") -> Path:
+    """One file per model version and source files, e.g. ``/dev/shm/food-health-classifier/hf-3f2a....pt``."""
+    digest = hashlib.sha256(f"{model_version}|{fingerprint}".encode("utf-8")).hexdigest()[:16]
+    return Path(shared_dir) / f"{model_version.split(':', 1)[0]}-{digest}.pt"
+
+
+def read_meta(path) -> Dict[str, Any]:
+    with open(Path(path).with_suffix(".pt.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _named_tensors(model):
+    # remove_duplicate=False păstrează și numele weights-urilor legate (tied);
+    # torch.save scrie storage-ul comun o singură dată
+    return chain(model.named_parameters(remove_duplicate=False),
+                 model.named_buffers(remove_duplicate=False))
+
+
+def save_shared_weights(backend, path, model_version: str, fingerprint: str = "") -> Path:
+    """Write the weights of an ``hf`` or ``timm`` backend for ``load_shared_model``."""
+    import torch
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tensors = {name: tensor.detach().contiguous() for name, tensor in _named_tensors(backend.model)}
+
+    meta = {
+        "backend": backend.name,
+        "model_version": model_version,
+        "source_fingerprint": fingerprint,
+        "preprocess": backend.preprocessor.to_dict(),
+        "id2label": {str(k): v for k, v in backend.id2label.items()},
+        "parameter_count": backend.parameter_count,
+    }
+    if backend.name == "hf":
+        meta["model_name"] = backend.model_name
+        meta["config"] = backend.model.config.to_dict()
+    elif backend.name == "timm":
+        meta["checkpoint"] = str(backend.checkpoint)
+        meta["config"] = backend.config
+    else:
+        raise ValueError(f"Shared weights need a PyTorch backend, got {backend.name!r}")
+
+    # Scriere atomică: workerii unei instanțe vechi pot mapa încă fișierul anterior.
+    # Sidecar-ul e publicat înaintea weights-urilor, ca un cititor care găsește
+    # weights-urile noi să aibă deja metadatele complete
+    tmp = path.with_suffix(".pt.tmp")
+    torch.save(tensors, tmp)
+    meta_tmp = path.with_suffix(".pt.json.tmp")
+    with open(meta_tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_tmp, path.with_suffix(".pt.json"))
+    os.replace(tmp, path)
+    return path
+
+
+def _build_skeleton(meta: Dict[str, Any]):
+    if meta["backend"] == "hf":
+        from transformers import AutoConfig, AutoModelForImageClassification
+
+        return AutoModelForImageClassification.from_config(AutoConfig.for_model(**meta["config"]))
+
+    from utils.backends import create_timm_model
+
+    return create_timm_model(meta["config"])
+
+
+def _assign(model, name: str, tensor) -> None:
+    import torch
+
+    module_path, _, leaf = name.rpartition(".")
+    module = model.get_submodule(module_path) if module_path else model
+    if leaf in module._parameters:
+        module._parameters[leaf] = torch.nn.Parameter(tensor, requires_grad=False)
+    else:
+        module._buffers[leaf] = tensor
+
+
+def load_shared_model(path) -> Tuple[Any, Dict[str, Any]]:
+    """(model in eval mode backed by the memory-mapped file, sidecar metadata)."""
+    import torch
+
+    meta = read_meta(path)
+    tensors = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+
+    # Arhitectura pe device-ul meta: fără alocare și fără inițializare random
+    with torch.device("meta"):
+        model = _build_skeleton(meta)
+    for name, tensor in tensors.items():
+        _assign(model, name, tensor)
+
+    missing = [name for name, tensor in _named_tensors(model) if tensor.is_meta]
+    if missing:
+        raise RuntimeError(f"{path} has no data for {len(missing)} tensors, e.g. {missing[:3]}")
+    return model.eval(), meta
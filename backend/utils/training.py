@@ -0,0 +1,138 @@
+"""Training-loop performance options for ``train_model.py``.
+
+:class:`TrainingMode` bundles the opt-in speedups for CPU training:
+
+- ``bf16``: forward and loss under ``torch.autocast`` with bfloat16 (weights,
+  gradients and optimizer state stay fp32, so no loss scaling is needed);
+- ``channels_last``: NHWC model and inputs, the layout oneDNN convolutions prefer;
+- ``compile``: ``torch.compile`` when available, falling back to eager.
+
+With ``distributed=True`` the model is wrapped in ``DistributedDataParallel``
+(before compilation); ``no_sync`` / ``join`` are then the DDP context
+managers for gradient accumulation and uneven inputs, no-ops otherwise.
+Checkpoints are always written from ``mode.module`` (the uncompiled model),
+so the state dict format is the same as with the plain loop.
+``measure_train_throughput`` times a few training steps on a synthetic batch
+so the configured mode can be compared with the fp32 baseline on this host.
+"""
+
+import contextlib
+import copy
+import time
+import warnings
+
+import torch
+import torch.nn as nn
+
+
+class TrainingMode:
+    """Precision / memory format / compilation used by the training loop."""
+
+    def __init__(self, device, bf16: bool = False, channels_last: bool = False, compile: bool = False):
+        self.device = device
+        self.bf16 = bf16
+        self.channels_last = channels_last
+        self.compile = compile
+        self.module = None  # modelul necompilat, pentru state_dict / checkpoint
+        self.ddp = None
+
+    @property
+    def is_baseline(self) -> bool:
+        return not (self.bf16 or self.channels_last or self.compile)
+
+    def describe(self) -> str:
+        parts = ["bf16 autocast" if self.bf16 else "fp32"]
+        parts.append("channels_last" if self.channels_last else "NCHW")
+        if self.compile:
+            parts.append("torch.compile")
+        return " + ".join(parts)
+
+    def to_dict(self) -> dict:
+        return {"bf16": self.bf16, "channels_last": self.channels_last, "compile": self.compile}
+
+    def prepare_model(self, model: nn.Module, distributed: bool = False) -> nn.Module:
+        """Move to the device/layout; returns the model to call (maybe DDP, maybe compiled)."""
+        model = model.to(self.device)
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        self.module = model
+        if distributed:
+            from torch.nn.parallel import DistributedDataParallel
+
+            # Buffer-ele (BatchNorm) se sincronizează explicit înainte de evaluare,
+            # nu la fiecare forward: evaluarea nu face colective
+            device_ids = None
+            if self.device.type == "cuda":
+                device_ids = [self.device.index if self.device.index is not None else torch.cuda.current_device()]
+            self.ddp = DistributedDataParallel(model, device_ids=device_ids, broadcast_buffers=False)
+            model = self.ddp
+        if not self.compile:
+            return model
+        if not hasattr(torch, "compile"):
+            warnings.warn("torch.compile is not available in this torch build, training eagerly")
+            self.compile = False
+            return model
+        try:
+            return torch.compile(model)
+        except Exception as e:
+            warnings.warn(f"torch.compile failed ({e}), training eagerly")
+            self.compile = False
+            return model
+
+    def no_sync(self, sync: bool):
+        """Skip the gradient all-reduce for accumulation micro-batches (``sync=False``)."""
+        if self.ddp is None or sync:
+            return contextlib.nullcontext()
+        return self.ddp.no_sync()
+
+    def join(self):
+        """Lets ranks that run out of batches early (uneven shards) shadow the others."""
+        if self.ddp is None:
+            return contextlib.nullcontext()
+        return self.ddp.join()
+
+    def inputs(self, images: torch.Tensor) -> torch.Tensor:
+        images = images.to(self.device, non_blocking=True)
+        if self.channels_last:
+            images = images.contiguous(memory_format=torch.channels_last)
+        return images
+
+    def autocast(self):
+        if not self.bf16:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=torch.bfloat16)
+
+
+def measure_train_throughput(model: nn.Module, mode: TrainingMode, batch_size: int,
+                             num_classes: int, steps: int = 10, warmup: int = 3) -> float:
+    """Images/sec of forward + backward + optimizer step on a copy of ``model``.
+
+    Uses one synthetic batch, so only compute is measured (no data loading).
+    ``model`` itself is not modified.
+    """
+    mode = TrainingMode(mode.device, mode.bf16, mode.channels_last, mode.compile)
+    net = mode.prepare_model(copy.deepcopy(model).float())
+    net.train()
+    optimizer = torch.optim.Adam(net.parameters(), lr=1e-6)
+    criterion = nn.CrossEntropyLoss()
+    images = mode.inputs(torch.randn(batch_size, 3, 224, 224))
+    labels = torch.randint(0, num_classes, (batch_size,), device=mode.device)
+
+    def step():
+        with mode.autocast():
+            loss = criterion(net(images), labels)
+        optimizer.zero_grad(set_to_none=True)
+        loss.backward()
+        optimizer.step()
+
+    # Warmup: include compilarea (torch.compile) și alocările oneDNN
+    for _ in range(warmup):
+        step()
+    if mode.device.type == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    if mode.device.type == "cuda":
+        torch.cuda.synchronize()
+    return steps * batch_size / (time.perf_counter() - start)
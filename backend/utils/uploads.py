@@ -0,0 +1,275 @@
+"""Streaming upload handling with early size and format rejection.
+
+``UploadFile`` parameters make Starlette read the whole multipart body before
+the endpoint runs, so an oversized or non-image upload is only rejected after
+it has been received in full. ``read_uploads`` parses ``request.stream()``
+chunk by chunk instead, feeding every file part to an :class:`UploadGuard`:
+
+- ``Content-Length`` above the limit is rejected before reading anything;
+- the first bytes are sniffed (JPEG/PNG/GIF/WebP/BMP, optionally zip/tar/gz)
+  and unknown formats are rejected as soon as they arrive; an archive is only
+  accepted when its magic bytes match the format its extension claims;
+- while the part is still arriving, the header is probed with ``Image.open``
+  and images declaring more than ``max_pixels`` pixels are rejected;
+- a part larger than its byte limit is rejected at the chunk that crosses it.
+
+Memory per request is therefore bounded by the byte limits, whatever the
+client sends. Raw bodies (``Content-Type: image/*``) go through the same guard.
+"""
+
+import io
+from typing import Callable, List, Optional
+
+from PIL import Image
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Suficient pentru toate semnăturile, inclusiv "ustar" de la offset 257 (tar)
+SNIFF_BYTES = 262
+# Header-ul JPEG poate veni după EXIF/thumbnail; încercăm Image.open la 1, 2, 4 ... 512 KB
+PROBE_START_BYTES = 1024
+PROBE_MAX_BYTES = 512 * 1024
+
+IMAGE_FORMATS = {"jpeg", "png", "gif", "webp", "bmp"}
+ARCHIVE_FORMATS = {"zip", "gzip", "tar"}
+# Extensia -> formatul arhivei (magic bytes); .tar.gz/.tgz sunt tar comprimat gzip
+ARCHIVE_EXTENSIONS = {".zip": "zip", ".tar": "tar", ".tar.gz": "gzip", ".tgz": "gzip"}
+
+
+class UploadError(ValueError):
+    """The upload was rejected; ``status_code`` is the HTTP status to return."""
+
+    status_code = 400
+
+
+class UploadTooLargeError(UploadError):
+    status_code = 413
+
+
+class UnsupportedMediaTypeError(UploadError):
+    status_code = 415
+
+
+def archive_extension(filename: Optional[str]) -> Optional[str]:
+    """Archive format claimed by the file name, or None."""
+    name = (filename or "").lower()
+    for extension, fmt in ARCHIVE_EXTENSIONS.items():
+        if name.endswith(extension):
+            return fmt
+    return None
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """Format from the magic bytes, or None if not recognised."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:2] == b"BM":
+        return "bmp"
+    if head[:4] in (b"PK\x03\x04", b"PK\x05\x06"):
+        return "zip"
+    if head[:2] == b"\x1f\x8b":
+        return "gzip"
+    if head[257:262] == b"ustar":
+        return "tar"
+    return None
+
+
+class UploadGuard:
+    """Buffers one uploaded file and validates it while chunks arrive.
+
+    After the first error the buffer is released and the rest of the part is
+    dropped; ``finish()`` re-raises the error (or returns the bytes).
+    """
+
+    def __init__(self, filename: Optional[str], max_bytes: int, max_pixels: int,
+                 allow_archives: bool = False, max_archive_bytes: int = 0):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.allow_archives = allow_archives
+        self.max_archive_bytes = max_archive_bytes
+        self.format: Optional[str] = None
+        self.size = None  # (width, height) din header, când e cunoscut
+        self.error: Optional[UploadError] = None
+        self._buffer = bytearray()
+        self._next_probe = PROBE_START_BYTES
+
+    @property
+    def is_archive(self) -> bool:
+        return self.format in ARCHIVE_FORMATS
+
+    def feed(self, chunk: bytes) -> None:
+        if self.error is not None:
+            return
+        self._buffer += chunk
+        try:
+            self._check(final=False)
+        except UploadError as e:
+            self.reject(e)
+
+    def reject(self, error: UploadError) -> None:
+        self.error = error
+        self._buffer = bytearray()
+
+    def finish(self) -> bytes:
+        if self.error is None:
+            try:
+                self._check(final=True)
+            except UploadError as e:
+                self.reject(e)
+        if self.error is not None:
+            raise self.error
+        return bytes(self._buffer)
+
+    def _check(self, final: bool) -> None:
+        n = len(self._buffer)
+        if self.format is None and (n >= SNIFF_BYTES or final):
+            self._sniff()
+
+        limit = self.max_archive_bytes if self.is_archive else self.max_bytes
+        if n > limit:
+            raise UploadTooLargeError(f"Upload exceeds {limit} bytes")
+
+        if self.format in IMAGE_FORMATS and self.size is None and \
+                (final or self._next_probe <= min(n, PROBE_MAX_BYTES)):
+            self._probe_size()
+            self._next_probe = n * 2
+
+    def _sniff(self) -> None:
+        fmt = sniff_format(bytes(self._buffer[:SNIFF_BYTES]))
+        if self.allow_archives:
+            # O arhivă e acceptată doar dacă magic bytes corespund extensiei (zip = .zip, ...)
+            claimed = archive_extension(self.filename)
+            if claimed is not None and fmt != claimed:
+                raise UnsupportedMediaTypeError(f"File '{self.filename}' is not a valid {claimed} archive")
+            if fmt in ARCHIVE_FORMATS and claimed is None:
+                raise UnsupportedMediaTypeError(
+                    f"File '{self.filename}' is a {fmt} archive, expected a .zip, .tar, .tar.gz or .tgz name")
+        if fmt is None or (fmt in ARCHIVE_FORMATS and not self.allow_archives):
+            raise UnsupportedMediaTypeError("Unsupported file type (expected JPEG, PNG, GIF, WebP or BMP)")
+        self.format = fmt
+
+    def _probe_size(self) -> None:
+        # Image.open citește doar header-ul; pe un prefix trunchiat poate eșua,
+        # caz în care reîncercăm cu mai mulți bytes
+        try:
+            width, height = Image.open(io.BytesIO(self._buffer)).size
+        except Image.DecompressionBombError as e:
+            raise UploadTooLargeError(str(e)) from e
+        except Exception:
+            return
+        self.size = (width, height)
+        if width * height > self.max_pixels:
+            raise UploadTooLargeError(
+                f"Image is {width}x{height} ({width * height} pixels), limit is {self.max_pixels}")
+
+
+def _content_length(request) -> Optional[int]:
+    try:
+        return int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+
+
+async def read_uploads(request, new_guard: Callable[[Optional[str]], UploadGuard],
+                       max_body_bytes: int, max_files: int,
+                       stop_on_error: bool) -> List[UploadGuard]:
+    """Stream the request body into one guard per uploaded file.
+
+    ``multipart/form-data`` file parts each get ``new_guard(filename)``; a raw
+    ``image/*`` or ``application/octet-stream`` body is a single file. With
+    ``stop_on_error`` the first rejected file aborts the read (its error is
+    raised); otherwise rejected files are returned with ``error`` set.
+
+    Raises:
+        UploadTooLargeError: the body exceeds ``max_body_bytes`` or has more
+            than ``max_files`` files.
+        UploadError: malformed or unsupported request body.
+    """
+    length = _content_length(request)
+    if length is not None and length > max_body_bytes:
+        raise UploadTooLargeError(f"Request body exceeds {max_body_bytes} bytes")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    guards: List[UploadGuard] = []
+    received = 0
+
+    if content_type.startswith(b"image/") or content_type == b"application/octet-stream":
+        guard = new_guard(None)
+        guards.append(guard)
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_body_bytes:
+                raise UploadTooLargeError(f"Request body exceeds {max_body_bytes} bytes")
+            guard.feed(chunk)
+            if guard.error is not None and stop_on_error:
+                raise guard.error
+        return guards
+
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UnsupportedMediaTypeError("Expected multipart/form-data or an image/* body")
+
+    # Starea parser-ului: header-ele părții curente și guard-ul ei (None = câmp text)
+    state = {"header_field": b"", "headers": {}, "guard": None}
+
+    def on_part_begin():
+        state["headers"] = {}
+        state["guard"] = None
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        field = state["header_field"].lower()
+        state["headers"][field] = state["headers"].get(field, b"") + data[start:end]
+
+    def on_header_end():
+        state["header_field"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if b"filename" not in disposition:
+            return  # câmp de formular obișnuit, ignorat
+        if len(guards) >= max_files:
+            raise UploadTooLargeError(f"Too many files (max {max_files} per request)")
+        filename = disposition[b"filename"].decode("utf-8", errors="replace")
+        state["guard"] = new_guard(filename)
+        guards.append(state["guard"])
+
+    def on_part_data(data, start, end):
+        guard = state["guard"]
+        if guard is not None:
+            guard.feed(data[start:end])
+            if guard.error is not None and stop_on_error:
+                raise guard.error
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_body_bytes:
+            raise UploadTooLargeError(f"Request body exceeds {max_body_bytes} bytes")
+        try:
+            parser.write(chunk)
+        except UploadError:
+            raise
+        except Exception as e:
+            raise UploadError(f"Malformed multipart body: {e}") from e
+    parser.finalize()
+    return guards
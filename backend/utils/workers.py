@@ -0,0 +1,90 @@
+"""Worker-execution layer for CPU-bound inference work.
+
+PIL decoding, preprocessing and the torch forward pass all block, so they run
+in a bounded thread pool instead of on the asyncio event loop. The pool also
+does admission control: once ``max_pending`` requests are in flight, new ones
+are rejected with :class:`PoolFullError` so the handler can answer 503.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Dict
+
+
+class PoolFullError(Exception):
+    """Raised by :meth:`WorkerPool.admit` when the request queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many pending requests, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class WorkerPool:
+    """Bounded thread pool plus an in-flight request limit."""
+
+    def __init__(self, max_workers: int, max_pending: int, retry_after: int = 1):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="inference")
+        # Modificat doar din event loop, deci nu are nevoie de lock
+        self._pending = 0
+        self._rejected_total = 0
+
+    @contextmanager
+    def admit(self):
+        """Reserve a slot for one request for the duration of the block."""
+        if self._pending >= self.max_pending:
+            self._rejected_total += 1
+            raise PoolFullError(self.retry_after)
+        self._pending += 1
+        try:
+            yield
+        finally:
+            self._pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn(*args, **kwargs)`` in the pool and await the result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "worker_threads": self.max_workers,
+            "pending_requests": self._pending,
+            "max_pending_requests": self.max_pending,
+            "rejected_total": self._rejected_total,
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def configure_torch_threads(num_threads: int) -> int:
+    """Set torch intra-op threads (and a single inter-op thread).
+
+    Returns the number of intra-op threads actually in use.
+    """
+    import torch
+
+    torch.set_num_threads(max(1, num_threads))
+    try:
+        # Poate fi setat o singură dată, înainte de orice operație paralelă
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    return torch.get_num_threads()
+
+
+def default_torch_threads(worker_threads: int, processes: int = 1) -> int:
+    """Intra-op threads that leave one core per extra decode worker.
+
+    With several server processes each one gets ``cpus // processes`` cores,
+    so N processes do not each start a thread per core.
+    """
+    cpus = max(1, (os.cpu_count() or 1) // max(1, processes))
+    return max(1, cpus - (worker_threads - 1))
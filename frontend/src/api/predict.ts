@@ -1,4 +1,4 @@
-import type { Prediction } from '../types/Prediction'
+import type { BatchPrediction, Prediction } from '../types/Prediction'
 
 const BACKEND_URL = import.meta.env.DEV ? 'http://127.0.0.1:8000' : ''
 
@@ -18,3 +18,23 @@ export async function predictImage(file: File): Promise<Prediction> {
   const data = await res.json()
   return data as Prediction
 }
+
+// Many images (or zip/tar archives) in one round trip, batched on the server
+export async function predictImages(files: File[]): Promise<BatchPrediction> {
+  const fd = new FormData()
+  for (const file of files) {
+    fd.append('files', file)
+  }
+
+  const res = await fetch(`${BACKEND_URL}/predict-images`, {
+    method: 'POST',
+    body: fd,
+  })
+
+  if (!res.ok) {
+    throw new Error(`Batch prediction request failed: ${res.status}`)
+  }
+
+  const data = await res.json()
+  return data as BatchPrediction
+}
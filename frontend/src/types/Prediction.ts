@@ -20,3 +20,13 @@ export interface Prediction {
   message: string;
   top5?: Top5Item[];
 }
+
+export type BatchPredictionItem =
+  | ({ filename: string } & Prediction)
+  | { filename: string; error: string };
+
+export interface BatchPrediction {
+  count: number;
+  errors: number;
+  results: BatchPredictionItem[];
+}